@@ -0,0 +1,315 @@
+"""Refresh product price and rating data from an upstream catalog by ASIN.
+
+Products with an ``amazon_asin`` are walked in cursor batches, least
+recently checked first. ASINs are looked up in groups through an upstream
+client, with at most ``concurrency`` lookups in flight, a shared token-bucket
+rate limit and retries with backoff. Only fields whose values changed are
+written back, in one unordered ``bulk_write`` per cursor batch, together
+with ``asin_checked_at``. Price changes also update ``discount_pct`` and
+``price_history``, and every written product is published on the cache
+invalidation bus so running workers pick it up.
+
+The upstream client is pluggable: anything with an async
+``fetch(asins) -> {asin: fields}`` works. ``HttpUpstreamClient`` speaks the
+JSON API served by ``benchmarks/asin_stub_server.py``:
+
+    GET /items?asins=A,B,C  ->  {"items": [{"asin", "price", "list_price",
+                                            "rating", "review_count"}]}
+
+Usage:
+    ASIN_UPSTREAM_URL=http://localhost:8765 python asin_refresh.py --concurrency 8 --rate 20
+"""
+import asyncio
+import logging
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from pymongo import UpdateOne
+
+from cache_bus import InvalidationBus, LocalCache
+from price_history import PriceHistory, discount_pct
+
+logger = logging.getLogger(__name__)
+
+REFRESH_FIELDS = ("price", "original_price", "rating", "review_count")
+PROJECTION = {"_id": 0, "id": 1, "slug": 1, "amazon_asin": 1, "asin_checked_at": 1, **{f: 1 for f in REFRESH_FIELDS}}
+
+
+class UpstreamError(Exception):
+    def __init__(self, message: str, retryable: bool = True, retry_after: float = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header, given as seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class HttpUpstreamClient:
+    """Blocking ``requests`` calls run in worker threads."""
+
+    def __init__(self, base_url: str, api_key: str = None, timeout: float = 10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    async def fetch(self, asins):
+        return await asyncio.to_thread(self._fetch, list(asins))
+
+    def close(self):
+        self.session.close()
+
+    def _fetch(self, asins):
+        try:
+            response = self.session.get(
+                f"{self.base_url}/items", params={"asins": ",".join(asins)}, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise UpstreamError(str(e))
+        if response.status_code == 429 or response.status_code >= 500:
+            raise UpstreamError(
+                f"upstream returned {response.status_code}",
+                retry_after=parse_retry_after(response.headers.get("Retry-After")),
+            )
+        if response.status_code != 200:
+            raise UpstreamError(f"upstream returned {response.status_code}", retryable=False)
+        # A body that does not parse is not retried; the lookup fails on its own
+        try:
+            items = {}
+            for item in response.json().get("items", []):
+                items[item["asin"]] = {
+                    "price": item.get("price"),
+                    "original_price": item.get("list_price"),
+                    "rating": item.get("rating"),
+                    "review_count": item.get("review_count"),
+                }
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise UpstreamError(f"malformed upstream response: {e!r}", retryable=False)
+        return items
+
+
+class RateLimiter:
+    """Token bucket shared by every in-flight lookup."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def changed_fields(product: dict, fetched: dict) -> dict:
+    changes = {}
+    for field in REFRESH_FIELDS:
+        value = fetched.get(field)
+        # A field the upstream no longer reports is left as entered
+        if value is not None and value != product.get(field):
+            changes[field] = value
+    return changes
+
+
+def staleness(checked_at, now: datetime) -> dict:
+    ages = sorted((now - ts).total_seconds() for ts in checked_at if ts)
+    return {
+        "never_checked": sum(1 for ts in checked_at if not ts),
+        "median_age_seconds": statistics.median(ages) if ages else None,
+        "max_age_seconds": ages[-1] if ages else None,
+    }
+
+
+class AsinRefresher:
+    def __init__(
+        self,
+        db,
+        client,
+        concurrency: int = 8,
+        lookup_size: int = 10,
+        cursor_batch: int = 500,
+        rate: float = 10,
+        max_retries: int = 4,
+        invalidation_bus: InvalidationBus = None,
+        price_history: PriceHistory = None,
+    ):
+        self.db = db
+        self.client = client
+        self.lookup_size = lookup_size
+        self.cursor_batch = cursor_batch
+        self.max_retries = max_retries
+        self.rate_limiter = RateLimiter(rate, burst=max(1, concurrency))
+        self.invalidation_bus = invalidation_bus or InvalidationBus(db, LocalCache())
+        self.price_history = price_history or PriceHistory(db)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._stats = {}
+
+    async def run(self, limit: int = None) -> dict:
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        self._stats = {
+            "scanned": 0, "changed": 0, "unchanged": 0, "not_found": 0, "failed": 0,
+            "requests": 0, "retries": 0,
+        }
+        checked_before = []
+        batch = []
+        # Products stamped by this run move forward in the sort order; the
+        # cut-off keeps the cursor from returning them a second time
+        query = {"amazon_asin": {"$nin": [None, ""]}, "asin_checked_at": {"$not": {"$gte": now}}}
+        cursor = self.db.products.find(query, PROJECTION).sort(
+            [("asin_checked_at", 1), ("id", 1)]
+        ).batch_size(self.cursor_batch)
+        if limit:
+            cursor = cursor.limit(limit)
+        async for product in cursor:
+            checked_before.append(product.get("asin_checked_at"))
+            batch.append(product)
+            if len(batch) >= self.cursor_batch:
+                await self._refresh_batch(batch)
+                batch = []
+        if batch:
+            await self._refresh_batch(batch)
+
+        elapsed = time.perf_counter() - started
+        checked_after = [
+            p.get("asin_checked_at") async for p in self.db.products.find(
+                {"amazon_asin": {"$nin": [None, ""]}}, {"_id": 0, "asin_checked_at": 1}
+            )
+        ]
+        return {
+            **self._stats,
+            "elapsed_seconds": round(elapsed, 3),
+            "products_per_second": round(self._stats["scanned"] / elapsed, 1) if elapsed else None,
+            "staleness_before": staleness(checked_before, now),
+            "staleness_after": staleness(checked_after, datetime.utcnow()),
+        }
+
+    async def _refresh_batch(self, products):
+        self._stats["scanned"] += len(products)
+        groups = [products[i:i + self.lookup_size] for i in range(0, len(products), self.lookup_size)]
+        results = await asyncio.gather(*[self._lookup([p["amazon_asin"] for p in group]) for group in groups])
+
+        now = datetime.utcnow()
+        operations = []
+        changed = []
+        price_changes = []
+        for group, fetched in zip(groups, results):
+            if fetched is None:
+                self._stats["failed"] += len(group)
+                continue
+            for product in group:
+                item = fetched.get(product["amazon_asin"])
+                if item is None:
+                    self._stats["not_found"] += 1
+                    operations.append(UpdateOne({"id": product["id"]}, {"$set": {"asin_checked_at": now}}))
+                    continue
+                changes = changed_fields(product, item)
+                update = {"asin_checked_at": now}
+                if changes:
+                    self._stats["changed"] += 1
+                    merged = {**product, **changes}
+                    update.update(changes, updated_at=now)
+                    if "price" in changes or "original_price" in changes:
+                        update["discount_pct"] = discount_pct(merged["price"], merged.get("original_price"))
+                        price_changes.append((product["id"], merged["price"], merged.get("original_price")))
+                    changed.append(product)
+                else:
+                    self._stats["unchanged"] += 1
+                operations.append(UpdateOne({"id": product["id"]}, {"$set": update}))
+
+        if operations:
+            await self.db.products.bulk_write(operations, ordered=False)
+        if price_changes:
+            await self.price_history.record(price_changes, ts=now)
+        if changed:
+            keys = [key for p in changed for key in (f"product:{p['id']}", f"product:slug:{p['slug']}")]
+            await self.invalidation_bus.publish("product", [p["id"] for p in changed], keys)
+
+    async def _lookup(self, asins):
+        delay = 0.5
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                await self.rate_limiter.acquire()
+                self._stats["requests"] += 1
+                try:
+                    return await self.client.fetch(asins)
+                except UpstreamError as e:
+                    if not e.retryable or attempt == self.max_retries:
+                        logger.warning("ASIN lookup failed for %d ASINs: %s", len(asins), e)
+                        return None
+                    wait = e.retry_after if e.retry_after is not None else delay * (1 + random.random())
+            # Back off outside the semaphore so other lookups keep going
+            self._stats["retries"] += 1
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, 30)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Refresh product prices and ratings by ASIN")
+    parser.add_argument("--upstream-url", default=os.environ.get("ASIN_UPSTREAM_URL"))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10, help="Upstream requests per second (0 = unlimited)")
+    parser.add_argument("--lookup-size", type=int, default=10, help="ASINs per upstream request")
+    parser.add_argument("--limit", type=int, default=None, help="Refresh at most this many products")
+    args = parser.parse_args()
+    if not args.upstream_url:
+        parser.error("--upstream-url or ASIN_UPSTREAM_URL is required")
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        upstream = HttpUpstreamClient(args.upstream_url, api_key=os.environ.get("ASIN_UPSTREAM_API_KEY"))
+        refresher = AsinRefresher(
+            client[os.environ['DB_NAME']],
+            upstream,
+            concurrency=args.concurrency,
+            lookup_size=args.lookup_size,
+            rate=args.rate,
+        )
+        report = await refresher.run(limit=args.limit)
+        logger.info("ASIN refresh report: %s", json.dumps(report))
+        upstream.close()
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the upstream product API used by asin_refresh.py.
+
+Prices and ratings are derived from the ASIN and drift every ``--drift-seconds``,
+so repeated refresh runs see a realistic share of changes. Latency, a request
+rate limit (answered with 429 + Retry-After) and random 5xx errors can be
+injected to exercise the refresher's concurrency, rate limiting and retries.
+
+    python benchmarks/asin_stub_server.py --port 8765 --latency-ms 80 --error-rate 0.02 --max-rps 50
+    ASIN_UPSTREAM_URL=http://localhost:8765 python asin_refresh.py --concurrency 16 --rate 40
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubState:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.requests = 0
+
+    def admit(self) -> bool:
+        if not self.args.max_rps:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            return self.window_count <= self.args.max_rps
+
+    def item(self, asin: str):
+        seed = zlib.crc32(asin.encode())
+        if seed % 100 < self.args.missing_pct:
+            return None
+        epoch = int(time.time() // self.args.drift_seconds)
+        rng = random.Random(seed * 1000003 + epoch)
+        base = 5 + seed % 500
+        price = round(base * rng.uniform(0.7, 1.0), 2)
+        return {
+            "asin": asin,
+            "price": price,
+            "list_price": float(base) if price < base else None,
+            "rating": round(3 + (seed % 20) / 10, 1),
+            "review_count": seed % 5000 + epoch % 7,
+        }
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/items":
+                self.send_error(404)
+                return
+            with state.lock:
+                state.requests += 1
+            if not state.admit():
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.end_headers()
+                return
+            time.sleep(state.args.latency_ms / 1000)
+            if random.random() < state.args.error_rate:
+                self.send_error(503)
+                return
+            asins = [a for a in parse_qs(url.query).get("asins", [""])[0].split(",") if a]
+            items = [item for item in (state.item(asin) for asin in asins) if item]
+            body = json.dumps({"items": items}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-rps", type=int, default=0, help="Requests per second before 429s (0 = unlimited)")
+    parser.add_argument("--missing-pct", type=int, default=2, help="Percent of ASINs the upstream does not know")
+    parser.add_argument("--drift-seconds", type=float, default=3600)
+    args = parser.parse_args()
+
+    state = StubState(args)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    print(f"ASIN stub listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"served {state.requests} requests")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
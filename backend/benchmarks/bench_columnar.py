@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Catalog browse benchmark: the $facet aggregation on Mongo vs the columnar
+in-memory snapshot (masks and bincounts, then a page fetch by id).
+
+    BENCH_MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_columnar.py --products 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog_columns import CatalogColumns  # noqa: E402
+from catalog_query import (  # noqa: E402
+    PRODUCT_INDEXES, PRODUCT_SORTS, build_product_filters, product_facet_pipeline,
+)
+from price_history import discount_pct  # noqa: E402
+
+DB_NAME = "bench_columnar"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def seed(db, n_products, n_categories):
+    await db.products.drop()
+    categories = [(str(uuid.uuid4()), f"Category {i}") for i in range(n_categories)]
+    started = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    for i in range(n_products):
+        category_id, category_name = random.choice(categories)
+        price = round(random.lognormvariate(3.5, 1.0), 2)
+        original_price = round(price * random.uniform(1.1, 2.0), 2) if random.random() < 0.2 else None
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "slug": f"bench-product-{i}",
+            "name": f"Bench product {i}",
+            "category_id": category_id,
+            "category_name": category_name,
+            "price": price,
+            "original_price": original_price,
+            "discount_pct": discount_pct(price, original_price),
+            "rating": round(random.uniform(0, 5), 1),
+            "review_count": random.randint(0, 2000),
+            "is_featured": random.random() < 0.05,
+            "is_active": random.random() < 0.95,
+            "created_at": started + timedelta(seconds=random.randint(0, 365 * 86400)),
+        })
+        if len(batch) == 10000:
+            await db.products.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.products.insert_many(batch, ordered=False)
+    for keys in PRODUCT_INDEXES:
+        await db.products.create_index(keys)
+    await db.products.create_index("id", unique=True)
+    return [category_id for category_id, _ in categories]
+
+
+def random_query(categories):
+    return {
+        "category_id": random.choice([None, None, *categories]),
+        "is_featured": random.choice([None, None, None, True]),
+        "min_price": random.choice([None, None, 25, 50]),
+        "max_price": random.choice([None, None, 100, 250]),
+        "min_rating": random.choice([None, None, 3, 4]),
+        "on_sale": random.choice([None, None, None, True]),
+        "sort": random.choice(list(PRODUCT_SORTS)),
+        "skip": random.choice([0, 0, 0, 24, 240]),
+        "limit": 24,
+    }
+
+
+async def mongo_browse(db, q):
+    base, faceted = build_product_filters(
+        q["category_id"], q["is_featured"], True, q["min_price"], q["max_price"], q["min_rating"], q["on_sale"]
+    )
+    result = await db.products.aggregate(
+        product_facet_pipeline(base, faceted, q["sort"], q["skip"], q["limit"])
+    ).to_list(1)
+    return [p["id"] for p in result[0]["items"]]
+
+
+async def columnar_browse(db, columns, q):
+    result = columns.query(**q, facets=True)
+    docs = await db.products.find({"id": {"$in": result["items"]}}, {"_id": 0}).to_list(None)
+    by_id = {doc["id"]: doc for doc in docs}
+    return [by_id[i]["id"] for i in result["items"] if i in by_id]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--categories", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the products from a previous run")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    db = client[DB_NAME]
+    if args.skip_seed:
+        categories = await db.products.distinct("category_id")
+    else:
+        started = time.perf_counter()
+        categories = await seed(db, args.products, args.categories)
+        print(f"seeded {args.products} products in {time.perf_counter() - started:.1f}s")
+
+    columns = CatalogColumns()
+    started = time.perf_counter()
+    await columns.load(db)
+    print(f"columnar load: {time.perf_counter() - started:.2f}s, {columns.nbytes() / 1e6:.1f} MB of columns")
+
+    queries = [random_query(categories) for _ in range(args.queries)]
+    mismatches = 0
+    timings = {"mongo $facet": [], "columnar": []}
+    for q in queries:
+        started = time.perf_counter()
+        expected = await mongo_browse(db, q)
+        timings["mongo $facet"].append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        actual = await columnar_browse(db, columns, q)
+        timings["columnar"].append((time.perf_counter() - started) * 1000)
+        mismatches += expected != actual
+    for label, samples in timings.items():
+        print(
+            f"{label:<14} p50={statistics.median(samples):8.2f}ms p99={percentile(samples, 99):8.2f}ms "
+            f"mean={statistics.mean(samples):8.2f}ms"
+        )
+    print(f"page mismatches: {mismatches}/{len(queries)}")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Read-preference benchmark: public catalog reads on the primary vs secondaryPreferred
+while an admin-style writer keeps updating products.
+
+Needs a local three-node replica set, e.g.:
+
+    mkdir -p /tmp/rs/{0,1,2}
+    for i in 0 1 2; do
+        mongod --replSet rs0 --port 2701$i --dbpath /tmp/rs/$i --bind_ip localhost --fork --logpath /tmp/rs/$i.log
+    done
+    mongosh --port 27010 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27010"},
+        {_id: 1, host: "localhost:27011"},
+        {_id: 2, host: "localhost:27012"}]})'
+
+    BENCH_MONGO_URL="mongodb://localhost:27010,localhost:27011,localhost:27012/?replicaSet=rs0" \\
+        python benchmarks/bench_read_preference.py
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+DEFAULT_URL = "mongodb://localhost:27010,localhost:27011,localhost:27012/?replicaSet=rs0"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def seed(db, n_products, n_categories):
+    await db.products.drop()
+    categories = [str(uuid.uuid4()) for _ in range(n_categories)]
+    docs = []
+    for i in range(n_products):
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "slug": f"bench-product-{i}",
+            "name": f"Bench product {i}",
+            "description": "Benchmark product " * 20,
+            "category_id": random.choice(categories),
+            "price": round(random.uniform(5, 500), 2),
+            "is_active": True,
+            "is_featured": i % 10 == 0,
+            "created_at": datetime.utcnow(),
+        })
+    await db.products.insert_many(docs)
+    await db.products.create_index([("is_active", 1), ("category_id", 1), ("created_at", -1)])
+    await db.products.create_index("id", unique=True)
+    return categories, [d["id"] for d in docs]
+
+
+async def reader(coll, categories, deadline, samples):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await coll.find(
+            {"is_active": True, "category_id": random.choice(categories)}
+        ).sort("created_at", -1).limit(50).to_list(50)
+        samples.append((time.perf_counter() - started) * 1000)
+
+
+async def writer(coll, product_ids, deadline, samples):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await coll.update_one(
+            {"id": random.choice(product_ids)},
+            {"$set": {"price": round(random.uniform(5, 500), 2), "updated_at": datetime.utcnow()}},
+        )
+        samples.append((time.perf_counter() - started) * 1000)
+
+
+async def run_case(client, db_name, label, read_preference, args, categories, product_ids):
+    read_coll = client.get_database(db_name, read_preference=read_preference).products
+    write_coll = client[db_name].products
+    deadline = time.perf_counter() + args.seconds
+    read_samples, write_samples = [], []
+    await asyncio.gather(
+        *[reader(read_coll, categories, deadline, read_samples) for _ in range(args.readers)],
+        *[writer(write_coll, product_ids, deadline, write_samples) for _ in range(args.writers)],
+    )
+    print(
+        f"{label:<22} reads/s={len(read_samples) / args.seconds:>8.0f} "
+        f"read p50={statistics.median(read_samples):6.2f}ms p99={percentile(read_samples, 99):6.2f}ms | "
+        f"writes/s={len(write_samples) / args.seconds:>6.0f} "
+        f"write p50={statistics.median(write_samples):6.2f}ms p99={percentile(write_samples, 99):6.2f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=64)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--max-staleness", type=int, default=90)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("BENCH_MONGO_URL", DEFAULT_URL))
+    db_name = "bench_read_preference"
+    hello = await client.admin.command("hello")
+    if not hello.get("setName") or len(hello.get("hosts", [])) < 3:
+        raise SystemExit("bench_read_preference needs a three-node replica set (see module docstring)")
+
+    categories, product_ids = await seed(client[db_name], args.products, args.categories)
+    await run_case(client, db_name, "primary", Primary(), args, categories, product_ids)
+    await run_case(
+        client, db_name, f"secondaryPreferred({args.max_staleness}s)",
+        SecondaryPreferred(max_staleness=args.max_staleness), args, categories, product_ids,
+    )
+    await client.drop_database(db_name)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
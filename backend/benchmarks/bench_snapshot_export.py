@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Snapshot export benchmark: full rebuild, no-op rebuild and a single-product
+incremental export against a seeded throwaway database.
+
+    BENCH_MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_snapshot_export.py --products 20000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+DB_NAME = "bench_snapshot_export"
+
+# server.py connects on import; point it at the benchmark database first
+os.environ["MONGO_URL"] = os.environ.get("BENCH_MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = DB_NAME
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+from blog_related import BlogRelatedIndex  # noqa: E402
+from export_snapshot import SnapshotExporter  # noqa: E402
+from related import RelatedProducts  # noqa: E402
+from repositories import motor_storage  # noqa: E402
+
+TAGS = ["dogs", "cats", "toys", "food", "health", "training", "grooming", "birds", "fish", "travel"]
+
+
+async def seed(db, n_products, n_posts, n_categories):
+    await server.client.drop_database(DB_NAME)
+    now = datetime.utcnow()
+    categories = [
+        {"id": str(uuid.uuid4()), "name": f"Category {i}", "slug": f"category-{i}",
+         "description": "Benchmark category", "created_at": now}
+        for i in range(n_categories)
+    ]
+    await db.categories.insert_many(categories)
+    products = []
+    for i in range(n_products):
+        category = random.choice(categories)
+        products.append({
+            "id": str(uuid.uuid4()),
+            "name": f"Bench product {i} {random.choice(TAGS)}",
+            "slug": f"bench-product-{i}",
+            "description": "Benchmark product " * 20,
+            "short_description": "Benchmark product",
+            "category_id": category["id"],
+            "category_name": category["name"],
+            "price": round(random.uniform(5, 500), 2),
+            "affiliate_url": f"https://www.amazon.com/dp/B{i:09d}",
+            "features": random.sample(TAGS, 3),
+            "rating": round(random.uniform(1, 5), 1),
+            "is_featured": i % 10 == 0,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        })
+    await db.products.insert_many(products)
+    posts = [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Bench post {i}",
+            "slug": f"bench-post-{i}",
+            "content": "Benchmark paragraph. " * 200,
+            "excerpt": "Benchmark post",
+            "author": "Bench",
+            "category_id": random.choice(categories)["id"],
+            "tags": random.sample(TAGS, 3),
+            "is_published": True,
+            "is_featured": i % 10 == 0,
+            "created_at": now,
+            "updated_at": now,
+            "published_at": now,
+        }
+        for i in range(n_posts)
+    ]
+    if posts:
+        await db.blog_posts.insert_many(posts)
+    await server.ensure_indexes()
+    await RelatedProducts().rebuild(db)
+    await BlogRelatedIndex().rebuild(db)
+    return [p["id"] for p in products]
+
+
+async def timed(label, out, coro_fn):
+    exporter = SnapshotExporter(server.db, out)
+    started = time.perf_counter()
+    await coro_fn(exporter)
+    elapsed = time.perf_counter() - started
+    files = exporter.written + exporter.unchanged
+    print(
+        f"{label:<24} {elapsed:8.2f}s  files={files:>7} ({files / elapsed:8.0f}/s)  "
+        f"written={exporter.written:>7} unchanged={exporter.unchanged:>7} "
+        f"removed={exporter.removed:>4} {exporter.bytes_written / 1e6:8.1f} MB"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--categories", type=int, default=20)
+    args = parser.parse_args()
+
+    # Match the exporter's CLI: read everything from the primary
+    server.read_db = server.db
+    server.storage = motor_storage(server.db)
+    product_ids = await seed(server.db, args.products, args.posts, args.categories)
+    out = tempfile.mkdtemp(prefix="snapshot-")
+    try:
+        await timed("full rebuild", out, lambda e: e.full())
+        await timed("full rebuild (no-op)", out, lambda e: e.full())
+        product_id = random.choice(product_ids)
+        await server.db.products.update_one({"id": product_id}, {"$set": {"price": 1.0}})
+        await timed("incremental (1 product)", out, lambda e: e.incremental([product_id]))
+    finally:
+        shutil.rmtree(out)
+        await server.client.drop_database(DB_NAME)
+        server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+"""Related blog posts from an inverted tag/category index.
+
+``blog_tag_index`` maps each term (a lowercased tag, or ``category:<id>``) to
+the published posts carrying it. ``blog_related`` holds, per post, the terms
+it is indexed under and its precomputed top-K related posts, so serving them
+is a single key lookup and never scans ``blog_posts``.
+
+Candidates are scored by the IDF-weighted terms they share with the post, so
+a rare tag counts for more than a ubiquitous one. A write re-indexes the post
+and recomputes the lists of every post reachable through its old or new terms.
+
+Posts published before the index existed are added by migration 3 in
+server.py. Run ``python blog_related.py`` to rebuild both collections.
+"""
+import asyncio
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import DeleteOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 6
+CATEGORY_WEIGHT = 1.0
+# Posts sharing only a very common term barely move each other's lists;
+# don't fan a write out to everything under such a term
+MAX_FANOUT = 500
+
+
+def post_terms(post: dict) -> set:
+    if not post or not post.get("is_published"):
+        return set()
+    terms = {tag.strip().lower() for tag in post.get("tags") or [] if tag.strip()}
+    if post.get("category_id"):
+        terms.add(f"category:{post['category_id']}")
+    return terms
+
+
+def term_weight(term: str, df: int, total: int) -> float:
+    if term.startswith("category:"):
+        return CATEGORY_WEIGHT
+    return 1.0 + math.log(max(total, 1) / max(df, 1))
+
+
+def score_candidates(post_id: str, terms, postings: dict, total: int):
+    scores = defaultdict(float)
+    for term in terms:
+        posts = postings.get(term, ())
+        weight = term_weight(term, len(posts), total)
+        for candidate in posts:
+            if candidate != post_id:
+                scores[candidate] += weight
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:TOP_K]
+    return [{"id": candidate, "score": round(score, 4)} for candidate, score in ranked]
+
+
+class BlogRelatedIndex:
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, db, post_ids):
+        """Re-index ``post_ids`` after a write and update every affected list."""
+        async with self._lock:
+            post_ids = list(post_ids)
+            posts = await db.blog_posts.find(
+                {"id": {"$in": post_ids}},
+                {"_id": 0, "id": 1, "tags": 1, "category_id": 1, "is_published": 1},
+            ).to_list(None)
+            new_terms = {post["id"]: post_terms(post) for post in posts}
+            stored = await db.blog_related.find(
+                {"post_id": {"$in": post_ids}}, {"_id": 0, "post_id": 1, "terms": 1}
+            ).to_list(None)
+            old_terms = {entry["post_id"]: set(entry.get("terms", [])) for entry in stored}
+
+            index_ops = []
+            touched_terms = set()
+            for post_id in post_ids:
+                old = old_terms.get(post_id, set())
+                new = new_terms.get(post_id, set())
+                touched_terms |= old | new
+                for term in old - new:
+                    index_ops.append(UpdateOne({"term": term}, {"$pull": {"post_ids": post_id}}))
+                for term in new - old:
+                    index_ops.append(UpdateOne({"term": term}, {"$addToSet": {"post_ids": post_id}}, upsert=True))
+            if index_ops:
+                await db.blog_tag_index.bulk_write(index_ops, ordered=False)
+                await db.blog_tag_index.delete_many({"post_ids": {"$size": 0}})
+
+            postings = await self._postings(db, touched_terms)
+            affected = set(post_ids)
+            for term in touched_terms:
+                if len(postings.get(term, ())) <= MAX_FANOUT:
+                    affected |= postings.get(term, set())
+
+            affected_terms = dict(new_terms)
+            others = [post_id for post_id in affected if post_id not in affected_terms]
+            if others:
+                async for entry in db.blog_related.find(
+                    {"post_id": {"$in": others}}, {"_id": 0, "post_id": 1, "terms": 1}
+                ):
+                    affected_terms[entry["post_id"]] = set(entry.get("terms", []))
+            missing_terms = set().union(*affected_terms.values()) - set(postings)
+            postings.update(await self._postings(db, missing_terms))
+
+            total = await db.blog_posts.count_documents({"is_published": True})
+            now = datetime.utcnow()
+            related_ops = []
+            for post_id, terms in affected_terms.items():
+                if not terms:
+                    related_ops.append(DeleteOne({"post_id": post_id}))
+                    continue
+                related_ops.append(UpdateOne(
+                    {"post_id": post_id},
+                    {"$set": {
+                        "terms": sorted(terms),
+                        "related": score_candidates(post_id, terms, postings, total),
+                        "updated_at": now,
+                    }},
+                    upsert=True,
+                ))
+            for post_id in set(post_ids) - set(affected_terms):
+                related_ops.append(DeleteOne({"post_id": post_id}))
+            if related_ops:
+                await db.blog_related.bulk_write(related_ops, ordered=False)
+
+    async def rebuild(self, db):
+        """Rebuild the tag index and every related list from ``blog_posts``."""
+        async with self._lock:
+            postings = defaultdict(set)
+            terms_by_post = {}
+            async for post in db.blog_posts.find(
+                {"is_published": True}, {"_id": 0, "id": 1, "tags": 1, "category_id": 1, "is_published": 1}
+            ):
+                terms = post_terms(post)
+                terms_by_post[post["id"]] = terms
+                for term in terms:
+                    postings[term].add(post["id"])
+
+            await db.blog_tag_index.delete_many({})
+            if postings:
+                await db.blog_tag_index.insert_many(
+                    [{"term": term, "post_ids": sorted(posts)} for term, posts in postings.items()]
+                )
+            await db.blog_related.delete_many({})
+            now = datetime.utcnow()
+            docs = [
+                {
+                    "post_id": post_id,
+                    "terms": sorted(terms),
+                    "related": score_candidates(post_id, terms, postings, len(terms_by_post)),
+                    "updated_at": now,
+                }
+                for post_id, terms in terms_by_post.items()
+            ]
+            if docs:
+                await db.blog_related.insert_many(docs)
+
+    async def _postings(self, db, terms) -> dict:
+        if not terms:
+            return {}
+        docs = await db.blog_tag_index.find({"term": {"$in": list(terms)}}, {"_id": 0}).to_list(None)
+        return {doc["term"]: set(doc["post_ids"]) for doc in docs}
+
+
+if __name__ == "__main__":
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        await BlogRelatedIndex().rebuild(client[os.environ['DB_NAME']])
+        logger.info("Rebuilt related blog posts")
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""Write-time rendering of blog post content.
+
+Post content is plain text with light markup: ``#``/``##``/``###`` headings,
+``- `` list items, ``**bold**`` and ``*italic*``; every other non-blank line
+is a paragraph. It is rendered once, when the post is saved, to HTML in which
+all text is escaped, so the only tags are the ones produced here. Word count,
+reading time, a heading table of contents and an automatic excerpt are
+derived in the same pass.
+
+Posts saved before rendering existed are backfilled by the
+``blog_post_render`` migration in server.py.
+"""
+import html
+import math
+import re
+
+WORDS_PER_MINUTE = 220
+EXCERPT_LENGTH = 160
+
+_HEADING = re.compile(r"^(#{1,3})\s+(.*)$")
+_LIST_ITEM = re.compile(r"^[-*]\s+(.*)$")
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_ITALIC = re.compile(r"\*(.+?)\*")
+_WORD = re.compile(r"\w+(?:['’]\w+)*")
+_ANCHOR_STRIP = re.compile(r"[^a-z0-9]+")
+
+
+def inline(text: str) -> str:
+    escaped = html.escape(text, quote=True)
+    return _ITALIC.sub(r"<em>\1</em>", _BOLD.sub(r"<strong>\1</strong>", escaped))
+
+
+def plain(text: str) -> str:
+    return _ITALIC.sub(r"\1", _BOLD.sub(r"\1", text))
+
+
+def anchor(text: str, used: set) -> str:
+    base = _ANCHOR_STRIP.sub("-", plain(text).lower()).strip("-") or "section"
+    candidate, n = base, 2
+    while candidate in used:
+        candidate, n = f"{base}-{n}", n + 1
+    used.add(candidate)
+    return candidate
+
+
+def excerpt_of(text: str, length: int = EXCERPT_LENGTH) -> str:
+    text = " ".join(text.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(" ", 1)[0].rstrip(",;:.-")
+    return cut + "…"
+
+
+def render_content(content: str) -> dict:
+    """Rendered HTML plus the fields derived from it."""
+    parts = []
+    toc = []
+    anchors = set()
+    words = 0
+    first_paragraph = None
+    in_list = False
+
+    for line in (content or "").splitlines():
+        line = line.strip()
+        item = _LIST_ITEM.match(line)
+        if in_list and not item:
+            parts.append("</ul>")
+            in_list = False
+        if not line:
+            continue
+        words += len(_WORD.findall(plain(line)))
+        heading = _HEADING.match(line)
+        if heading:
+            level = len(heading.group(1)) + 1  # the post title is the page's h1
+            text = heading.group(2)
+            slug = anchor(text, anchors)
+            toc.append({"level": level, "text": plain(text), "anchor": slug})
+            parts.append(f'<h{level} id="{slug}">{inline(text)}</h{level}>')
+        elif item:
+            if not in_list:
+                parts.append("<ul>")
+                in_list = True
+            parts.append(f"<li>{inline(item.group(1))}</li>")
+        else:
+            if first_paragraph is None:
+                first_paragraph = plain(line)
+            parts.append(f"<p>{inline(line)}</p>")
+    if in_list:
+        parts.append("</ul>")
+
+    return {
+        "content_html": "\n".join(parts),
+        "word_count": words,
+        "reading_minutes": max(1, math.ceil(words / WORDS_PER_MINUTE)) if words else 0,
+        "toc": toc,
+        "auto_excerpt": excerpt_of(first_paragraph or ""),
+    }
+
@@ -0,0 +1,276 @@
+"""Per-worker read cache and the cross-worker invalidation bus.
+
+Every uvicorn worker keeps its own ``LocalCache``. Admin writes publish the
+keys they touched to a capped ``cache_invalidations`` collection; every
+worker follows that collection (change stream when the deployment supports
+it, tailable cursor otherwise) and evicts the keys it receives. While a
+worker is not subscribed its cache is bypassed, so a lost subscription can
+never serve stale data for longer than the reconnect delay.
+
+``publish`` evicts the keys from this worker's cache before returning, so
+the writer reads its own write. Listeners re-read the database, so for a
+local publish they run in a background task, one message at a time in
+publish order, outside the request's deadline.
+"""
+import asyncio
+import inspect
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+import pymongo
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Server error codes meaning "change streams are not available here"
+CHANGE_STREAM_UNSUPPORTED = {40573, 40324, 136}
+
+
+class LocalCache:
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = False
+        # Bumped on every eviction so a load that raced a write is not cached
+        self.generation = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, generation: int = None):
+        if not self.enabled:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def evict(self, keys):
+        self.generation += 1
+        for key in keys:
+            if key.endswith("*"):
+                prefix = key[:-1]
+                for cached_key in [k for k in self._entries if k.startswith(prefix)]:
+                    del self._entries[cached_key]
+            else:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class InvalidationBus:
+    def __init__(
+        self,
+        db,
+        cache: LocalCache,
+        collection_name: str = "cache_invalidations",
+        max_delay_ms: int = 500,
+        capped_size_bytes: int = 4 * 1024 * 1024,
+        capped_max_docs: int = 20000,
+    ):
+        self.db = db
+        self.cache = cache
+        self.collection_name = collection_name
+        self.collection = db[collection_name]
+        self.max_delay_ms = max_delay_ms
+        self.capped_size_bytes = capped_size_bytes
+        self.capped_max_docs = capped_max_docs
+        self.worker_id = uuid.uuid4().hex
+        self.mode = None
+        self._listeners = []
+        self._subscribe_listeners = []
+        self._task = None
+        self._local = deque()
+        self._local_task = None
+        self._resyncs = []
+
+    def add_listener(self, listener):
+        """Register ``listener(message)`` to run for every message, local or remote."""
+        self._listeners.append(listener)
+
+    def add_subscribe_listener(self, listener):
+        """Register ``listener()`` to run on every (re)subscribe, after which
+        messages published while the bus was down will never arrive.
+
+        An async listener runs as a background resync while messages keep
+        flowing; a resubscribe cancels a resync still in progress."""
+        self._subscribe_listeners.append(listener)
+
+    async def publish(self, kind: str, ids=(), keys=()):
+        message = {
+            "worker": self.worker_id,
+            "kind": kind,
+            "ids": list(ids),
+            "keys": list(keys),
+            "ts": datetime.utcnow(),
+        }
+        self.cache.evict(message["keys"])
+        if self._listeners:
+            self._local.append(message)
+            if self._local_task is None or self._local_task.done():
+                with pymongo.timeout(None):
+                    self._local_task = asyncio.create_task(self._run_local())
+        try:
+            await self.collection.insert_one(message)
+        except PyMongoError:
+            # Remote workers only converge through the cache TTL for this write
+            logger.exception("Failed to publish cache invalidation for %s %s", kind, list(ids))
+
+    async def start(self):
+        await self._ensure_collection()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.cache.enabled = False
+        for task in (self._task, self._local_task, *self._resyncs):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._local_task = None
+        self._resyncs = []
+
+    async def drain(self):
+        """Wait for the listeners of messages published here so far."""
+        while self._local_task is not None and not self._local_task.done():
+            await asyncio.shield(self._local_task)
+
+    async def _ensure_collection(self):
+        try:
+            await self.db.create_collection(
+                self.collection_name,
+                capped=True,
+                size=self.capped_size_bytes,
+                max=self.capped_max_docs,
+            )
+        except CollectionInvalid:
+            pass
+        except OperationFailure as e:
+            # NamespaceExists when another worker won the race
+            if e.code != 48:
+                raise
+
+    async def _apply(self, message):
+        self.cache.evict(message.get("keys", []))
+        await self._notify(message)
+
+    async def _run_local(self):
+        while self._local:
+            await self._notify(self._local.popleft())
+
+    async def _notify(self, message):
+        for listener in self._listeners:
+            try:
+                result = listener(message)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Cache invalidation listener failed for %s", message.get("kind"))
+
+    async def _dispatch(self, message):
+        if message.get("worker") == self.worker_id:
+            return
+        await self._apply(message)
+
+    async def _subscribed(self, mode):
+        # Anything cached before this point may have missed messages
+        self.cache.clear()
+        self.cache.enabled = True
+        for task in self._resyncs:
+            task.cancel()
+        self._resyncs = []
+        for listener in self._subscribe_listeners:
+            try:
+                result = listener()
+                if inspect.isawaitable(result):
+                    self._resyncs.append(asyncio.create_task(self._resync(result)))
+            except Exception:
+                logger.exception("Cache invalidation subscribe listener failed")
+        if self.mode != mode:
+            logger.info("Cache invalidation bus subscribed via %s", mode)
+        self.mode = mode
+
+    async def _resync(self, awaitable):
+        try:
+            await awaitable
+        except Exception:
+            logger.exception("Cache invalidation resync failed")
+
+    async def _run(self):
+        use_change_stream = True
+        backoff = 0.5
+        while True:
+            try:
+                if use_change_stream:
+                    await self._follow_change_stream()
+                else:
+                    await self._follow_capped_collection()
+                backoff = 0.5
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if use_change_stream and (
+                    e.code in CHANGE_STREAM_UNSUPPORTED or "replica set" in str(e)
+                ):
+                    logger.info("Change streams unavailable, falling back to tailable cursor")
+                    use_change_stream = False
+                    continue
+                logger.warning("Cache invalidation bus error: %s", e)
+            except PyMongoError as e:
+                logger.warning("Cache invalidation bus error: %s", e)
+            self.cache.enabled = False
+            self.cache.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 10)
+
+    async def _follow_change_stream(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        async with self.collection.watch(pipeline, max_await_time_ms=self.max_delay_ms) as stream:
+            await self._subscribed("change_stream")
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None:
+                    await self._dispatch(change["fullDocument"])
+
+    async def _follow_capped_collection(self):
+        # Messages older than the subscription are irrelevant: the cache is
+        # cleared on subscribe. Allow some slack for clock skew between hosts.
+        since = datetime.utcnow() - timedelta(seconds=5)
+        await self._subscribed("tailable_cursor")
+        while True:
+            cursor = self.collection.find(
+                {"ts": {"$gte": since}},
+                cursor_type=CursorType.TAILABLE_AWAIT,
+            ).max_await_time_ms(self.max_delay_ms)
+            while cursor.alive:
+                async for message in cursor:
+                    since = max(since, message["ts"])
+                    await self._dispatch(message)
+                await asyncio.sleep(0.05)
+            # A tailable cursor dies when it starts on an empty result set;
+            # reopen it from the last message seen (replays are idempotent)
+            await asyncio.sleep(self.max_delay_ms / 1000)
@@ -0,0 +1,341 @@
+"""Columnar in-memory snapshot of the active catalog for browse queries.
+
+Each worker holds the fields the browse filters, sorts and facets need in
+NumPy columns, one row per active product. Filters become boolean masks,
+facet counts are ``bincount``s over precomputed bucket columns, and only the
+ids of the requested page are selected, so documents are fetched for that
+page alone. Results match ``catalog_query``'s pipelines, tiebreakers included.
+
+Admin writes refresh single rows through the invalidation bus; the snapshot
+is reloaded whenever the bus (re)subscribes, since messages may have been
+missed while it was down.
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+import numpy as np
+import pymongo
+
+from catalog_query import PRICE_BUCKETS, RATING_BANDS, PRODUCT_SORTS
+
+logger = logging.getLogger(__name__)
+
+COLUMN_PROJECTION = {
+    "_id": 0, "id": 1, "category_id": 1, "category_name": 1, "price": 1,
+    "rating": 1, "review_count": 1, "discount_pct": 1, "is_featured": 1, "is_active": 1, "created_at": 1,
+}
+
+# Mirrors the $bucket boundaries of product_facet_pipeline
+PRICE_EDGES = np.array(PRICE_BUCKETS, dtype=np.float64)
+RATING_EDGES = np.array(RATING_BANDS, dtype=np.float64)
+RATING_TOP = 5.000001
+NO_CATEGORY = -1
+EPOCH = datetime(1970, 1, 1)
+# Everything a load replaces, swapped in at once
+SNAPSHOT_FIELDS = (
+    "_ids", "_rows", "_free", "_size", "_live", "_category", "_price", "_discount", "_rating", "_reviews",
+    "_featured", "_created", "_price_bucket", "_rating_band", "_category_codes", "_category_ids",
+    "_category_names",
+)
+
+
+def epoch_ms(value) -> float:
+    return (value - EPOCH).total_seconds() * 1000 if value else 0.0
+
+
+def buckets_of(values: np.ndarray, edges: np.ndarray, top: float) -> np.ndarray:
+    # Out-of-range values get the extra bucket len(edges), dropped when counting
+    buckets = np.searchsorted(edges, values, side="right") - 1
+    buckets[(values < edges[0]) | (values >= top)] = len(edges)
+    return buckets.astype(np.uint8)
+
+
+class CatalogColumns:
+    def __init__(self):
+        self.loaded = False
+        self._task = None
+        self._loading = False
+        self._pending = set()
+        self._category_codes = {}
+        self._category_ids = []
+        self._category_names = []
+        self._allocate(0)
+
+    # ----- loading and refresh -----
+
+    def schedule_reload(self, db):
+        """Reload in the background; queries use the old snapshot meanwhile."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = asyncio.create_task(self._reload(db))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def load(self, db):
+        self._loading = True
+        self._pending = set()
+        try:
+            products = await db.products.find({"is_active": True}, COLUMN_PROJECTION).to_list(None)
+            # Built in a worker thread; queries keep using the old snapshot
+            snapshot = await asyncio.to_thread(self._build, products)
+        finally:
+            self._loading = False
+        for name in SNAPSHOT_FIELDS:
+            setattr(self, name, getattr(snapshot, name))
+        self.loaded = True
+        # Writes that landed while the products were being read
+        pending, self._pending = self._pending, set()
+        if pending:
+            await self.refresh(db, pending)
+
+    @staticmethod
+    def _build(products: list) -> "CatalogColumns":
+        snapshot = CatalogColumns()
+        n = len(products)
+        snapshot._allocate(n)
+        # Column-at-a-time: a per-row loop is far too slow at a million rows
+        snapshot._ids[:] = [p["id"] for p in products]
+        snapshot._rows = {product_id: row for row, product_id in enumerate(snapshot._ids)}
+        snapshot._size = n
+        snapshot._live[:] = True
+        snapshot._category[:] = [
+            snapshot._category_code(p.get("category_id"), p.get("category_name")) for p in products
+        ]
+        snapshot._price[:] = [p.get("price") or 0 for p in products]
+        snapshot._discount[:] = [p.get("discount_pct") or 0 for p in products]
+        snapshot._rating[:] = [p.get("rating") or 0 for p in products]
+        snapshot._reviews[:] = [p.get("review_count") or 0 for p in products]
+        snapshot._featured[:] = [bool(p.get("is_featured")) for p in products]
+        snapshot._created[:] = [epoch_ms(p.get("created_at")) for p in products]
+        snapshot._price_bucket[:] = buckets_of(snapshot._price, PRICE_EDGES, np.inf)
+        snapshot._rating_band[:] = buckets_of(snapshot._rating, RATING_EDGES, RATING_TOP)
+        return snapshot
+
+    async def refresh(self, db, product_ids):
+        if self._loading:
+            # Re-applied once the new snapshot is in place
+            self._pending.update(product_ids)
+        if not self.loaded:
+            return
+        product_ids = list(product_ids)
+        products = await db.products.find({"id": {"$in": product_ids}}, COLUMN_PROJECTION).to_list(None)
+        by_id = {p["id"]: p for p in products}
+        for product_id in product_ids:
+            product = by_id.get(product_id)
+            if product and product.get("is_active"):
+                self._upsert_row(product)
+            elif product_id in self._rows:
+                self._deactivate_row(product_id)
+
+    async def _reload(self, db):
+        try:
+            # May be scheduled from a request; don't inherit its deadline
+            with pymongo.timeout(None):
+                await self.load(db)
+            logger.info("Loaded columnar catalog snapshot: %d products", len(self._rows))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Failed to load columnar catalog snapshot")
+
+    def _allocate(self, n: int):
+        self._ids = np.empty(n, dtype=object)
+        self._rows = {}
+        self._free = []
+        self._size = 0
+        self._live = np.zeros(n, dtype=bool)
+        self._category = np.full(n, NO_CATEGORY, dtype=np.int32)
+        self._price = np.zeros(n, dtype=np.float64)
+        self._discount = np.zeros(n, dtype=np.float64)
+        self._rating = np.zeros(n, dtype=np.float64)
+        self._reviews = np.zeros(n, dtype=np.int64)
+        self._featured = np.zeros(n, dtype=bool)
+        self._created = np.zeros(n, dtype=np.float64)  # epoch milliseconds
+        self._price_bucket = np.full(n, len(PRICE_EDGES), dtype=np.uint8)
+        self._rating_band = np.full(n, len(RATING_EDGES), dtype=np.uint8)
+
+    def _grow(self):
+        # Grow geometrically so a burst of creates is not quadratic
+        extra = max(len(self._live) // 4, 16)
+        for name, fill in (
+            ("_ids", None), ("_live", False), ("_category", NO_CATEGORY), ("_price", 0), ("_discount", 0),
+            ("_rating", 0), ("_reviews", 0), ("_featured", False), ("_created", 0),
+            ("_price_bucket", len(PRICE_EDGES)), ("_rating_band", len(RATING_EDGES)),
+        ):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.full(extra, fill, dtype=column.dtype)]))
+
+    def _category_code(self, category_id: str, category_name: str) -> int:
+        code = self._category_codes.get(category_id)
+        if code is None:
+            code = len(self._category_ids)
+            self._category_codes[category_id] = code
+            self._category_ids.append(category_id)
+            self._category_names.append(category_name)
+        else:
+            self._category_names[code] = category_name
+        return code
+
+    def _upsert_row(self, product: dict):
+        row = self._rows.get(product["id"])
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                if self._size == len(self._live):
+                    self._grow()
+                row = self._size
+                self._size += 1
+            self._ids[row] = product["id"]
+            self._rows[product["id"]] = row
+        price = float(product.get("price") or 0)
+        rating = float(product.get("rating") or 0)
+        self._live[row] = True
+        self._category[row] = self._category_code(product.get("category_id"), product.get("category_name"))
+        self._price[row] = price
+        self._discount[row] = product.get("discount_pct") or 0
+        self._rating[row] = rating
+        self._reviews[row] = product.get("review_count") or 0
+        self._featured[row] = bool(product.get("is_featured"))
+        self._created[row] = epoch_ms(product.get("created_at"))
+        self._price_bucket[row] = buckets_of(np.array([price]), PRICE_EDGES, np.inf)[0]
+        self._rating_band[row] = buckets_of(np.array([rating]), RATING_EDGES, RATING_TOP)[0]
+
+    def _deactivate_row(self, product_id: str):
+        row = self._rows.pop(product_id)
+        self._ids[row] = None
+        self._live[row] = False
+        self._free.append(row)
+
+    # ----- queries -----
+
+    def query(
+        self,
+        category_id=None,
+        is_featured=None,
+        min_price=None,
+        max_price=None,
+        min_rating=None,
+        on_sale=None,
+        sort: str = "newest",
+        skip: int = 0,
+        limit: int = 50,
+        facets: bool = False,
+    ) -> dict:
+        """Page ids, total and (optionally) facet counts, shaped like the $facet result."""
+        base = self._live.copy()
+        if is_featured is not None:
+            base &= self._featured == is_featured
+        if on_sale is not None:
+            sale = self._discount > 0
+            base &= sale if on_sale else ~sale
+
+        faceted = {}
+        if category_id:
+            code = self._category_codes.get(category_id)
+            faceted["category"] = self._category == code if code is not None else np.zeros_like(base)
+        if min_price is not None or max_price is not None:
+            mask = np.ones_like(base)
+            if min_price is not None:
+                mask &= self._price >= min_price
+            if max_price is not None:
+                mask &= self._price <= max_price
+            faceted["price"] = mask
+        if min_rating is not None:
+            faceted["rating"] = self._rating >= min_rating
+
+        def combined(exclude=None):
+            mask = base.copy()
+            for name, clause in faceted.items():
+                if name != exclude:
+                    mask &= clause
+            return mask
+
+        matched = np.flatnonzero(combined())
+        result = {
+            "items": self._page(matched, sort, skip, limit),
+            "total": len(matched),
+        }
+        if facets:
+            category_mask = combined("category") if "category" in faceted else None
+            price_mask = combined("price") if "price" in faceted else None
+            rating_mask = combined("rating") if "rating" in faceted else None
+            all_mask = np.zeros_like(base)
+            all_mask[matched] = True
+            category_counts = np.bincount(
+                self._category[category_mask if category_mask is not None else all_mask],
+                minlength=len(self._category_ids),
+            )
+            result["categories"] = sorted(
+                (
+                    {"_id": self._category_ids[code], "category_name": self._category_names[code],
+                     "count": int(count)}
+                    for code, count in enumerate(category_counts) if count
+                ),
+                key=lambda facet: (-facet["count"], facet["_id"]),
+            )
+            result["price"] = self._bucket_counts(
+                self._price_bucket, price_mask if price_mask is not None else all_mask, PRICE_BUCKETS
+            )
+            result["rating"] = self._bucket_counts(
+                self._rating_band, rating_mask if rating_mask is not None else all_mask, RATING_BANDS
+            )
+        return result
+
+    def nbytes(self) -> int:
+        return sum(
+            getattr(self, name).nbytes for name in (
+                "_ids", "_live", "_category", "_price", "_discount", "_rating",
+                "_reviews", "_featured", "_created", "_price_bucket", "_rating_band",
+            )
+        )
+
+    def _bucket_counts(self, column: np.ndarray, mask: np.ndarray, bounds) -> list:
+        counts = np.bincount(column[mask], minlength=len(bounds) + 1)[:len(bounds)]
+        return [{"_id": bounds[i], "count": int(count)} for i, count in enumerate(counts) if count]
+
+    def _sort_keys(self, rows: np.ndarray, sort: str) -> list:
+        """Ascending keys, most significant first, matching product_sort_stages."""
+        columns = {
+            "created_at": self._created, "price": self._price, "rating": self._rating,
+            "review_count": self._reviews, "discount_pct": self._discount,
+        }
+        fields = dict(PRODUCT_SORTS[sort])
+        fields.setdefault("created_at", -1)
+        return [columns[field][rows] * direction for field, direction in fields.items()]
+
+    def _page(self, rows: np.ndarray, sort: str, skip: int, limit: int) -> list:
+        needed = skip + limit
+        if limit <= 0 or skip >= len(rows):
+            return []
+        keys = self._sort_keys(rows, sort)
+        candidates = self._smallest(np.arange(len(rows)), keys, needed)
+        # Final order on the few candidates, with the id tiebreaker
+        ids = self._ids[rows[candidates]]
+        id_rank = np.argsort(np.argsort(ids))
+        order = np.lexsort([id_rank] + [key[candidates] for key in reversed(keys)])
+        page = rows[candidates[order]][skip:needed]
+        return self._ids[page].tolist()
+
+    def _smallest(self, positions: np.ndarray, keys: list, n: int) -> np.ndarray:
+        """Positions of the ``n`` lexicographically smallest keys, unordered.
+
+        Selects level by level with ``np.partition``, so the cost stays linear
+        even when most rows tie on the leading key (e.g. discount 0). Rows tied
+        on every key at the cut-off are all kept for the id tiebreaker.
+        """
+        if n >= len(positions) or not keys:
+            return positions
+        primary = keys[0][positions]
+        cutoff = np.partition(primary, n - 1)[n - 1]
+        below = positions[primary < cutoff]
+        tied = positions[primary == cutoff]
+        return np.concatenate([below, self._smallest(tied, keys[1:], n - len(below))])
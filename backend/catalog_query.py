@@ -0,0 +1,151 @@
+"""Filter, sort and facet pipeline builders for catalog browsing."""
+from typing import List, Optional
+
+# Lower bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+# Rating bands are whole stars: [0, 1), [1, 2), ... [4, 5]
+RATING_BANDS = [0, 1, 2, 3, 4]
+
+PRODUCT_SORTS = {
+    "newest": [("created_at", -1)],
+    "price_asc": [("price", 1)],
+    "price_desc": [("price", -1)],
+    "rating": [("rating", -1), ("review_count", -1)],
+    "discount": [("discount_pct", -1)],
+}
+
+# Compound indexes backing the browse filters and sorts. Each ends with the
+# created_at/id tiebreakers of product_sort_stages, or the index could not
+# serve the sort; price_desc needs its own, as its reverse differs from
+# price_asc in the tiebreakers
+PRODUCT_INDEXES = [
+    [("is_active", 1), ("created_at", -1), ("id", 1)],
+    [("is_active", 1), ("category_id", 1), ("created_at", -1), ("id", 1)],
+    [("is_active", 1), ("price", 1), ("created_at", -1), ("id", 1)],
+    [("is_active", 1), ("price", -1), ("created_at", -1), ("id", 1)],
+    [("is_active", 1), ("rating", -1), ("review_count", -1), ("created_at", -1), ("id", 1)],
+    [("is_active", 1), ("discount_pct", -1), ("created_at", -1), ("id", 1)],
+    [("is_active", 1), ("category_id", 1), ("discount_pct", -1), ("created_at", -1), ("id", 1)],
+]
+
+# Stored as products.discount_pct on every write; see price_history.discount_pct
+DISCOUNT_PCT_EXPR = {
+    "$cond": [
+        {"$gt": ["$original_price", "$price"]},
+        {"$multiply": [
+            {"$divide": [{"$subtract": ["$original_price", "$price"]}, "$original_price"]}, 100
+        ]},
+        0,
+    ]
+}
+
+
+def build_product_filters(
+    category_id: Optional[str] = None,
+    is_featured: Optional[bool] = None,
+    is_active: bool = True,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    on_sale: Optional[bool] = None,
+):
+    """Split the filters into the shared match and the faceted dimensions.
+
+    Facet counts are disjunctive: each facet ignores its own filter so the
+    client can show how many results picking another value would give.
+    """
+    base = {"is_active": is_active}
+    if is_featured is not None:
+        base["is_featured"] = is_featured
+    if on_sale is not None:
+        base["discount_pct"] = {"$gt": 0} if on_sale else {"$lte": 0}
+
+    faceted = {}
+    if category_id:
+        faceted["category"] = {"category_id": category_id}
+    price = {}
+    if min_price is not None:
+        price["$gte"] = min_price
+    if max_price is not None:
+        price["$lte"] = max_price
+    if price:
+        faceted["price"] = {"price": price}
+    if min_rating is not None:
+        faceted["rating"] = {"rating": {"$gte": min_rating}}
+    return base, faceted
+
+
+def merge_filters(base: dict, faceted: dict, exclude: Optional[str] = None) -> dict:
+    merged = dict(base)
+    for name, clause in faceted.items():
+        if name != exclude:
+            merged.update(clause)
+    return merged
+
+
+def product_sort_stages(sort: str) -> List[dict]:
+    # created_at/id tiebreakers keep pagination stable across equal keys
+    keys = dict(PRODUCT_SORTS[sort])
+    keys.setdefault("created_at", -1)
+    keys["id"] = 1
+    return [{"$sort": keys}]
+
+
+def product_page_pipeline(base: dict, faceted: dict, sort: str, skip: int, limit: int) -> List[dict]:
+    return [{"$match": merge_filters(base, faceted)}] + product_sort_stages(sort) + [
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": {"_id": 0}},
+    ]
+
+
+def product_facet_pipeline(base: dict, faceted: dict, sort: str, skip: int, limit: int) -> List[dict]:
+    def facet_match(exclude):
+        # Drop the facet's own filter; the shared part is already matched
+        clause = merge_filters({}, faceted, exclude=exclude)
+        return [{"$match": clause}] if clause else []
+
+    # Sorted ahead of $facet, where an index on the shared match can serve
+    # it; $facet keeps the order, so the page needs no sort of its own
+    return [
+        {"$match": base},
+        *product_sort_stages(sort),
+        {"$facet": {
+            "items": facet_match(None) + [{"$skip": skip}, {"$limit": limit}, {"$project": {"_id": 0}}],
+            "total": facet_match(None) + [{"$count": "count"}],
+            "categories": facet_match("category") + [
+                {"$group": {
+                    "_id": "$category_id",
+                    "category_name": {"$first": "$category_name"},
+                    "count": {"$sum": 1},
+                }},
+                {"$sort": {"count": -1, "_id": 1}},
+            ],
+            "price": facet_match("price") + [
+                {"$bucket": {
+                    "groupBy": "$price",
+                    "boundaries": PRICE_BUCKETS + [float("inf")],
+                    "default": "other",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+            "rating": facet_match("rating") + [
+                {"$bucket": {
+                    "groupBy": "$rating",
+                    # 5.0 ratings belong to the top band
+                    "boundaries": RATING_BANDS + [5.000001],
+                    "default": "other",
+                    "output": {"count": {"$sum": 1}},
+                }},
+            ],
+        }},
+    ]
+
+
+def range_facets(buckets: List[dict], bounds: List[float], top: Optional[float]) -> List[dict]:
+    counts = {bucket["_id"]: bucket["count"] for bucket in buckets}
+    facets = []
+    for i, lower in enumerate(bounds):
+        upper = bounds[i + 1] if i + 1 < len(bounds) else top
+        facets.append({"min": lower, "max": upper, "count": counts.get(lower, 0)})
+    return facets
@@ -0,0 +1,98 @@
+"""Write-behind counters for affiliate click-throughs.
+
+The redirect path only bumps an in-memory counter. A background task folds
+the counters into ``product_clicks_daily`` (one document per product per UTC
+day) and ``product_clicks`` (running totals) with unordered ``bulk_write``
+``$inc`` batches. A crash loses at most one flush interval or ``max_pending``
+clicks per worker, whichever comes first.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class ClickCounter:
+    def __init__(self, db, flush_interval: float = 5.0, max_pending: int = 1000, max_retained_keys: int = 100000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # Upper bound on counters held across failed flushes
+        self.max_retained_keys = max_retained_keys
+        self._pending = Counter()
+        self._pending_clicks = 0
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    def record(self, product_id: str):
+        day = datetime.utcnow().strftime("%Y-%m-%d")
+        self._pending[(product_id, day)] += 1
+        self._pending_clicks += 1
+        if self._pending_clicks >= self.max_pending:
+            self._wake.set()
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let the loop finish its flush rather than cancelling it: a batch
+        # already swapped out of _pending would be lost mid-write
+        if self._task:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, Counter()
+        self._pending_clicks = 0
+        now = datetime.utcnow()
+
+        daily = []
+        totals = Counter()
+        for (product_id, day), clicks in batch.items():
+            daily.append(UpdateOne(
+                {"product_id": product_id, "day": day},
+                {"$inc": {"clicks": clicks}, "$set": {"updated_at": now}},
+                upsert=True,
+            ))
+            totals[product_id] += clicks
+        total_ops = [
+            UpdateOne(
+                {"product_id": product_id},
+                {"$inc": {"clicks": clicks}, "$set": {"last_click_at": now}},
+                upsert=True,
+            )
+            for product_id, clicks in totals.items()
+        ]
+        try:
+            await asyncio.gather(
+                self.db.product_clicks_daily.bulk_write(daily, ordered=False),
+                self.db.product_clicks.bulk_write(total_ops, ordered=False),
+            )
+        except PyMongoError:
+            # Fold the batch back in for the next attempt; a partial write may
+            # double count, which is preferable to silently dropping clicks
+            logger.exception("Failed to flush %d click counters", len(batch))
+            if len(self._pending) + len(batch) <= self.max_retained_keys:
+                self._pending.update(batch)
+                self._pending_clicks += sum(batch.values())
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
@@ -0,0 +1,124 @@
+"""Per-request deadlines, enforced in MongoDB and in the event loop.
+
+Every GET or HEAD request gets a budget: the seconds configured for its
+route template (``/api/products/{product_id}``), or ``default`` otherwise.
+A client may ask for a different budget with ``X-Request-Deadline-Ms``,
+clamped to ``max_seconds``. A budget of 0 disables the deadline.
+
+Writes are exempt. Cancelling one after its primary write committed would
+drop the side effects that follow (cache invalidation, queued jobs) and
+answer 504 for a change that was made.
+
+The request runs inside ``pymongo.timeout(budget)``. Motor copies the
+context into its executor threads, so every command the request sends
+carries ``maxTimeMS`` for the time left and the server abandons it once the
+deadline passes. The handler itself is cancelled when the budget runs out,
+so no further work is started for a client that has given up.
+
+Either way the client gets a 504 if no response has started, and the route
+template's ``exceeded`` counter goes up. Counters are per worker.
+
+Background tasks created while handling a request inherit its deadline;
+wrap long-lived work in ``pymongo.timeout(None)`` to detach it.
+"""
+import asyncio
+import logging
+from collections import Counter
+
+import pymongo
+from pymongo.errors import PyMongoError
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = "x-request-deadline-ms"
+DEADLINE_METHODS = ("GET", "HEAD")
+
+
+class RequestDeadlines:
+    """Budgets and per-route counters, shared with the admin routes."""
+
+    def __init__(self, default: float = 10.0, per_route: dict = None, max_seconds: float = 30.0):
+        self.default = default
+        self.per_route = per_route or {}
+        self.max_seconds = max_seconds
+        self.requests = Counter()
+        self.exceeded = Counter()
+
+    def budget(self, headers, route: str) -> float:
+        for name, value in headers:
+            if name.decode("latin-1") == DEADLINE_HEADER:
+                try:
+                    requested = float(value) / 1000
+                except ValueError:
+                    break
+                if requested > 0:
+                    return min(requested, self.max_seconds)
+                break
+        return self.per_route.get(route, self.default)
+
+    def stats(self) -> dict:
+        return {
+            "default_seconds": self.default,
+            "max_seconds": self.max_seconds,
+            "routes": self.per_route,
+            "requests": dict(self.requests),
+            "exceeded": dict(self.exceeded),
+        }
+
+
+class DeadlineMiddleware:
+    def __init__(self, app, deadlines: RequestDeadlines, routes):
+        self.app = app
+        self.deadlines = deadlines
+        # The app's routes, to find a request's route template before routing
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in DEADLINE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        route = self._route(scope)
+        budget = self.deadlines.budget(scope["headers"], route)
+        if not budget:
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_tracked(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        self.deadlines.requests[route] += 1
+        try:
+            with pymongo.timeout(budget):
+                await asyncio.wait_for(self.app(scope, receive, send_tracked), budget)
+        except asyncio.TimeoutError:
+            pass
+        except PyMongoError as e:
+            if not e.timeout:
+                raise
+        else:
+            return
+
+        self.deadlines.exceeded[route] += 1
+        logger.warning("Deadline of %.3fs exceeded: %s %s", budget, scope["method"], scope["path"])
+        if started:
+            # Too late for a status code; the connection is dropped mid-response
+            return
+        response = JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+        await response(scope, receive, send)
+
+    def _route(self, scope) -> str:
+        partial = None
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
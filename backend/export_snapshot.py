@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Export public read API responses as static JSON files for CDN/nginx serving.
+
+Each file holds exactly what the API returns for the matching GET request, so
+a front proxy can serve ``<out>/api/...`` directly and fall back to the
+backend on a miss. Layout (paths mirror the URL, with ``.json`` appended):
+
+    api/categories.json                      GET /api/categories
+    api/categories/<id>.json                 GET /api/categories/<id>
+    api/products.json                        GET /api/products
+    api/products/featured.json               GET /api/products?is_featured=true
+    api/products/category/<category_id>.json GET /api/products?category_id=<id>
+    api/products/<id>.json                   GET /api/products/<id>
+    api/products/<id>/related.json           GET /api/products/<id>/related
+    api/products/slug/<slug>.json            GET /api/products/slug/<slug>
+    api/blog/posts.json                      GET /api/blog/posts
+    api/blog/posts/featured.json             GET /api/blog/posts?is_featured=true
+    api/blog/posts/<id>.json                 GET /api/blog/posts/<id>
+    api/blog/posts/<id>/related.json         GET /api/blog/posts/<id>/related
+    api/blog/posts/slug/<slug>.json          GET /api/blog/posts/slug/<slug>
+
+JSON is written with sorted keys and compact separators, so unchanged
+responses produce byte-identical files; those are not rewritten. A manifest
+records which files belong to each entity, so a slug rename or delete removes
+the old files, and the category of every exported product, so an incremental
+export re-renders only the category lists a product write can change.
+
+Usage:
+    python export_snapshot.py --out /srv/snapshot                 # full rebuild
+    python export_snapshot.py --out /srv/snapshot --product <id>  # incremental
+    python export_snapshot.py --out /srv/snapshot --category <id> --post <id>
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from fastapi.encoders import jsonable_encoder
+
+import server
+from server import Category, Product, BlogPost
+from repositories import motor_storage
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+CONCURRENCY = 32
+
+
+def segment(value: str) -> str:
+    return quote(value, safe="")
+
+
+def render(payload) -> bytes:
+    return json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":")).encode()
+
+
+class SnapshotExporter:
+    def __init__(self, db, out_dir: str):
+        self.db = db
+        self.out = Path(out_dir)
+        self.manifest = {}
+        # product id -> category id, as of the last export of the product
+        self.product_categories = {}
+        self.written = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.bytes_written = 0
+
+    def load_manifest(self):
+        path = self.out / MANIFEST
+        saved = json.loads(path.read_text()) if path.exists() else {}
+        if "files" not in saved:
+            # Written before product categories were recorded
+            saved = {"files": saved}
+        self.manifest = saved["files"]
+        self.product_categories = saved.get("product_categories", {})
+
+    def save_manifest(self):
+        self.write("", {"files": self.manifest, "product_categories": self.product_categories}, name=MANIFEST)
+
+    def write(self, path: str, payload, name: str = None):
+        target = self.out / (name or f"api/{path}.json")
+        body = render(payload)
+        if target.exists() and target.read_bytes() == body:
+            self.unchanged += 1
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + ".tmp")
+        tmp.write_bytes(body)
+        os.replace(tmp, target)
+        self.written += 1
+        self.bytes_written += len(body)
+
+    def remove(self, path: str):
+        target = self.out / f"api/{path}.json"
+        if target.exists():
+            target.unlink()
+            self.removed += 1
+
+    def set_entity_files(self, entity: str, paths):
+        # Drop files this entity owned before but no longer produces
+        for stale in set(self.manifest.get(entity, [])) - set(paths):
+            self.remove(stale)
+        if paths:
+            self.manifest[entity] = sorted(paths)
+        else:
+            self.manifest.pop(entity, None)
+
+    # ----- lists -----
+
+    async def export_lists(self, category_ids=None):
+        self.write("categories", await server.get_categories())
+        self.write("products", await self.product_list())
+        self.write("products/featured", await self.product_list(is_featured=True))
+        self.write("blog/posts", await self.blog_post_list())
+        self.write("blog/posts/featured", await self.blog_post_list(is_featured=True))
+        if category_ids is None:
+            category_ids = [c["id"] async for c in self.db.categories.find({}, {"_id": 0, "id": 1})]
+        for category_id in category_ids:
+            await self.export_category(category_id)
+
+    async def product_list(self, category_id=None, is_featured=None):
+        return await server.get_products(
+            category_id=category_id, is_featured=is_featured, is_active=True, min_price=None,
+            max_price=None, min_rating=None, on_sale=None, sort="newest", limit=50, skip=0,
+        )
+
+    async def blog_post_list(self, is_featured=None):
+        return await server.get_blog_posts(
+            category_id=None, is_published=True, is_featured=is_featured, limit=20, skip=0
+        )
+
+    # ----- entities -----
+
+    async def export_category(self, category_id: str):
+        category = await self.db.categories.find_one({"id": category_id}, {"_id": 0})
+        paths = []
+        if category:
+            paths = [f"categories/{segment(category_id)}", f"products/category/{segment(category_id)}"]
+            self.write(paths[0], Category(**category))
+            self.write(paths[1], await self.product_list(category_id=category_id))
+        self.set_entity_files(f"category:{category_id}", paths)
+
+    async def export_product(self, product_id: str, product: dict = None):
+        if product is None:
+            product = await self.db.products.find_one({"id": product_id}, {"_id": 0})
+        paths = []
+        if product and product.get("is_active"):
+            model = Product(**product)
+            paths = [
+                f"products/{segment(product_id)}",
+                f"products/slug/{segment(product['slug'])}",
+                f"products/{segment(product_id)}/related",
+            ]
+            self.write(paths[0], model)
+            self.write(paths[1], model)
+            self.write(paths[2], await server.get_related_products(product_id, limit=4))
+            self.product_categories[product_id] = product["category_id"]
+        else:
+            self.product_categories.pop(product_id, None)
+        self.set_entity_files(f"product:{product_id}", paths)
+
+    async def export_blog_post(self, post_id: str, post: dict = None):
+        if post is None:
+            post = await self.db.blog_posts.find_one({"id": post_id}, {"_id": 0})
+        paths = []
+        if post and post.get("is_published"):
+            model = BlogPost(**post)
+            paths = [
+                f"blog/posts/{segment(post_id)}",
+                f"blog/posts/slug/{segment(post['slug'])}",
+                f"blog/posts/{segment(post_id)}/related",
+            ]
+            self.write(paths[0], model)
+            self.write(paths[1], model)
+            self.write(paths[2], await server.get_related_blog_posts(post_id, limit=3))
+        self.set_entity_files(f"blog_post:{post_id}", paths)
+
+    # ----- modes -----
+
+    async def full(self):
+        self.load_manifest()
+        seen = set()
+        category_ids = [c["id"] async for c in self.db.categories.find({}, {"_id": 0, "id": 1})]
+        seen.update(f"category:{category_id}" for category_id in category_ids)
+        await self.export_lists(category_ids)
+        products = self.db.products.find({"is_active": True}, {"_id": 0})
+        seen.update(f"product:{product_id}" for product_id in await self.export_each(products, self.export_product))
+        posts = self.db.blog_posts.find({"is_published": True}, {"_id": 0})
+        seen.update(f"blog_post:{post_id}" for post_id in await self.export_each(posts, self.export_blog_post))
+
+        for entity in set(self.manifest) - seen:
+            if entity.startswith("product:"):
+                self.product_categories.pop(entity.split(":", 1)[1], None)
+            self.set_entity_files(entity, [])
+        self.save_manifest()
+
+    async def export_each(self, cursor, export) -> list:
+        """Export every document of ``cursor`` in chunks of CONCURRENCY, so
+        only one chunk of documents (images included) is held at a time."""
+        ids = []
+        chunk = []
+        async for doc in cursor:
+            ids.append(doc["id"])
+            chunk.append(doc)
+            if len(chunk) == CONCURRENCY:
+                await asyncio.gather(*(export(doc["id"], doc) for doc in chunk))
+                chunk = []
+        await asyncio.gather(*(export(doc["id"], doc) for doc in chunk))
+        return ids
+
+    async def incremental(self, product_ids=(), category_ids=(), post_ids=()):
+        """Re-render only the files a write to these entities can change."""
+        self.load_manifest()
+        product_ids, category_ids, post_ids = set(product_ids), set(category_ids), set(post_ids)
+
+        if product_ids:
+            # The written products' category lists: the one each is in now and
+            # the one it was last exported in, which it may have left
+            async for product in self.db.products.find(
+                {"id": {"$in": list(product_ids)}}, {"_id": 0, "category_id": 1}
+            ):
+                category_ids.add(product["category_id"])
+            for product_id in product_ids:
+                if product_id in self.product_categories:
+                    category_ids.add(self.product_categories[product_id])
+                elif f"product:{product_id}" in self.manifest:
+                    # Exported before categories were recorded
+                    category_ids.update(e.split(":", 1)[1] for e in self.manifest if e.startswith("category:"))
+            # Products listing a written product among their neighbours
+            async for entry in self.db.product_related.find(
+                {"related.id": {"$in": list(product_ids)}}, {"_id": 0, "product_id": 1}
+            ):
+                product_ids.add(entry["product_id"])
+        if post_ids:
+            async for entry in self.db.blog_related.find(
+                {"related.id": {"$in": list(post_ids)}}, {"_id": 0, "post_id": 1}
+            ):
+                post_ids.add(entry["post_id"])
+
+        self.write("categories", await server.get_categories())
+        if product_ids or category_ids:
+            self.write("products", await self.product_list())
+            self.write("products/featured", await self.product_list(is_featured=True))
+        if post_ids:
+            self.write("blog/posts", await self.blog_post_list())
+            self.write("blog/posts/featured", await self.blog_post_list(is_featured=True))
+        for category_id in category_ids:
+            await self.export_category(category_id)
+        for product_id in product_ids:
+            await self.export_product(product_id)
+        for post_id in post_ids:
+            await self.export_blog_post(post_id)
+        self.save_manifest()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Export public API responses to static JSON files")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--product", action="append", default=[], help="Re-render files for a product id")
+    parser.add_argument("--category", action="append", default=[], help="Re-render files for a category id")
+    parser.add_argument("--post", action="append", default=[], help="Re-render files for a blog post id")
+    args = parser.parse_args()
+
+    # Read from the primary so an export that follows a write sees it
+    server.read_db = server.db
+    server.storage = motor_storage(server.db)
+    exporter = SnapshotExporter(server.db, args.out)
+    started = time.perf_counter()
+    if args.product or args.category or args.post:
+        await exporter.incremental(args.product, args.category, args.post)
+    else:
+        await exporter.full()
+    logger.info(
+        "Snapshot export: %d written, %d unchanged, %d removed, %.1f MB in %.2fs",
+        exporter.written, exporter.unchanged, exporter.removed,
+        exporter.bytes_written / 1e6, time.perf_counter() - started,
+    )
+    server.client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,231 @@
+"""Sitemap and blog feed documents, kept pre-rendered in memory.
+
+The sitemap is split into shards by a stable hash of each entity, so an admin
+write only marks its own shard dirty; a dirty shard is re-rendered on its next
+request. Past one shard, ``/sitemap.xml`` becomes a sitemap index. The RSS and
+Atom feeds are rendered from the latest published posts and re-rendered only
+after a blog write. Every document is served as cached bytes with an ETag.
+
+Both follow the invalidation bus, so server.py rebuilds the sitemap and
+invalidates the feeds whenever the bus resubscribes, as writes made while it
+was down never arrive as messages.
+"""
+import hashlib
+import math
+import zlib
+from datetime import datetime
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+# The protocol caps a sitemap at 50,000 URLs; leave headroom for growth
+# between reshards
+SITEMAP_MAX_URLS = 50000
+SITEMAP_TARGET_URLS = 40000
+FEED_SIZE = 20
+
+STATIC_PAGES = ["/", "/products", "/blog"]
+
+SITEMAP_SOURCES = {
+    # kind: (collection, visibility filter, path prefix, lastmod fields)
+    "product": ("products", {"is_active": True}, "/products/", ("updated_at", "created_at")),
+    "category": ("categories", {}, "/category/", ("created_at",)),
+    "blog_post": ("blog_posts", {"is_published": True}, "/blog/", ("updated_at", "published_at", "created_at")),
+}
+
+
+def w3c_date(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class RenderedDocument:
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+class SitemapBuilder:
+    def __init__(self, site_url: str):
+        self.site_url = site_url.rstrip("/")
+        self.n_shards = 1
+        self._shards = [{}]  # shard -> {(kind, id): (loc, lastmod)}
+        self._rendered = {}  # shard -> RenderedDocument
+        self._index = None
+        # One list per build in progress: refreshes made while it reads
+        self._builds = []
+
+    async def build(self, db):
+        refreshed = []
+        self._builds.append(refreshed)
+        try:
+            entries = {}
+            for kind in SITEMAP_SOURCES:
+                async for key, value in self._load(db, kind, None):
+                    entries[key] = value
+        finally:
+            self._builds.remove(refreshed)
+        self._reshard(entries)
+        # The build may have read those entities before their write
+        for kind, ids in refreshed:
+            await self.refresh(db, kind, ids)
+
+    async def refresh(self, db, kind: str, ids):
+        if kind not in SITEMAP_SOURCES:
+            return
+        ids = list(ids)
+        for refreshed in self._builds:
+            refreshed.append((kind, ids))
+        for entity_id in ids:
+            key = (kind, entity_id)
+            shard = self._shard_of(key)
+            if self._shards[shard].pop(key, None) is not None:
+                self._mark_dirty(shard)
+        async for key, value in self._load(db, kind, ids):
+            shard = self._shard_of(key)
+            self._shards[shard][key] = value
+            self._mark_dirty(shard)
+        total = sum(len(shard) for shard in self._shards)
+        if max(len(shard) for shard in self._shards) > SITEMAP_MAX_URLS or (
+            self.n_shards > 1 and total < SITEMAP_TARGET_URLS * (self.n_shards - 1) / 2
+        ):
+            # Growth or shrinkage changes the shard count; rehash everything
+            entries = {}
+            for shard in self._shards:
+                entries.update(shard)
+            self._reshard(entries)
+
+    def index(self) -> RenderedDocument:
+        """The document served at /sitemap.xml."""
+        if self.n_shards == 1:
+            return self.shard(0)
+        if self._index is None:
+            parts = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+                     '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+            for n, shard in enumerate(self._shards):
+                parts.append(f"<sitemap><loc>{escape(self.site_url)}/api/sitemaps/{n}.xml</loc>")
+                if shard:
+                    parts.append(f"<lastmod>{w3c_date(max(v[1] for v in shard.values()))}</lastmod>")
+                parts.append("</sitemap>\n")
+            parts.append("</sitemapindex>\n")
+            self._index = RenderedDocument("".join(parts).encode(), "application/xml")
+        return self._index
+
+    def shard(self, n: int):
+        if n < 0 or n >= self.n_shards:
+            return None
+        if n not in self._rendered:
+            parts = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+                     '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+            if n == 0:
+                for path in STATIC_PAGES:
+                    parts.append(f"<url><loc>{escape(self.site_url + path)}</loc></url>\n")
+            for loc, lastmod in sorted(self._shards[n].values()):
+                parts.append(f"<url><loc>{escape(loc)}</loc><lastmod>{w3c_date(lastmod)}</lastmod></url>\n")
+            parts.append("</urlset>\n")
+            self._rendered[n] = RenderedDocument("".join(parts).encode(), "application/xml")
+        return self._rendered[n]
+
+    async def _load(self, db, kind: str, ids):
+        collection, visible, prefix, date_fields = SITEMAP_SOURCES[kind]
+        query = dict(visible)
+        if ids is not None:
+            query["id"] = {"$in": ids}
+        projection = {"_id": 0, "id": 1, "slug": 1, **{field: 1 for field in date_fields}}
+        async for doc in db[collection].find(query, projection):
+            lastmod = next((doc[f] for f in date_fields if doc.get(f)), datetime.utcnow())
+            yield (kind, doc["id"]), (self.site_url + prefix + quote(doc["slug"]), lastmod)
+
+    def _reshard(self, entries: dict):
+        self.n_shards = max(1, math.ceil(len(entries) / SITEMAP_TARGET_URLS))
+        self._shards = [{} for _ in range(self.n_shards)]
+        for key, value in entries.items():
+            self._shards[self._shard_of(key)][key] = value
+        self._rendered = {}
+        self._index = None
+
+    def _shard_of(self, key) -> int:
+        return zlib.crc32(f"{key[0]}:{key[1]}".encode()) % self.n_shards
+
+    def _mark_dirty(self, shard: int):
+        self._rendered.pop(shard, None)
+        self._index = None
+
+
+class BlogFeed:
+    def __init__(self, site_url: str, title: str, description: str):
+        self.site_url = site_url.rstrip("/")
+        self.title = title
+        self.description = description
+        self._posts = None
+        self._rendered = {}
+        self._generation = 0
+
+    def invalidate(self):
+        self._posts = None
+        self._rendered = {}
+        self._generation += 1
+
+    async def render(self, db, fmt: str) -> RenderedDocument:
+        """Render from cache; ``db`` should be the primary, or a stale list stays cached."""
+        if fmt in self._rendered:
+            return self._rendered[fmt]
+        render = self._rss if fmt == "rss" else self._atom
+        posts = self._posts
+        if posts is None:
+            generation = self._generation
+            posts = await db.blog_posts.find(
+                {"is_published": True},
+                {"_id": 0, "id": 1, "title": 1, "slug": 1, "excerpt": 1, "author": 1,
+                 "tags": 1, "published_at": 1, "updated_at": 1},
+            ).sort("published_at", -1).limit(FEED_SIZE).to_list(FEED_SIZE)
+            if generation != self._generation:
+                # Invalidated while reading: serve this one, cache the next
+                return render(posts)
+            self._posts = posts
+        self._rendered[fmt] = render(posts)
+        return self._rendered[fmt]
+
+    def _rss(self, posts) -> RenderedDocument:
+        parts = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+                 '<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>\n',
+                 f"<title>{escape(self.title)}</title><link>{escape(self.site_url)}/blog</link>",
+                 f"<description>{escape(self.description)}</description>\n"]
+        for post in posts:
+            link = escape(f"{self.site_url}/blog/{quote(post['slug'])}")
+            published = post.get("published_at") or post.get("updated_at")
+            parts.append(
+                f"<item><title>{escape(post['title'])}</title><link>{link}</link>"
+                f'<guid isPermaLink="false">{escape(post["id"])}</guid>'
+                f"<description>{escape(post.get('excerpt') or '')}</description>"
+                f"<dc:creator>{escape(post.get('author') or '')}</dc:creator>"
+            )
+            for tag in post.get("tags") or []:
+                parts.append(f"<category>{escape(tag)}</category>")
+            if published:
+                parts.append(f"<pubDate>{published.strftime('%a, %d %b %Y %H:%M:%S GMT')}</pubDate>")
+            parts.append("</item>\n")
+        parts.append("</channel></rss>\n")
+        return RenderedDocument("".join(parts).encode(), "application/rss+xml")
+
+    def _atom(self, posts) -> RenderedDocument:
+        updated = max((p.get("updated_at") or p.get("published_at") for p in posts), default=datetime.utcnow())
+        parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">\n',
+                 f"<title>{escape(self.title)}</title><subtitle>{escape(self.description)}</subtitle>",
+                 f'<link href="{escape(self.site_url)}/blog"/><id>{escape(self.site_url)}/blog</id>',
+                 f"<updated>{w3c_date(updated)}</updated>\n"]
+        for post in posts:
+            link = escape(f"{self.site_url}/blog/{quote(post['slug'])}")
+            published = post.get("published_at") or post.get("updated_at")
+            parts.append(
+                f'<entry><title>{escape(post["title"])}</title><link href="{link}"/>'
+                f"<id>urn:uuid:{escape(post['id'])}</id>"
+                f"<updated>{w3c_date(post.get('updated_at') or published)}</updated>"
+            )
+            if published:
+                parts.append(f"<published>{w3c_date(published)}</published>")
+            parts.append(
+                f"<author><name>{escape(post.get('author') or '')}</name></author>"
+                f"<summary>{escape(post.get('excerpt') or '')}</summary></entry>\n"
+            )
+        parts.append("</feed>\n")
+        return RenderedDocument("".join(parts).encode(), "application/atom+xml")
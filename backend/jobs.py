@@ -0,0 +1,247 @@
+"""In-process background jobs for slow post-write side effects.
+
+Every job is first stored in the ``jobs`` collection, then offered to this
+worker's bounded in-memory queue (lowest ``priority`` first). At most
+``concurrency`` jobs run at once. A job runs only after a worker claims it
+with an atomic ``queued -> running`` update, so one execution wins even when
+several workers hold the same id. The claim carries a lease of
+``job_timeout`` seconds.
+
+Failures are retried with exponential backoff up to ``max_attempts``; the
+job is then marked ``failed``. A recovery sweep every ``poll_interval``
+seconds does two things:
+
+- requeues jobs whose lease expired (their worker crashed);
+- loads due jobs this worker is not holding: retries, jobs enqueued while
+  the memory queue was full, and jobs left over from a restart.
+
+Finished jobs expire from the collection after ``retention_seconds``.
+Handlers are async callables that take the payload as keyword arguments.
+The payload must be storable in BSON.
+"""
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db,
+        worker_id: str,
+        concurrency: int = 4,
+        max_queued: int = 1000,
+        max_attempts: int = 5,
+        retry_delay: float = 2.0,
+        job_timeout: float = 300,
+        poll_interval: float = 5.0,
+        retention_seconds: float = 86400,
+    ):
+        self.db = db
+        self.collection = db.jobs
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.job_timeout = job_timeout
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._handlers = {}
+        self._queue = None
+        self._held = set()
+        self._running = set()
+        self._seq = 0
+        self._tasks = []
+        self.stats = Counter()
+
+    def register(self, name: str, handler, priority: int = 5):
+        self._handlers[name] = (handler, priority)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index([("status", 1), ("priority", 1), ("run_at", 1)])
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def enqueue(self, name: str, priority: int = None, **payload) -> str:
+        """Store a job and offer it to the local workers; returns the job id."""
+        if name not in self._handlers:
+            raise KeyError(f"No job handler registered for {name!r}")
+        now = datetime.utcnow()
+        job = {
+            "id": uuid.uuid4().hex,
+            "name": name,
+            "payload": payload,
+            "priority": self._handlers[name][1] if priority is None else priority,
+            "status": "queued",
+            "attempts": 0,
+            "run_at": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.collection.insert_one(job)
+        self.stats["enqueued"] += 1
+        self._offer(job)
+        return job["id"]
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._recover_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def status(self) -> dict:
+        counts = {status: 0 for status in JOB_STATUSES}
+        by_name = {}
+        async for row in self.collection.aggregate([
+            {"$group": {"_id": {"name": "$name", "status": "$status"}, "count": {"$sum": 1}}},
+        ]):
+            name, status = row["_id"]["name"], row["_id"]["status"]
+            counts[status] = counts.get(status, 0) + row["count"]
+            by_name.setdefault(name, {})[status] = row["count"]
+        failed = await self.collection.find(
+            {"status": "failed"}, {"_id": 0, "payload": 0}
+        ).sort("updated_at", -1).limit(20).to_list(20)
+        return {
+            "counts": counts,
+            "by_name": by_name,
+            "recent_failures": failed,
+            "worker": {
+                "id": self.worker_id,
+                "queued": self._queue.qsize() if self._queue else 0,
+                "running": len(self._running),
+                "concurrency": self.concurrency,
+                **self.stats,
+            },
+        }
+
+    async def get(self, job_id: str):
+        return await self.collection.find_one({"id": job_id}, {"_id": 0})
+
+    def _offer(self, job: dict):
+        if self._queue is None or job["id"] in self._held:
+            return
+        self._seq += 1
+        try:
+            self._queue.put_nowait((job["priority"], self._seq, job["id"]))
+        except asyncio.QueueFull:
+            # Stays queued in Mongo; the recovery sweep picks it up later
+            self.stats["overflowed"] += 1
+            return
+        self._held.add(job["id"])
+
+    async def _work(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            self._held.discard(job_id)
+            try:
+                await self._run(job_id)
+            except PyMongoError:
+                logger.exception("Job store unavailable while running job %s", job_id)
+
+    async def _run(self, job_id: str):
+        now = datetime.utcnow()
+        job = await self.collection.find_one_and_update(
+            {"id": job_id, "status": "queued", "run_at": {"$lte": now}},
+            {"$set": {
+                "status": "running", "worker": self.worker_id, "started_at": now, "updated_at": now,
+                "lease_until": now + timedelta(seconds=self.job_timeout),
+            }, "$inc": {"attempts": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if job is None:
+            # Claimed elsewhere, finished already or not due yet
+            return
+        job["attempts"] += 1
+        handler = self._handlers.get(job["name"])
+        if handler is None:
+            await self._finish(job, "failed", error=f"No job handler registered for {job['name']!r}")
+            return
+
+        self._running.add(job_id)
+        try:
+            await asyncio.wait_for(handler[0](**job["payload"]), timeout=self.job_timeout)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back for the next sweep
+            await self.collection.update_one(
+                {"id": job_id, "status": "running"},
+                {"$set": {"status": "queued", "run_at": datetime.utcnow(), "updated_at": datetime.utcnow()},
+                 "$inc": {"attempts": -1}},
+            )
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] >= self.max_attempts:
+                logger.exception("Job %s %s failed for good after %d attempts", job["name"], job_id, job["attempts"])
+                await self._finish(job, "failed", error=error)
+            else:
+                delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+                logger.warning("Job %s %s failed (%s), retrying in %.0fs", job["name"], job_id, error, delay)
+                self.stats["retried"] += 1
+                await self.collection.update_one(
+                    {"id": job_id},
+                    {"$set": {
+                        "status": "queued", "error": error, "updated_at": datetime.utcnow(),
+                        "run_at": datetime.utcnow() + timedelta(seconds=delay),
+                    }, "$unset": {"lease_until": ""}},
+                )
+        else:
+            await self._finish(job, "done")
+        finally:
+            self._running.discard(job_id)
+
+    async def _finish(self, job: dict, status: str, error: str = None):
+        now = datetime.utcnow()
+        update = {
+            "status": status, "finished_at": now, "updated_at": now,
+            "expires_at": now + timedelta(seconds=self.retention_seconds),
+        }
+        if error is not None:
+            update["error"] = error
+        await self.collection.update_one({"id": job["id"]}, {"$set": update, "$unset": {"lease_until": ""}})
+        self.stats[status] += 1
+
+    async def _recover_loop(self):
+        while True:
+            try:
+                await self._recover()
+            except PyMongoError:
+                logger.exception("Job recovery sweep failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _recover(self):
+        now = datetime.utcnow()
+        expired = await self.collection.update_many(
+            {"status": "running", "lease_until": {"$lt": now}},
+            {"$set": {"status": "queued", "run_at": now, "updated_at": now}, "$unset": {"lease_until": ""}},
+        )
+        if expired.modified_count:
+            logger.warning("Requeued %d jobs whose worker stopped renewing them", expired.modified_count)
+        free = self.max_queued - self._queue.qsize()
+        if free <= 0:
+            return
+        due = self.collection.find(
+            {"status": "queued", "run_at": {"$lte": now}, "id": {"$nin": list(self._held)}},
+            {"_id": 0, "id": 1, "priority": 1},
+        ).sort([("priority", 1), ("run_at", 1)]).limit(free)
+        async for job in due:
+            self._offer(job)
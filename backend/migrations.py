@@ -0,0 +1,285 @@
+"""Resumable, throttled data migrations.
+
+A ``Migration`` names a collection, a filter for the documents it still has
+to change and an ``update(doc)`` function returning an update document (or
+``None`` to leave the document alone). A migration with no ``update`` only
+runs its ``after_batch`` side effect, on every matching document. The runner
+walks the collection in ``_id`` order with range scans of ``batch_size``
+documents, never holding more than one batch, and writes each batch with one
+unordered ``bulk_write``. Each update repeats the filter, so a document
+changed by another writer since the read is left alone.
+
+Progress lives in the ``migrations`` collection, one document per version:
+the last ``_id`` processed, counts and a lease. A migration interrupted
+part-way resumes after its checkpoint; a finished one is never run again.
+The lease lets one runner at a time work on a version, so every worker can
+call ``start`` on boot. A runner that dies stops renewing its lease, and
+another runner resumes once it expires. Versions run strictly in order: a
+runner that finds a version leased elsewhere stops there rather than run
+later versions ahead of it.
+
+Writes are throttled to protect the primary. A batch whose write takes
+longer than ``max_batch_seconds`` halves the batch size and is followed by
+a pause of the same length. Every ``lag_check_every`` batches the runner
+waits, renewing its lease, while secondaries are more than
+``max_lag_seconds`` behind. Lag is read from ``replSetGetStatus``; without
+a replica set, or without the privilege to run it, only the latency
+throttle applies.
+
+Usage:
+    python migrations.py status
+    python migrations.py run [--batch-size 500]
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class Migration:
+    def __init__(self, version: int, name: str, collection: str, query: dict, update, projection: dict = None,
+                 after_batch=None):
+        self.version = version
+        self.name = name
+        self.collection = collection
+        self.query = query
+        # update(doc) -> update document or None; None for side effects only
+        self.update = update
+        self.projection = projection
+        # Optional async after_batch(docs) for side effects of a written batch;
+        # docs carry the fields set by their update
+        self.after_batch = after_batch
+
+
+async def replication_lag(db):
+    """Seconds the furthest secondary is behind the primary, or None if unknown."""
+    try:
+        status = await db.client.admin.command("replSetGetStatus")
+    except PyMongoError:
+        return None
+    members = status.get("members", [])
+    primary = next((m["optimeDate"] for m in members if m.get("stateStr") == "PRIMARY"), None)
+    secondaries = [m["optimeDate"] for m in members if m.get("stateStr") == "SECONDARY"]
+    if primary is None or not secondaries:
+        return 0.0
+    return max((primary - optime).total_seconds() for optime in secondaries)
+
+
+class MigrationRunner:
+    def __init__(
+        self,
+        db,
+        batch_size: int = 500,
+        max_batch_seconds: float = 1.0,
+        max_lag_seconds: float = 10,
+        lag_check_every: int = 10,
+        lease_seconds: float = 120,
+    ):
+        self.db = db
+        self.collection = db.migrations
+        self.batch_size = batch_size
+        self.max_batch_seconds = max_batch_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_every = lag_check_every
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+        self._task = None
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("version", unique=True)
+
+    async def start(self, migrations):
+        self._task = asyncio.create_task(self._run_logged(migrations))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def status(self, migrations) -> list:
+        states = {
+            state["version"]: state
+            async for state in self.collection.find({}, {"_id": 0, "owner": 0, "last_id": 0})
+        }
+        return [
+            {"version": m.version, "name": m.name, "status": "pending", **states.get(m.version, {})}
+            for m in sorted(migrations, key=lambda m: m.version)
+        ]
+
+    async def run(self, migrations) -> list:
+        """Run every pending migration in version order; returns one report per migration run."""
+        versions = [m.version for m in migrations]
+        if len(set(versions)) != len(versions):
+            raise ValueError("Migration versions must be unique")
+        # The unique version index is what makes a claim exclusive
+        await self.ensure_indexes()
+        reports = []
+        for migration in sorted(migrations, key=lambda m: m.version):
+            report = await self.run_one(migration)
+            if report is not None:
+                reports.append(report)
+            elif not await self.collection.find_one({"version": migration.version, "status": "done"}):
+                # Leased elsewhere: later versions may depend on this one
+                logger.info(
+                    "Migration %d %s: running elsewhere, leaving later versions to that runner",
+                    migration.version, migration.name,
+                )
+                break
+        return reports
+
+    async def run_one(self, migration: Migration):
+        state = await self._claim(migration)
+        if state is None:
+            return None
+        last_id = state.get("last_id")
+        scanned, modified = state.get("scanned", 0), state.get("modified", 0)
+        batch_size = self.batch_size
+        batches = 0
+        started = time.perf_counter()
+        logger.info("Migration %d %s: starting after %s", migration.version, migration.name, last_id)
+        collection = self.db[migration.collection]
+
+        while True:
+            query = dict(migration.query)
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            docs = await collection.find(query, migration.projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+
+            operations = []
+            changed = []
+            if migration.update is None:
+                changed = docs
+            else:
+                for doc in docs:
+                    update = migration.update(doc)
+                    if update:
+                        operations.append(UpdateOne({"_id": doc["_id"], **migration.query}, update))
+                        changed.append({**doc, **update.get("$set", {})})
+            write_started = time.perf_counter()
+            if operations:
+                result = await collection.bulk_write(operations, ordered=False)
+                modified += result.modified_count
+            write_seconds = time.perf_counter() - write_started
+            if changed and migration.after_batch:
+                await migration.after_batch(changed)
+
+            last_id = docs[-1]["_id"]
+            scanned += len(docs)
+            batches += 1
+            if not await self._checkpoint(migration, {"last_id": last_id, "scanned": scanned, "modified": modified}):
+                logger.warning("Migration %d %s: lease lost, stopping", migration.version, migration.name)
+                return None
+
+            if write_seconds > self.max_batch_seconds:
+                batch_size = max(10, batch_size // 2)
+                await asyncio.sleep(write_seconds)
+            elif write_seconds < self.max_batch_seconds / 4 and batch_size < self.batch_size:
+                batch_size = min(self.batch_size, batch_size * 2)
+            if self.lag_check_every and batches % self.lag_check_every == 0:
+                if not await self._wait_for_secondaries(migration):
+                    logger.warning("Migration %d %s: lease lost, stopping", migration.version, migration.name)
+                    return None
+
+        await self._checkpoint(migration, {"status": "done", "finished_at": datetime.utcnow()}, release=True)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Migration %d %s: done, %d scanned, %d modified in %.1fs",
+            migration.version, migration.name, scanned, modified, elapsed,
+        )
+        return {
+            "version": migration.version, "name": migration.name,
+            "scanned": scanned, "modified": modified, "elapsed_seconds": round(elapsed, 3),
+        }
+
+    async def _claim(self, migration: Migration):
+        """Take the lease on a pending migration; None if it is done or leased elsewhere."""
+        now = datetime.utcnow()
+        try:
+            return await self.collection.find_one_and_update(
+                {
+                    "version": migration.version,
+                    "status": {"$ne": "done"},
+                    "$or": [{"owner": self.owner}, {"owner": None}, {"lease_until": {"$lt": now}}],
+                },
+                {
+                    "$set": {
+                        "name": migration.name, "status": "running", "owner": self.owner,
+                        "lease_until": now + timedelta(seconds=self.lease_seconds), "updated_at": now,
+                    },
+                    "$setOnInsert": {"started_at": now},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # The version exists but is done or leased by another runner
+            return None
+
+    async def _checkpoint(self, migration: Migration, fields: dict, release: bool = False) -> bool:
+        now = datetime.utcnow()
+        update = {**fields, "updated_at": now}
+        if release:
+            update["owner"] = None
+        else:
+            update["lease_until"] = now + timedelta(seconds=self.lease_seconds)
+        result = await self.collection.update_one(
+            {"version": migration.version, "owner": self.owner}, {"$set": update}
+        )
+        return result.matched_count == 1
+
+    async def _wait_for_secondaries(self, migration: Migration) -> bool:
+        """Wait out replication lag, renewing the lease; False if it was lost."""
+        while True:
+            lag = await replication_lag(self.db)
+            if lag is None or lag <= self.max_lag_seconds:
+                return True
+            logger.info("Replication lag %.1fs, pausing migration", lag)
+            await asyncio.sleep(min(lag, 5))
+            if not await self._checkpoint(migration, {}):
+                return False
+
+    async def _run_logged(self, migrations):
+        try:
+            await self.run(migrations)
+        except PyMongoError:
+            # The lease expires and the next start resumes from the checkpoint
+            logger.exception("Migrations stopped")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Run or inspect data migrations")
+    parser.add_argument("command", choices=["status", "run"])
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    async def main():
+        # server owns the registry, whose migrations use its models and helpers
+        import server
+
+        runner = server.migration_runner
+        if args.batch_size:
+            runner.batch_size = args.batch_size
+        if args.command == "run":
+            print(json.dumps(await runner.run(server.MIGRATIONS), indent=2))
+        else:
+            print(json.dumps(await runner.status(server.MIGRATIONS), indent=2, default=str))
+        server.client.close()
+
+    asyncio.run(main())
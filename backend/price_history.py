@@ -0,0 +1,92 @@
+"""Product price history.
+
+Every change to a product's ``price`` or ``original_price`` is appended to
+``price_history``, a time-series collection keyed by ``product_id`` (a plain
+collection with a TTL index on servers without time-series support). Raw
+points expire after ``raw_days``.
+
+Each point is also folded into ``price_history_daily`` as it is written (one
+document per product per UTC day with open/low/high/close), which is kept for
+``retention_days``. History therefore stays bounded without a compaction job:
+recent changes at full resolution, older ones as daily candles.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def discount_pct(price, original_price) -> float:
+    """Percent off ``original_price``; kept in step with DISCOUNT_PCT_EXPR."""
+    if original_price is not None and price is not None and original_price > price:
+        return (original_price - price) / original_price * 100
+    return 0.0
+
+
+class PriceHistory:
+    def __init__(self, db, raw_days: int = 90, retention_days: int = 730):
+        self.db = db
+        self.raw_days = raw_days
+        self.retention_days = retention_days
+        self.points = db.price_history
+        self.daily = db.price_history_daily
+
+    async def ensure_collections(self):
+        try:
+            await self.db.create_collection(
+                "price_history",
+                timeseries={"timeField": "ts", "metaField": "product_id", "granularity": "hours"},
+                expireAfterSeconds=self.raw_days * 86400,
+            )
+        except CollectionInvalid:
+            pass
+        except OperationFailure as e:
+            # NamespaceExists when another worker won the race; anything else
+            # means no time-series support (MongoDB < 5.0)
+            if e.code != 48:
+                logger.info("Time-series collections unavailable, using a TTL-indexed collection: %s", e)
+                await self.points.create_index("ts", expireAfterSeconds=self.raw_days * 86400)
+        await self.points.create_index([("product_id", 1), ("ts", -1)])
+        await self.daily.create_index([("product_id", 1), ("day", 1)], unique=True)
+        await self.daily.create_index("updated_at", expireAfterSeconds=self.retention_days * 86400)
+
+    async def record(self, changes, ts: datetime = None):
+        """Append ``(product_id, price, original_price)`` changes."""
+        changes = list(changes)
+        if not changes:
+            return
+        ts = ts or datetime.utcnow()
+        day = ts.strftime("%Y-%m-%d")
+        await self.points.insert_many([
+            {"ts": ts, "product_id": product_id, "price": price, "original_price": original_price}
+            for product_id, price, original_price in changes
+        ])
+        await self.daily.bulk_write([
+            UpdateOne(
+                {"product_id": product_id, "day": day},
+                {
+                    "$setOnInsert": {"open": price},
+                    "$min": {"low": price},
+                    "$max": {"high": price},
+                    "$set": {"close": price, "original_price": original_price, "updated_at": ts},
+                },
+                upsert=True,
+            )
+            for product_id, price, original_price in changes
+        ], ordered=False)
+
+    async def history(self, product_id: str, days: int):
+        since = datetime.utcnow() - timedelta(days=days)
+        raw_since = max(since, datetime.utcnow() - timedelta(days=self.raw_days))
+        points = await self.points.find(
+            {"product_id": product_id, "ts": {"$gte": raw_since}},
+            {"_id": 0, "ts": 1, "price": 1, "original_price": 1},
+        ).sort("ts", 1).to_list(None)
+        daily = await self.daily.find(
+            {"product_id": product_id, "day": {"$gte": since.strftime("%Y-%m-%d")}},
+            {"_id": 0, "day": 1, "open": 1, "low": 1, "high": 1, "close": 1},
+        ).sort("day", 1).to_list(None)
+        return points, daily
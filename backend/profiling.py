@@ -0,0 +1,223 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it carries ``X-Profile: sampling`` or
+``X-Profile: cprofile`` with an authorized admin token, or when it is picked
+by the ``sample_rate`` lottery (always the sampling profiler). One request
+is profiled at a time per worker; others pass straight through.
+
+- ``sampling`` snapshots the event loop thread's stack every ``interval``
+  seconds and stores collapsed stacks (``<id>.folded``), the input format of
+  flamegraph.pl, speedscope and similar tools.
+- ``cprofile`` runs the deterministic profiler and stores pstats data
+  (``<id>.prof``), readable with snakeviz or flameprof.
+
+Both profilers see the whole event loop thread, so work for other requests
+interleaved with the profiled one shows up too; profile on a quiet worker
+for clean results. Time spent in MongoDB is measured separately through a
+pymongo ``CommandListener`` and a context variable, so it is attributed to
+the profiled request only. Each profile has a ``<id>.json`` with the route,
+parameters, status and the wall/Mongo time split. Only the newest
+``max_profiles`` are kept on disk.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from pymongo import monitoring
+from starlette.middleware.base import BaseHTTPMiddleware
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sampling", "cprofile")
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_mongo_time = ContextVar("profiling_mongo_time", default=None)
+
+
+class MongoTime:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.micros = 0
+        self.commands = Counter()
+
+    def add(self, command_name: str, micros: int):
+        # Command events fire on motor's executor threads
+        with self._lock:
+            self.micros += micros
+            self.commands[command_name] += 1
+
+
+class MongoTimer(monitoring.CommandListener):
+    """Adds each command's duration to the current request's MongoTime, if any."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        current = _mongo_time.get()
+        if current is not None:
+            current.add(event.command_name, event.duration_micros)
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+
+class ProfileStore:
+    def __init__(self, directory, max_profiles: int = 200):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+
+    def save(self, meta: dict, suffix: str, data: bytes):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{meta['id']}{suffix}").write_bytes(data)
+        (self.directory / f"{meta['id']}.json").write_text(json.dumps(meta, default=str))
+        self._prune()
+
+    def list(self) -> list:
+        if not self.directory.exists():
+            return []
+        metas = []
+        for path in self.directory.glob("*.json"):
+            try:
+                metas.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return sorted(metas, key=lambda meta: meta["created_at"], reverse=True)
+
+    def data_path(self, profile_id: str):
+        if not PROFILE_ID.match(profile_id):
+            return None
+        for suffix in (".folded", ".prof"):
+            path = self.directory / f"{profile_id}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def _prune(self):
+        metas = sorted(self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime)
+        for path in metas[:max(len(metas) - self.max_profiles, 0)]:
+            for stale in self.directory.glob(f"{path.stem}.*"):
+                stale.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, store: ProfileStore, authorize, sample_rate: float = 0.0, interval: float = 0.005):
+        super().__init__(app)
+        self.store = store
+        # async authorize(request) -> bool, checked only for X-Profile requests
+        self.authorize = authorize
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._busy = False
+
+    async def dispatch(self, request, call_next):
+        mode = request.headers.get("x-profile")
+        if mode is not None:
+            if mode not in MODES or not await self.authorize(request):
+                mode = None
+        elif self.sample_rate and random.random() < self.sample_rate:
+            mode = "sampling"
+        if mode is None or self._busy:
+            return await call_next(request)
+
+        self._busy = True
+        mongo_time = MongoTime()
+        token = _mongo_time.set(mongo_time)
+        profiler = SamplingProfiler(self.interval) if mode == "sampling" else cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            if mode == "sampling":
+                profiler.start()
+            else:
+                profiler.enable()
+            try:
+                response = await call_next(request)
+            finally:
+                if mode == "sampling":
+                    profiler.stop()
+                else:
+                    profiler.disable()
+        finally:
+            _mongo_time.reset(token)
+            self._busy = False
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        route = request.scope.get("route")
+        meta = {
+            "id": uuid.uuid4().hex,
+            "mode": mode,
+            "created_at": datetime.utcnow().isoformat(),
+            "method": request.method,
+            "path": request.url.path,
+            "route": getattr(route, "path", None),
+            "params": dict(request.query_params),
+            "status": response.status_code,
+            "wall_ms": round(wall_ms, 3),
+            "mongo_ms": round(mongo_time.micros / 1000, 3),
+            "mongo_commands": dict(mongo_time.commands),
+        }
+        try:
+            if mode == "sampling":
+                meta["samples"] = sum(profiler.stacks.values())
+                self.store.save(meta, ".folded", profiler.collapsed().encode())
+            else:
+                self.store.save(meta, ".prof", marshal_stats(profiler))
+        except OSError:
+            logger.exception("Failed to save profile for %s", request.url.path)
+            return response
+        response.headers["X-Profile-Id"] = meta["id"]
+        return response
+
+
+def marshal_stats(profiler: cProfile.Profile) -> bytes:
+    # The on-disk format of pstats.Stats.dump_stats
+    import marshal
+
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
@@ -0,0 +1,297 @@
+"""Precomputed related-products table.
+
+Each active product is embedded as a hashed bag of features: feature and name
+tokens, description tokens, its category and its price band. Nearest
+neighbours by cosine similarity are computed in NumPy batches and stored one
+document per product in ``product_related``, so serving them is a single key
+lookup. After an admin write only the touched products, and the products whose
+neighbour lists they enter or leave, are recomputed.
+
+Every worker keeps its own table, and a worker can miss another's ``related``
+message. Before a job stores anything it compares the ``updated_at`` of each
+embedded product with the database and re-embeds those that changed or went
+away, so every stored list is built from the current catalog.
+
+The NumPy work runs in a worker thread (the matrix products release the GIL),
+so a full build after a restart doesn't stall the event loop. Similarities are
+computed for as many rows at a time as fit in ``batch_bytes``. The in-memory
+table is only touched while holding ``_lock``.
+
+Run ``python related.py`` to rebuild the whole table.
+"""
+import asyncio
+import logging
+import math
+import re
+import zlib
+from datetime import datetime
+
+import numpy as np
+from pymongo import DeleteOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]{3,}")
+STOPWORDS = {
+    "and", "the", "for", "with", "your", "this", "that", "from", "are", "you",
+    "all", "our", "its", "into", "has", "have", "will", "can", "not", "but",
+}
+
+PRODUCT_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "description": 1, "features": 1,
+    "category_id": 1, "price": 1, "is_active": 1, "updated_at": 1,
+}
+
+# One float32 similarity and one int64 argpartition index per row and product
+SIMILARITY_CELL_BYTES = 12
+
+# Relative weights of the feature groups before normalisation
+WEIGHTS = {"feature": 1.0, "name": 1.0, "description": 0.3, "category": 3.0, "price": 1.5}
+
+
+def tokens(text: str):
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def price_band(price: float) -> int:
+    # Half-octave bands: $10-14, $14-20, $20-28, ...
+    return int(math.log2(max(price or 0, 0) + 1) * 2)
+
+
+class RelatedProducts:
+    def __init__(self, dims: int = 256, top_k: int = 8, batch_bytes: int = 32 * 2**20):
+        self.dims = dims
+        self.top_k = top_k
+        self.batch_bytes = batch_bytes
+        self.loaded = False
+        self._lock = asyncio.Lock()
+        self._ids = []
+        self._rows = {}
+        self._versions = {}
+        self._free = []
+        self._vectors = np.zeros((0, dims), dtype=np.float32)
+        self._active = np.zeros(0, dtype=bool)
+        self._neighbours = np.zeros((0, top_k), dtype=np.int64)
+        self._scores = np.zeros((0, top_k), dtype=np.float32)
+
+    def vectorize(self, product: dict) -> np.ndarray:
+        vector = np.zeros(self.dims, dtype=np.float32)
+
+        def add(feature: str, weight: float):
+            h = zlib.crc32(feature.encode())
+            # The sign bit keeps hash collisions from always adding up
+            vector[h % self.dims] += weight if h & 0x80000000 else -weight
+
+        for feature in product.get("features") or []:
+            for token in tokens(feature):
+                add("f:" + token, WEIGHTS["feature"])
+        for token in tokens(product.get("name")):
+            add("f:" + token, WEIGHTS["name"])
+        description = tokens(product.get("description"))
+        for token in set(description):
+            add("d:" + token, WEIGHTS["description"])
+        add("c:" + str(product.get("category_id")), WEIGHTS["category"])
+        band = price_band(product.get("price"))
+        add(f"p:{band}", WEIGHTS["price"])
+        add(f"p:{band + 1}", WEIGHTS["price"] / 2)
+        add(f"p:{band - 1}", WEIGHTS["price"] / 2)
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def load(self, db):
+        products = await db.products.find({"is_active": True}, PRODUCT_PROJECTION).to_list(None)
+        await asyncio.to_thread(self._build, products)
+        self.loaded = True
+
+    def _build(self, products):
+        n = len(products)
+        self._ids = [p["id"] for p in products]
+        self._rows = {product_id: row for row, product_id in enumerate(self._ids)}
+        self._versions = {p["id"]: p.get("updated_at") for p in products}
+        self._free = []
+        self._vectors = np.zeros((n, self.dims), dtype=np.float32)
+        for row, product in enumerate(products):
+            self._vectors[row] = self.vectorize(product)
+        self._active = np.ones(n, dtype=bool)
+        self._neighbours = np.full((n, self.top_k), -1, dtype=np.int64)
+        self._scores = np.full((n, self.top_k), -np.inf, dtype=np.float32)
+        self._recompute(np.arange(n))
+
+    async def rebuild(self, db):
+        """Recompute every neighbour list and replace the stored table."""
+        async with self._lock:
+            await self.load(db)
+            active_rows = np.flatnonzero(self._active)
+            await self._persist(db, active_rows, removed=[])
+            await db.product_related.delete_many({"product_id": {"$nin": self._ids}})
+
+    async def refresh(self, db, product_ids, persist: bool = True):
+        """Re-embed ``product_ids`` and update the neighbour lists they affect.
+
+        Workers that only mirror another worker's write pass ``persist=False``
+        to keep their in-memory table current without rewriting the store.
+        """
+        async with self._lock:
+            product_ids = list(product_ids)
+            if not self.loaded:
+                if not persist:
+                    return
+                await self.load(db)
+                if not await db.product_related.estimated_document_count():
+                    # First write against an empty table: store everything
+                    await self._persist(db, np.flatnonzero(self._active), removed=[])
+            elif persist:
+                # Catch up on writes whose related message this worker missed
+                product_ids.extend(set(await self._stale_ids(db)) - set(product_ids))
+            products = await db.products.find(
+                {"id": {"$in": product_ids}}, PRODUCT_PROJECTION
+            ).to_list(None)
+            by_id = {p["id"]: p for p in products}
+            rows, removed = await asyncio.to_thread(self._apply, product_ids, by_id)
+            if persist and (len(rows) or removed):
+                await self._persist(db, rows, removed)
+
+    async def _stale_ids(self, db):
+        """Ids whose embedding no longer matches the stored product."""
+        current = {
+            p["id"]: p.get("updated_at")
+            async for p in db.products.find({"is_active": True}, {"_id": 0, "id": 1, "updated_at": 1})
+        }
+        stale = [
+            product_id for product_id, version in current.items()
+            if product_id not in self._rows or self._versions.get(product_id) != version
+        ]
+        stale.extend(product_id for product_id in self._rows if product_id not in current)
+        return stale
+
+    def _batch_rows(self) -> int:
+        return max(1, self.batch_bytes // (max(len(self._active), 1) * SIMILARITY_CELL_BYTES))
+
+    def _apply(self, product_ids, by_id: dict):
+        """Update the rows of ``product_ids``; returns the rows to store and the ids to drop."""
+        touched_rows = []
+        removed = []
+        for product_id in product_ids:
+            product = by_id.get(product_id)
+            if product and product.get("is_active"):
+                touched_rows.append(self._upsert_row(product))
+            elif product_id in self._rows:
+                touched_rows.append(self._deactivate_row(product_id))
+                removed.append(product_id)
+            else:
+                removed.append(product_id)
+        if not touched_rows:
+            return np.array([], dtype=np.int64), removed
+
+        touched = np.array(touched_rows, dtype=np.int64)
+        live = touched[self._active[touched]]
+        # Rows whose list a touched product now enters, or used to be in
+        entering = np.zeros(len(self._active), dtype=bool)
+        batch_rows = self._batch_rows()
+        for start in range(0, len(live), batch_rows):
+            sims = self._vectors[live[start:start + batch_rows]] @ self._vectors.T
+            entering |= (sims > self._scores[:, -1]).any(axis=0)
+        leaving = np.isin(self._neighbours, touched).any(axis=1)
+        affected = np.flatnonzero((entering | leaving) & self._active)
+        rows = np.union1d(affected, live)
+        self._recompute(rows)
+        return rows, removed
+
+    def _upsert_row(self, product: dict) -> int:
+        row = self._rows.get(product["id"])
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+                self._ids[row] = product["id"]
+            else:
+                row = len(self._ids)
+                self._ids.append(product["id"])
+                self._grow(row + 1)
+            self._rows[product["id"]] = row
+        self._vectors[row] = self.vectorize(product)
+        self._active[row] = True
+        self._versions[product["id"]] = product.get("updated_at")
+        return row
+
+    def _deactivate_row(self, product_id: str) -> int:
+        row = self._rows.pop(product_id)
+        self._versions.pop(product_id, None)
+        self._vectors[row] = 0
+        self._active[row] = False
+        self._neighbours[row] = -1
+        self._scores[row] = -np.inf
+        self._free.append(row)
+        return row
+
+    def _grow(self, n: int):
+        extra = max(n - len(self._active), 0)
+        if not extra:
+            return
+        # Grow geometrically so a burst of creates is not quadratic
+        extra = max(extra, len(self._active) // 4, 16)
+        self._vectors = np.vstack([self._vectors, np.zeros((extra, self.dims), dtype=np.float32)])
+        self._active = np.concatenate([self._active, np.zeros(extra, dtype=bool)])
+        self._neighbours = np.vstack([self._neighbours, np.full((extra, self.top_k), -1, dtype=np.int64)])
+        self._scores = np.vstack([self._scores, np.full((extra, self.top_k), -np.inf, dtype=np.float32)])
+
+    def _recompute(self, rows: np.ndarray):
+        k = min(self.top_k, max(int(self._active.sum()) - 1, 0))
+        batch_rows = self._batch_rows()
+        for start in range(0, len(rows), batch_rows):
+            batch = rows[start:start + batch_rows]
+            sims = self._vectors[batch] @ self._vectors.T
+            sims[:, ~self._active] = -np.inf
+            sims[np.arange(len(batch)), batch] = -np.inf
+            self._neighbours[batch] = -1
+            self._scores[batch] = -np.inf
+            if k == 0:
+                continue
+            top = np.argpartition(sims, -k, axis=1)[:, -k:]
+            top_scores = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            self._neighbours[batch, :k] = np.take_along_axis(top, order, axis=1)
+            self._scores[batch, :k] = np.take_along_axis(top_scores, order, axis=1)
+
+    async def _persist(self, db, rows: np.ndarray, removed):
+        operations = await asyncio.to_thread(self._operations, rows, removed)
+        for start in range(0, len(operations), 1000):
+            await db.product_related.bulk_write(operations[start:start + 1000], ordered=False)
+
+    def _operations(self, rows: np.ndarray, removed) -> list:
+        now = datetime.utcnow()
+        operations = [DeleteOne({"product_id": product_id}) for product_id in removed]
+        for row in rows:
+            related = [
+                {"id": self._ids[neighbour], "score": round(float(score), 4)}
+                for neighbour, score in zip(self._neighbours[row], self._scores[row])
+                if neighbour >= 0 and np.isfinite(score)
+            ]
+            operations.append(UpdateOne(
+                {"product_id": self._ids[row]},
+                {"$set": {"related": related, "updated_at": now}},
+                upsert=True,
+            ))
+        return operations
+
+
+if __name__ == "__main__":
+    import os
+    import time
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        engine = RelatedProducts()
+        started = time.perf_counter()
+        await engine.rebuild(client[os.environ['DB_NAME']])
+        logger.info("Rebuilt related products for %d products in %.2fs", len(engine._rows), time.perf_counter() - started)
+        client.close()
+
+    asyncio.run(main())
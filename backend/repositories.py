@@ -0,0 +1,869 @@
+"""Storage repositories for categories, products, blog posts and admins.
+
+Each repository covers the query shapes the API routes use, so routes never
+touch a collection directly. Two engines implement them:
+
+- ``motor_storage(db, read_db)``: MongoDB through Motor. Public listings read
+  from ``read_db``, point reads and writes go to ``db``.
+- ``memory_storage(...)``: plain dicts with a unique slug index and
+  secondary indexes on category and the active/featured/published flags.
+  It needs no server. With ``read_only=True`` over a snapshot it serves
+  the catalog for ``STORAGE_ENGINE=memory``, a server.py mode that runs
+  without MongoDB; writes then raise ``ReadOnlyStorageError``.
+
+tests/test_repositories.py runs the same contract cases against both
+engines, the Motor one on mongomock-motor.
+
+Both engines raise ``DuplicateKeyError`` on a duplicate slug, as the unique
+Mongo indexes do. Returned documents never include ``_id`` and are the
+caller's to keep: the memory engine hands out copies.
+
+Snapshots are Extended JSON (``bson.json_util``) so datetimes round-trip.
+Admins are never written to a snapshot.
+
+Usage:
+    python repositories.py dump catalog.json
+"""
+import copy
+import re
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from bson import json_util
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from catalog_query import (
+    DISCOUNT_PCT_EXPR, PRICE_BUCKETS, RATING_BANDS,
+    build_product_filters, product_facet_pipeline, product_page_pipeline, product_sort_stages,
+)
+from price_history import discount_pct
+
+SNAPSHOT_COLLECTIONS = ("categories", "products", "blog_posts")
+
+# Lean rows and sortable columns of the admin tables, all states included
+PRODUCT_ROW_FIELDS = (
+    "id", "name", "slug", "short_description", "category_id", "category_name", "price", "original_price",
+    "discount_pct", "rating", "review_count", "amazon_asin", "is_featured", "is_active", "created_at", "updated_at",
+)
+PRODUCT_TABLE_SORTS = ("name", "price", "discount_pct", "rating", "category_name", "created_at", "updated_at")
+PRODUCT_TABLE_SEARCH = ("name", "slug", "amazon_asin")
+POST_ROW_FIELDS = (
+    "id", "title", "slug", "excerpt", "author", "category_id", "category_name", "is_published", "is_featured",
+    "created_at", "updated_at", "published_at",
+)
+POST_TABLE_SORTS = ("title", "author", "created_at", "updated_at", "published_at")
+POST_TABLE_SEARCH = ("title", "slug", "author")
+
+
+class ReadOnlyStorageError(Exception):
+    pass
+
+
+# ===== INTERFACES =====
+
+class CategoryRepository(ABC):
+    @abstractmethod
+    async def list(self) -> List[dict]: ...
+
+    @abstractmethod
+    async def get(self, category_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def get_name(self, category_id: str) -> Optional[str]: ...
+
+    @abstractmethod
+    async def count(self) -> int: ...
+
+    @abstractmethod
+    async def insert(self, category: dict): ...
+
+    @abstractmethod
+    async def replace(self, category_id: str, category: dict) -> bool:
+        """Overwrite an existing category; False if there is none."""
+
+    @abstractmethod
+    async def delete(self, category_id: str) -> bool: ...
+
+
+class ProductRepository(ABC):
+    # ``filters`` are the keyword arguments of catalog_query.build_product_filters
+
+    @abstractmethod
+    async def get(self, product_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def get_by_slug(self, slug: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def find_by_keys(self, keys: List[str]) -> List[dict]:
+        """Products whose id or slug is in ``keys``."""
+
+    @abstractmethod
+    async def exists(self, product_id: str) -> bool: ...
+
+    @abstractmethod
+    async def in_category(self, category_id: str) -> bool:
+        """Whether any product, active or not, is in the category."""
+
+    @abstractmethod
+    async def page(self, filters: dict, sort: str, skip: int, limit: int) -> List[dict]: ...
+
+    @abstractmethod
+    async def browse(self, filters: dict, sort: str, skip: int, limit: int) -> dict:
+        """A page plus ``total`` and the facet counts, shaped like CatalogColumns.query."""
+
+    @abstractmethod
+    async def search(self, q: str, limit: int) -> List[dict]:
+        """Active products whose name, description or a feature matches regex ``q``."""
+
+    @abstractmethod
+    async def deals(self, category_id: Optional[str], min_discount: float, limit: int) -> List[dict]: ...
+
+    @abstractmethod
+    async def count_active(self, is_featured: Optional[bool] = None) -> int: ...
+
+    @abstractmethod
+    async def table(
+        self, is_active: Optional[bool], category_id: Optional[str], is_featured: Optional[bool],
+        q: Optional[str], sort: str, skip: int, limit: int,
+    ) -> dict:
+        """``{"items": rows, "total": n}`` for the admin table; see table_sort for ``sort``."""
+
+    @abstractmethod
+    async def insert(self, product: dict): ...
+
+    @abstractmethod
+    async def update(self, product_id: str, fields: dict) -> Optional[dict]:
+        """Set ``fields``, recompute discount_pct and return the document as it was."""
+
+    @abstractmethod
+    async def delete(self, product_id: str) -> Optional[dict]:
+        """Delete and return the removed product's id and slug."""
+
+
+class BlogPostRepository(ABC):
+    @abstractmethod
+    async def get(self, post_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def get_by_slug(self, slug: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def find_many(self, post_ids: List[str]) -> List[dict]: ...
+
+    @abstractmethod
+    async def list(
+        self, category_id: Optional[str], is_published: bool, is_featured: Optional[bool], skip: int, limit: int
+    ) -> List[dict]:
+        """Newest published first."""
+
+    @abstractmethod
+    async def count_published(self) -> int: ...
+
+    @abstractmethod
+    async def table(
+        self, is_published: Optional[bool], category_id: Optional[str], q: Optional[str],
+        sort: str, skip: int, limit: int,
+    ) -> dict:
+        """``{"items": rows, "total": n}`` for the admin table; see table_sort for ``sort``."""
+
+    @abstractmethod
+    async def insert(self, post: dict): ...
+
+    @abstractmethod
+    async def update(self, post_id: str, fields: dict, published_at=None) -> Optional[dict]:
+        """Set ``fields`` and return the document as it was.
+
+        ``published_at`` is only stored if the post has never been published.
+        """
+
+    @abstractmethod
+    async def delete(self, post_id: str) -> Optional[dict]:
+        """Delete and return the removed post's id and slug."""
+
+
+class AdminRepository(ABC):
+    @abstractmethod
+    async def get(self, admin_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def get_by_username(self, username: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def exists(self, username: str, email: str) -> bool:
+        """Whether an admin already has this username or this email."""
+
+    @abstractmethod
+    async def insert(self, admin: dict): ...
+
+
+class Storage:
+    def __init__(
+        self,
+        engine: str,
+        categories: CategoryRepository,
+        products: ProductRepository,
+        blog_posts: BlogPostRepository,
+        admins: AdminRepository,
+    ):
+        self.engine = engine
+        self.categories = categories
+        self.products = products
+        self.blog_posts = blog_posts
+        self.admins = admins
+
+
+def table_sort(sort: str, columns) -> list:
+    """``"price"`` or ``"-price"`` as sort keys with an id tiebreak; ValueError if not sortable."""
+    field = sort[1:] if sort.startswith("-") else sort
+    if field not in columns:
+        raise ValueError(f"sort must be one of: {', '.join(columns)}, optionally prefixed with -")
+    return [(field, -1 if sort.startswith("-") else 1), ("id", 1)]
+
+
+def table_query(equals: dict, q: Optional[str], search_fields) -> dict:
+    query = {field: value for field, value in equals.items() if value is not None}
+    if q:
+        # Admin search is a literal, case-insensitive substring match
+        pattern = {"$regex": re.escape(q), "$options": "i"}
+        query["$or"] = [{field: pattern} for field in search_fields]
+    return query
+
+
+async def motor_table(collection, query: dict, sort: list, skip: int, limit: int, fields) -> dict:
+    # Match and sort ahead of $facet so an index can serve them; rows are
+    # trimmed before $facet buffers them
+    result = await collection.aggregate([
+        {"$match": query},
+        {"$sort": dict(sort)},
+        {"$project": {"_id": 0, **{field: 1 for field in fields}}},
+        {"$facet": {
+            "items": [{"$skip": skip}, {"$limit": limit}],
+            "total": [{"$count": "count"}],
+        }},
+    ], allowDiskUse=True).to_list(1)
+    result = result[0]
+    return {"items": result["items"], "total": result["total"][0]["count"] if result["total"] else 0}
+
+
+# ===== MOTOR ENGINE =====
+
+class MotorCategoryRepository(CategoryRepository):
+    def __init__(self, db):
+        self.collection = db.categories
+
+    async def list(self):
+        return await self.collection.find({}, {"_id": 0}).to_list(1000)
+
+    async def get(self, category_id):
+        return await self.collection.find_one({"id": category_id}, {"_id": 0})
+
+    async def get_name(self, category_id):
+        category = await self.collection.find_one({"id": category_id}, {"name": 1})
+        return category["name"] if category else None
+
+    async def count(self):
+        return await self.collection.count_documents({})
+
+    async def insert(self, category):
+        await self.collection.insert_one(dict(category))
+
+    async def replace(self, category_id, category):
+        found = await self.collection.find_one_and_update(
+            {"id": category_id}, {"$set": category}, projection={"_id": 1}
+        )
+        return found is not None
+
+    async def delete(self, category_id):
+        result = await self.collection.delete_one({"id": category_id})
+        return result.deleted_count > 0
+
+
+class MotorProductRepository(ProductRepository):
+    def __init__(self, db, read_db):
+        self.collection = db.products
+        self.read_collection = read_db.products
+
+    async def get(self, product_id):
+        return await self.collection.find_one({"id": product_id}, {"_id": 0})
+
+    async def get_by_slug(self, slug):
+        return await self.collection.find_one({"slug": slug}, {"_id": 0})
+
+    async def find_by_keys(self, keys):
+        return await self.collection.find(
+            {"$or": [{"id": {"$in": keys}}, {"slug": {"$in": keys}}]}, {"_id": 0}
+        ).to_list(len(keys) * 2)
+
+    async def exists(self, product_id):
+        return await self.collection.find_one({"id": product_id}, {"_id": 1}) is not None
+
+    async def in_category(self, category_id):
+        return await self.collection.find_one({"category_id": category_id}, {"_id": 1}) is not None
+
+    async def page(self, filters, sort, skip, limit):
+        base, faceted = build_product_filters(**filters)
+        return await self.read_collection.aggregate(
+            product_page_pipeline(base, faceted, sort, skip, limit)
+        ).to_list(limit)
+
+    async def browse(self, filters, sort, skip, limit):
+        # One $facet round trip returns the page, the total and the facet counts
+        base, faceted = build_product_filters(**filters)
+        result = await self.read_collection.aggregate(
+            product_facet_pipeline(base, faceted, sort, skip, limit)
+        ).to_list(1)
+        result = result[0]
+        result["total"] = result["total"][0]["count"] if result["total"] else 0
+        return result
+
+    async def search(self, q, limit):
+        query = {
+            "is_active": True,
+            "$or": [
+                {"name": {"$regex": q, "$options": "i"}},
+                {"description": {"$regex": q, "$options": "i"}},
+                {"features": {"$regex": q, "$options": "i"}},
+            ],
+        }
+        return await self.read_collection.find(query, {"_id": 0}).limit(limit).to_list(limit)
+
+    async def deals(self, category_id, min_discount, limit):
+        # Served by the (is_active, [category_id,] discount_pct) indexes
+        query = {"is_active": True, "discount_pct": {"$gt": 0, "$gte": min_discount}}
+        if category_id:
+            query["category_id"] = category_id
+        return await self.read_collection.find(query, {"_id": 0}).sort(
+            [("discount_pct", -1), ("created_at", -1), ("id", 1)]
+        ).limit(limit).to_list(limit)
+
+    async def count_active(self, is_featured=None):
+        query = {"is_active": True}
+        if is_featured is not None:
+            query["is_featured"] = is_featured
+        return await self.collection.count_documents(query)
+
+    async def table(self, is_active, category_id, is_featured, q, sort, skip, limit):
+        query = table_query(
+            {"is_active": is_active, "category_id": category_id, "is_featured": is_featured}, q, PRODUCT_TABLE_SEARCH
+        )
+        return await motor_table(
+            self.collection, query, table_sort(sort, PRODUCT_TABLE_SORTS), skip, limit, PRODUCT_ROW_FIELDS
+        )
+
+    async def insert(self, product):
+        await self.collection.insert_one(dict(product))
+
+    async def update(self, product_id, fields):
+        # discount_pct is derived from the stored prices, which the update may
+        # only partly replace; values are wrapped in $literal as for blog posts
+        stage = {key: {"$literal": value} for key, value in fields.items()}
+        return await self.collection.find_one_and_update(
+            {"id": product_id},
+            [{"$set": stage}, {"$set": {"discount_pct": DISCOUNT_PCT_EXPR}}],
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    async def delete(self, product_id):
+        return await self.collection.find_one_and_delete(
+            {"id": product_id}, projection={"_id": 0, "id": 1, "slug": 1}
+        )
+
+
+class MotorBlogPostRepository(BlogPostRepository):
+    def __init__(self, db, read_db):
+        self.collection = db.blog_posts
+        self.read_collection = read_db.blog_posts
+
+    async def get(self, post_id):
+        return await self.collection.find_one({"id": post_id}, {"_id": 0})
+
+    async def get_by_slug(self, slug):
+        return await self.collection.find_one({"slug": slug}, {"_id": 0})
+
+    async def find_many(self, post_ids):
+        return await self.collection.find({"id": {"$in": post_ids}}, {"_id": 0}).to_list(len(post_ids))
+
+    async def list(self, category_id, is_published, is_featured, skip, limit):
+        query = {"is_published": is_published}
+        if category_id:
+            query["category_id"] = category_id
+        if is_featured is not None:
+            query["is_featured"] = is_featured
+        return await self.read_collection.find(query, {"_id": 0}).sort(
+            "published_at", -1
+        ).skip(skip).limit(limit).to_list(limit)
+
+    async def count_published(self):
+        return await self.collection.count_documents({"is_published": True})
+
+    async def table(self, is_published, category_id, q, sort, skip, limit):
+        query = table_query({"is_published": is_published, "category_id": category_id}, q, POST_TABLE_SEARCH)
+        return await motor_table(
+            self.collection, query, table_sort(sort, POST_TABLE_SORTS), skip, limit, POST_ROW_FIELDS
+        )
+
+    async def insert(self, post):
+        await self.collection.insert_one(dict(post))
+
+    async def update(self, post_id, fields, published_at=None):
+        # Pipeline update so published_at is only stamped the first time the
+        # post goes live; values are wrapped in $literal so content starting
+        # with "$" is never read as a field path
+        stage = {key: {"$literal": value} for key, value in fields.items()}
+        if published_at is not None:
+            stage["published_at"] = {"$ifNull": ["$published_at", published_at]}
+        return await self.collection.find_one_and_update(
+            {"id": post_id},
+            [{"$set": stage}],
+            projection={"_id": 0, "id": 1, "slug": 1, "created_at": 1, "published_at": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    async def delete(self, post_id):
+        return await self.collection.find_one_and_delete(
+            {"id": post_id}, projection={"_id": 0, "id": 1, "slug": 1}
+        )
+
+
+class MotorAdminRepository(AdminRepository):
+    def __init__(self, db):
+        self.collection = db.admins
+
+    async def get(self, admin_id):
+        return await self.collection.find_one({"id": admin_id}, {"_id": 0})
+
+    async def get_by_username(self, username):
+        return await self.collection.find_one({"username": username}, {"_id": 0})
+
+    async def exists(self, username, email):
+        found = await self.collection.find_one({"$or": [{"username": username}, {"email": email}]}, {"_id": 1})
+        return found is not None
+
+    async def insert(self, admin):
+        await self.collection.insert_one(dict(admin))
+
+
+def motor_storage(db, read_db=None) -> Storage:
+    read_db = read_db if read_db is not None else db
+    return Storage(
+        "motor",
+        MotorCategoryRepository(db),
+        MotorProductRepository(db, read_db),
+        MotorBlogPostRepository(db, read_db),
+        MotorAdminRepository(db),
+    )
+
+
+# ===== MEMORY ENGINE =====
+
+class MemoryCollection:
+    """Documents by id, with a unique slug index and equality indexes."""
+
+    def __init__(self, name: str, indexed=(), read_only: bool = False):
+        self.name = name
+        self.read_only = read_only
+        self._docs: Dict[str, dict] = {}
+        self._slugs: Dict[str, str] = {}
+        self._indexes = {field: defaultdict(set) for field in indexed}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        return self._docs.get(doc_id)
+
+    def get_by_slug(self, slug: str) -> Optional[dict]:
+        doc_id = self._slugs.get(slug)
+        return self._docs[doc_id] if doc_id is not None else None
+
+    def find(self, **equals) -> List[dict]:
+        """Documents matching every ``field=value``, in insertion order."""
+        indexed = [self._indexes[f].get(v, set()) for f, v in equals.items() if f in self._indexes]
+        if indexed:
+            ids = set.intersection(*sorted(indexed, key=len))
+            docs = [doc for doc_id, doc in self._docs.items() if doc_id in ids]
+        else:
+            docs = list(self._docs.values())
+        rest = [(f, v) for f, v in equals.items() if f not in self._indexes]
+        return [doc for doc in docs if all(doc.get(f) == v for f, v in rest)]
+
+    def insert(self, doc: dict):
+        self._check_writable()
+        if doc["id"] in self._docs:
+            raise DuplicateKeyError(f"duplicate id in {self.name}: {doc['id']}")
+        self._check_slug(doc)
+        self._add(copy.deepcopy(doc))
+
+    def replace(self, doc: dict):
+        self._check_writable()
+        self._check_slug(doc)
+        self._remove(doc["id"])
+        self._add(copy.deepcopy(doc))
+
+    def delete(self, doc_id: str) -> Optional[dict]:
+        self._check_writable()
+        return self._remove(doc_id)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyStorageError(f"{self.name} is read-only")
+
+    def _check_slug(self, doc: dict):
+        owner = self._slugs.get(doc.get("slug"))
+        if owner is not None and owner != doc["id"]:
+            raise DuplicateKeyError(f"duplicate slug in {self.name}: {doc['slug']}")
+
+    def _add(self, doc: dict):
+        self._docs[doc["id"]] = doc
+        if doc.get("slug") is not None:
+            self._slugs[doc["slug"]] = doc["id"]
+        for field, index in self._indexes.items():
+            index[doc.get(field)].add(doc["id"])
+
+    def _remove(self, doc_id: str) -> Optional[dict]:
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return None
+        self._slugs.pop(doc.get("slug"), None)
+        for field, index in self._indexes.items():
+            ids = index[doc.get(field)]
+            ids.discard(doc_id)
+            if not ids:
+                del index[doc.get(field)]
+        return doc
+
+
+def _sort_value(value):
+    # Missing values sort first, as in MongoDB
+    return (value is not None, value)
+
+
+def sort_docs(docs: List[dict], keys) -> List[dict]:
+    """Sort by ``[(field, 1 | -1), ...]``, one stable pass per key."""
+    docs = list(docs)
+    for field, direction in reversed(list(keys)):
+        docs.sort(key=lambda doc: _sort_value(doc.get(field)), reverse=direction < 0)
+    return docs
+
+
+def memory_table(docs: List[dict], q: Optional[str], search_fields, sort: list, skip: int, limit: int,
+                 fields) -> dict:
+    if q:
+        pattern = re.compile(re.escape(q), re.IGNORECASE)
+        docs = [
+            doc for doc in docs
+            if any(isinstance(doc.get(field), str) and pattern.search(doc[field]) for field in search_fields)
+        ]
+    rows = sort_docs(docs, sort)[skip:skip + limit]
+    return {
+        "items": [{field: copy.deepcopy(row[field]) for field in fields if field in row} for row in rows],
+        "total": len(docs),
+    }
+
+
+def _bucket(value, bounds: List[float]):
+    if value is None:
+        return "other"
+    for lower, upper in zip(bounds, bounds[1:]):
+        if lower <= value < upper:
+            return lower
+    return "other"
+
+
+class MemoryCategoryRepository(CategoryRepository):
+    def __init__(self, collection: MemoryCollection):
+        self.collection = collection
+
+    async def list(self):
+        return copy.deepcopy(self.collection.find())
+
+    async def get(self, category_id):
+        return copy.deepcopy(self.collection.get(category_id))
+
+    async def get_name(self, category_id):
+        category = self.collection.get(category_id)
+        return category["name"] if category else None
+
+    async def count(self):
+        return len(self.collection)
+
+    async def insert(self, category):
+        self.collection.insert(category)
+
+    async def replace(self, category_id, category):
+        existing = self.collection.get(category_id)
+        if existing is None:
+            return False
+        self.collection.replace({**existing, **category, "id": category_id})
+        return True
+
+    async def delete(self, category_id):
+        return self.collection.delete(category_id) is not None
+
+
+class MemoryProductRepository(ProductRepository):
+    def __init__(self, collection: MemoryCollection):
+        self.collection = collection
+
+    async def get(self, product_id):
+        return copy.deepcopy(self.collection.get(product_id))
+
+    async def get_by_slug(self, slug):
+        return copy.deepcopy(self.collection.get_by_slug(slug))
+
+    async def find_by_keys(self, keys):
+        found = {}
+        for key in keys:
+            for product in (self.collection.get(key), self.collection.get_by_slug(key)):
+                if product is not None:
+                    found[product["id"]] = product
+        return copy.deepcopy(list(found.values()))
+
+    async def exists(self, product_id):
+        return self.collection.get(product_id) is not None
+
+    async def in_category(self, category_id):
+        return bool(self.collection.find(category_id=category_id))
+
+    def _matches(self, filters: dict):
+        """Base-filtered products with whether each passes the category, price and rating filters."""
+        equals = {"is_active": filters.get("is_active", True)}
+        if filters.get("is_featured") is not None:
+            equals["is_featured"] = filters["is_featured"]
+        on_sale = filters.get("on_sale")
+        category_id = filters.get("category_id")
+        min_price, max_price = filters.get("min_price"), filters.get("max_price")
+        min_rating = filters.get("min_rating")
+
+        for product in self.collection.find(**equals):
+            if on_sale is not None and (product.get("discount_pct", 0) > 0) != on_sale:
+                continue
+            price, rating = product.get("price"), product.get("rating")
+            yield product, {
+                "category": not category_id or product.get("category_id") == category_id,
+                "price": (min_price is None or (price is not None and price >= min_price))
+                and (max_price is None or (price is not None and price <= max_price)),
+                "rating": min_rating is None or (rating is not None and rating >= min_rating),
+            }
+
+    @staticmethod
+    def _page(products, sort, skip, limit):
+        ordered = sort_docs(products, product_sort_stages(sort)[0]["$sort"].items())
+        return copy.deepcopy(ordered[skip:skip + limit])
+
+    async def page(self, filters, sort, skip, limit):
+        products = [product for product, passed in self._matches(filters) if all(passed.values())]
+        return self._page(products, sort, skip, limit)
+
+    async def browse(self, filters, sort, skip, limit):
+        items = []
+        categories = {}
+        price = defaultdict(int)
+        rating = defaultdict(int)
+        for product, passed in self._matches(filters):
+            # Each facet ignores its own filter, as in product_facet_pipeline
+            if all(passed.values()):
+                items.append(product)
+            if passed["price"] and passed["rating"]:
+                facet = categories.setdefault(
+                    product.get("category_id"),
+                    {"_id": product.get("category_id"), "category_name": product.get("category_name"), "count": 0},
+                )
+                facet["count"] += 1
+            if passed["category"] and passed["rating"]:
+                price[_bucket(product.get("price"), PRICE_BUCKETS + [float("inf")])] += 1
+            if passed["category"] and passed["price"]:
+                rating[_bucket(product.get("rating"), RATING_BANDS + [5.000001])] += 1
+        return {
+            "items": self._page(items, sort, skip, limit),
+            "total": len(items),
+            "categories": sorted(categories.values(), key=lambda c: (-c["count"], _sort_value(c["_id"]))),
+            "price": [{"_id": lower, "count": count} for lower, count in price.items()],
+            "rating": [{"_id": lower, "count": count} for lower, count in rating.items()],
+        }
+
+    async def search(self, q, limit):
+        pattern = re.compile(q, re.IGNORECASE)
+        results = []
+        for product in self.collection.find(is_active=True):
+            texts = [product.get("name"), product.get("description"), *(product.get("features") or [])]
+            if any(isinstance(text, str) and pattern.search(text) for text in texts):
+                results.append(product)
+                if len(results) >= limit:
+                    break
+        return copy.deepcopy(results)
+
+    async def deals(self, category_id, min_discount, limit):
+        equals = {"is_active": True}
+        if category_id:
+            equals["category_id"] = category_id
+        products = [
+            product for product in self.collection.find(**equals)
+            if product.get("discount_pct", 0) > 0 and product.get("discount_pct", 0) >= min_discount
+        ]
+        ordered = sort_docs(products, [("discount_pct", -1), ("created_at", -1), ("id", 1)])
+        return copy.deepcopy(ordered[:limit])
+
+    async def count_active(self, is_featured=None):
+        if is_featured is None:
+            return len(self.collection.find(is_active=True))
+        return len(self.collection.find(is_active=True, is_featured=is_featured))
+
+    async def table(self, is_active, category_id, is_featured, q, sort, skip, limit):
+        equals = {"is_active": is_active, "category_id": category_id, "is_featured": is_featured}
+        docs = self.collection.find(**{field: value for field, value in equals.items() if value is not None})
+        return memory_table(
+            docs, q, PRODUCT_TABLE_SEARCH, table_sort(sort, PRODUCT_TABLE_SORTS), skip, limit, PRODUCT_ROW_FIELDS
+        )
+
+    async def insert(self, product):
+        self.collection.insert(product)
+
+    async def update(self, product_id, fields):
+        before = self.collection.get(product_id)
+        if before is None:
+            return None
+        updated = {**before, **copy.deepcopy(fields)}
+        updated["discount_pct"] = discount_pct(updated.get("price"), updated.get("original_price"))
+        self.collection.replace(updated)
+        return copy.deepcopy(before)
+
+    async def delete(self, product_id):
+        product = self.collection.delete(product_id)
+        return {"id": product["id"], "slug": product["slug"]} if product else None
+
+
+class MemoryBlogPostRepository(BlogPostRepository):
+    def __init__(self, collection: MemoryCollection):
+        self.collection = collection
+
+    async def get(self, post_id):
+        return copy.deepcopy(self.collection.get(post_id))
+
+    async def get_by_slug(self, slug):
+        return copy.deepcopy(self.collection.get_by_slug(slug))
+
+    async def find_many(self, post_ids):
+        posts = (self.collection.get(post_id) for post_id in dict.fromkeys(post_ids))
+        return copy.deepcopy([post for post in posts if post is not None])
+
+    async def list(self, category_id, is_published, is_featured, skip, limit):
+        equals = {"is_published": is_published}
+        if category_id:
+            equals["category_id"] = category_id
+        if is_featured is not None:
+            equals["is_featured"] = is_featured
+        ordered = sort_docs(self.collection.find(**equals), [("published_at", -1)])
+        return copy.deepcopy(ordered[skip:skip + limit])
+
+    async def count_published(self):
+        return len(self.collection.find(is_published=True))
+
+    async def table(self, is_published, category_id, q, sort, skip, limit):
+        equals = {"is_published": is_published, "category_id": category_id}
+        docs = self.collection.find(**{field: value for field, value in equals.items() if value is not None})
+        return memory_table(
+            docs, q, POST_TABLE_SEARCH, table_sort(sort, POST_TABLE_SORTS), skip, limit, POST_ROW_FIELDS
+        )
+
+    async def insert(self, post):
+        self.collection.insert(post)
+
+    async def update(self, post_id, fields, published_at=None):
+        before = self.collection.get(post_id)
+        if before is None:
+            return None
+        updated = {**before, **copy.deepcopy(fields)}
+        if published_at is not None and before.get("published_at") is None:
+            updated["published_at"] = published_at
+        self.collection.replace(updated)
+        return copy.deepcopy(before)
+
+    async def delete(self, post_id):
+        post = self.collection.delete(post_id)
+        return {"id": post["id"], "slug": post["slug"]} if post else None
+
+
+class MemoryAdminRepository(AdminRepository):
+    def __init__(self, collection: MemoryCollection):
+        self.collection = collection
+
+    async def get(self, admin_id):
+        return copy.deepcopy(self.collection.get(admin_id))
+
+    async def get_by_username(self, username):
+        admins = self.collection.find(username=username)
+        return copy.deepcopy(admins[0]) if admins else None
+
+    async def exists(self, username, email):
+        return bool(self.collection.find(username=username) or self.collection.find(email=email))
+
+    async def insert(self, admin):
+        self.collection.insert(admin)
+
+
+def memory_storage(collections: Optional[Dict[str, List[dict]]] = None, read_only: bool = False) -> Storage:
+    """In-memory storage seeded with ``{"categories": [...], "products": [...], ...}``."""
+    stores = {
+        "categories": MemoryCollection("categories"),
+        "products": MemoryCollection("products", indexed=("category_id", "is_active", "is_featured")),
+        "blog_posts": MemoryCollection("blog_posts", indexed=("category_id", "is_published", "is_featured")),
+        "admins": MemoryCollection("admins", indexed=("username", "email")),
+    }
+    for name, docs in (collections or {}).items():
+        for doc in docs:
+            doc.pop("_id", None)
+            stores[name].insert(doc)
+    for store in stores.values():
+        store.read_only = read_only
+    return Storage(
+        "memory",
+        MemoryCategoryRepository(stores["categories"]),
+        MemoryProductRepository(stores["products"]),
+        MemoryBlogPostRepository(stores["blog_posts"]),
+        MemoryAdminRepository(stores["admins"]),
+    )
+
+
+def load_snapshot(path, read_only: bool = True) -> Storage:
+    with open(path) as f:
+        return memory_storage(json_util.loads(f.read()), read_only=read_only)
+
+
+async def dump_snapshot(db, path):
+    snapshot = {name: await db[name].find({}, {"_id": 0}).to_list(None) for name in SNAPSHOT_COLLECTIONS}
+    with open(path, "w") as f:
+        f.write(json_util.dumps(snapshot, json_options=json_util.RELAXED_JSON_OPTIONS))
+    return {name: len(docs) for name, docs in snapshot.items()}
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import logging
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    parser = argparse.ArgumentParser(description="Write a catalog snapshot for the in-memory engine")
+    parser.add_argument("command", choices=["dump"])
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        counts = await dump_snapshot(client[os.environ['DB_NAME']], args.path)
+        logger.info("Wrote %s to %s", counts, args.path)
+        client.close()
+
+    asyncio.run(main())
@@ -1,27 +1,172 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import RedirectResponse, FileResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.read_preferences import SecondaryPreferred
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
+import json
+import asyncio
 from datetime import datetime
 import jwt
 import hashlib
 import base64
 
+from cache_bus import LocalCache, InvalidationBus
+from suggest import SuggestIndex, product_score, blog_post_score
+from related import RelatedProducts
+from blog_related import BlogRelatedIndex
+from clicks import ClickCounter
+from trending import TrendingTracker, VIEW_WEIGHT, CLICK_WEIGHT
+from feeds import SitemapBuilder, BlogFeed, RenderedDocument
+from blog_render import render_content
+from catalog_columns import CatalogColumns
+from price_history import PriceHistory, discount_pct
+from profiling import MongoTimer, ProfileStore, ProfilingMiddleware
+from deadlines import DeadlineMiddleware, RequestDeadlines
+from repositories import ReadOnlyStorageError, load_snapshot, motor_storage
+from jobs import JobQueue
+from migrations import Migration, MigrationRunner
+from catalog_query import (
+    PRICE_BUCKETS, RATING_BANDS, PRODUCT_SORTS, PRODUCT_INDEXES, range_facets,
+)
+
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Categories, products, blog posts and admins go through the repositories.
+# STORAGE_ENGINE=memory serves them read-only from a snapshot written by
+# `python repositories.py dump`, with no MongoDB at all: the startup hooks
+# that need it are skipped and the routes served from other collections
+# (sitemaps, feeds, related lists, price history) answer 503.
+STORAGE_ENGINE = os.environ.get('STORAGE_ENGINE', 'motor')
+MONGO_ENABLED = STORAGE_ENGINE != 'memory'
+
+# MongoDB connection; Motor only connects on the first command
+mongo_url = os.environ['MONGO_URL'] if MONGO_ENABLED else os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ['DB_NAME'] if MONGO_ENABLED else os.environ.get('DB_NAME', 'unused')
+# MongoTimer splits out Mongo time for requests under the profiler
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoTimer()])
+db = client[db_name]
+
+# Public catalog reads may be served by secondaries; admin routes, auth and
+# read-after-write paths keep using `db`, which reads from the primary.
+# maxStalenessSeconds must be -1 (no limit) or at least 90.
+read_db = client.get_database(
+    db_name,
+    read_preference=SecondaryPreferred(
+        max_staleness=int(os.environ.get('READ_MAX_STALENESS_SECONDS', '-1'))
+    ),
+)
+
+if MONGO_ENABLED:
+    storage = motor_storage(db, read_db)
+else:
+    storage = load_snapshot(os.environ['STORAGE_SNAPSHOT'])
+
+# Per-worker read cache, kept coherent across workers by the invalidation bus
+cache = LocalCache(
+    max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', '10000')),
+    ttl_seconds=float(os.environ.get('CACHE_TTL_SECONDS', '300')),
+)
+invalidation_bus = InvalidationBus(
+    db, cache, max_delay_ms=int(os.environ.get('CACHE_INVALIDATION_DELAY_MS', '500'))
+)
+
+# Typeahead over product, category and published blog post titles
+suggest_index = SuggestIndex()
+
+# Nearest-neighbour table behind /products/{id}/related
+related_products = RelatedProducts()
+
+# Inverted tag index and top-K lists behind /blog/posts/{id}/related
+blog_related = BlogRelatedIndex()
+
+# Affiliate clicks are counted in memory and flushed to Mongo in batches
+click_counter = ClickCounter(
+    db,
+    flush_interval=float(os.environ.get('CLICK_FLUSH_INTERVAL_SECONDS', '5')),
+    max_pending=int(os.environ.get('CLICK_FLUSH_MAX_PENDING', '1000')),
+)
+
+# Pre-rendered sitemap shards and blog feeds
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:3000')
+sitemap = SitemapBuilder(SITE_URL)
+blog_feed = BlogFeed(
+    SITE_URL,
+    title="Farm Animal Products Blog",
+    description="Guides and product advice for farm animal care",
+)
+
+# Decayed view/click popularity, merged across workers in the background
+trending = TrendingTracker(
+    db,
+    worker_id=invalidation_bus.worker_id,
+    half_life_seconds=float(os.environ.get('TRENDING_HALF_LIFE_SECONDS', '21600')),
+    merge_interval=float(os.environ.get('TRENDING_MERGE_INTERVAL_SECONDS', '30')),
+)
+
+# Every price change, raw for PRICE_HISTORY_RAW_DAYS and as daily candles
+# for PRICE_HISTORY_RETENTION_DAYS
+price_history = PriceHistory(
+    db,
+    raw_days=int(os.environ.get('PRICE_HISTORY_RAW_DAYS', '90')),
+    retention_days=int(os.environ.get('PRICE_HISTORY_RETENTION_DAYS', '730')),
+)
+
+# Columnar snapshot of the active catalog answering /products and
+# /products/browse; loaded when the invalidation bus subscribes
+catalog_columns = CatalogColumns()
+CATALOG_COLUMNS_ENABLED = (
+    STORAGE_ENGINE == 'motor' and os.environ.get('CATALOG_COLUMNS_ENABLED', 'true').lower() == 'true'
+)
+
+# Slow post-write side effects run in the background, persisted in `jobs`
+job_queue = JobQueue(
+    db,
+    worker_id=invalidation_bus.worker_id,
+    concurrency=int(os.environ.get('JOB_CONCURRENCY', '4')),
+    max_queued=int(os.environ.get('JOB_MAX_QUEUED', '1000')),
+    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', '5')),
+    poll_interval=float(os.environ.get('JOB_POLL_INTERVAL_SECONDS', '5')),
+)
+
+# Batched schema backfills, see MIGRATIONS
+migration_runner = MigrationRunner(
+    db,
+    batch_size=int(os.environ.get('MIGRATION_BATCH_SIZE', '500')),
+    max_batch_seconds=float(os.environ.get('MIGRATION_MAX_BATCH_SECONDS', '1')),
+    max_lag_seconds=float(os.environ.get('MIGRATION_MAX_LAG_SECONDS', '10')),
+)
+MIGRATIONS_ON_STARTUP = os.environ.get('MIGRATIONS_ON_STARTUP', 'true').lower() == 'true'
+
+# Opt-in request profiles (X-Profile header from an admin, or a sampled
+# fraction of traffic), newest PROFILE_MAX_FILES kept in PROFILE_DIR
+profile_store = ProfileStore(
+    os.environ.get('PROFILE_DIR', str(ROOT_DIR / 'profiles')),
+    max_profiles=int(os.environ.get('PROFILE_MAX_FILES', '200')),
+)
+
+# Time budget per GET request (writes are exempt), passed to MongoDB as
+# maxTimeMS. Per route template overrides come from REQUEST_DEADLINES as
+# JSON, e.g. {"/api/products/search": 2}; 0 disables the deadline for a route
+request_deadlines = RequestDeadlines(
+    default=float(os.environ.get('REQUEST_DEADLINE_SECONDS', '10')),
+    per_route={
+        "/api/products/search": 3,
+        **json.loads(os.environ.get('REQUEST_DEADLINES', '{}')),
+    },
+    max_seconds=float(os.environ.get('REQUEST_DEADLINE_MAX_SECONDS', '30')),
+)
 
 # Create the main app without a prefix
 app = FastAPI(title="Farm Animal Products Affiliate API")
@@ -33,6 +178,8 @@ api_router = APIRouter(prefix="/api")
 security = HTTPBearer(auto_error=False)
 JWT_SECRET = "farm_animals_secret_key"  # In production, use environment variable
 
+PRODUCT_BATCH_MAX = int(os.environ.get('PRODUCT_BATCH_MAX', '50'))
+
 
 # ===== MODELS =====
 
@@ -69,6 +216,7 @@ class Product(BaseModel):
     features: List[str] = []
     rating: float = 0.0
     review_count: int = 0
+    discount_pct: float = 0.0
     is_featured: bool = False
     is_active: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -108,7 +256,81 @@ class ProductUpdate(BaseModel):
     is_featured: Optional[bool] = None
     is_active: Optional[bool] = None
 
+class Suggestion(BaseModel):
+    type: str
+    id: str
+    title: str
+    slug: str
+
+class ProductBatch(BaseModel):
+    products: List[Product]
+    missing: List[str]
+
+class CategoryFacet(BaseModel):
+    category_id: str
+    category_name: Optional[str] = None
+    count: int
+
+class RangeFacet(BaseModel):
+    min: float
+    max: Optional[float] = None
+    count: int
+
+class ProductFacets(BaseModel):
+    categories: List[CategoryFacet]
+    price: List[RangeFacet]
+    rating: List[RangeFacet]
+
+class ProductPage(BaseModel):
+    items: List[Product]
+    total: int
+    facets: ProductFacets
+
+class ProductRow(BaseModel):
+    id: str
+    name: str
+    slug: str
+    short_description: str = ""
+    category_id: str
+    category_name: str
+    price: float
+    original_price: Optional[float] = None
+    discount_pct: float = 0.0
+    rating: float = 0.0
+    review_count: int = 0
+    amazon_asin: Optional[str] = None
+    is_featured: bool = False
+    is_active: bool = True
+    created_at: datetime
+    updated_at: datetime
+
+class ProductTable(BaseModel):
+    items: List[ProductRow]
+    total: int
+
+class PricePoint(BaseModel):
+    ts: datetime
+    price: float
+    original_price: Optional[float] = None
+
+class DailyPrice(BaseModel):
+    day: str
+    open: float
+    low: float
+    high: float
+    close: float
+
+class PriceHistoryResponse(BaseModel):
+    product_id: str
+    points: List[PricePoint]
+    daily: List[DailyPrice]
+
 # Blog Models
+class TocEntry(BaseModel):
+    level: int
+    text: str
+    anchor: str
+
 class BlogPost(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     title: str
@@ -124,10 +346,36 @@ class BlogPost(BaseModel):
     is_featured: bool = False
     meta_title: Optional[str] = None
     meta_description: Optional[str] = None
+    # Set while excerpt / meta_description are derived rather than hand-written
+    excerpt_auto: bool = False
+    meta_description_auto: bool = False
+    # Rendered from content on every write; see blog_render.py
+    content_html: str = ""
+    word_count: int = 0
+    reading_minutes: int = 0
+    toc: List[TocEntry] = []
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     published_at: Optional[datetime] = None
 
+class BlogPostRow(BaseModel):
+    id: str
+    title: str
+    slug: str
+    excerpt: str
+    author: str
+    category_id: Optional[str] = None
+    category_name: Optional[str] = None
+    is_published: bool = False
+    is_featured: bool = False
+    created_at: datetime
+    updated_at: datetime
+    published_at: Optional[datetime] = None
+
+class BlogPostTable(BaseModel):
+    items: List[BlogPostRow]
+    total: int
+
 class BlogPostCreate(BaseModel):
     title: str
     slug: str
@@ -193,7 +441,7 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
         if not admin_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        admin = await db.admins.find_one({"id": admin_id})
+        admin = await storage.admins.get(admin_id)
         if not admin or not admin.get("is_active"):
             raise HTTPException(status_code=401, detail="Admin not found or inactive")
         
@@ -204,21 +452,274 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+# ===== CACHE HELPERS =====
+
+async def find_one_cached(key: str, load, *args):
+    # Loaders read from the primary: filling the cache from a lagging
+    # secondary right after an invalidation would pin the stale document
+    doc = cache.get(key)
+    if doc is None:
+        generation = cache.generation
+        doc = await load(*args)
+        if doc is not None:
+            cache.set(key, doc, generation=generation)
+    return doc
+
+async def find_products_cached(keys: List[str]) -> dict:
+    """Map each product id or slug in ``keys`` to its document, cache hits first."""
+    found = {}
+    misses = []
+    for key in keys:
+        product = cache.get(f"product:{key}") or cache.get(f"product:slug:{key}")
+        if product is None:
+            misses.append(key)
+        else:
+            found[key] = product
+    
+    if misses:
+        generation = cache.generation
+        products = await storage.products.find_by_keys(misses)
+        for product in products:
+            for key in product_cache_keys(product):
+                cache.set(key, product, generation=generation)
+            found[product["id"]] = product
+            found[product["slug"]] = product
+    return found
+
+def product_cache_keys(product: dict) -> List[str]:
+    return [f"product:{product['id']}", f"product:slug:{product['slug']}"]
+
+def category_cache_keys(category_id: str) -> List[str]:
+    return ["categories", f"category:{category_id}"]
+
+def blog_post_cache_keys(post: dict) -> List[str]:
+    return [f"post:{post['id']}", f"post:slug:{post['slug']}", f"post:page:{post['slug']}"]
+
+
+# ===== RENDERED BLOG POSTS =====
+
+def last_derived(previous: Optional[dict], field: str) -> Optional[str]:
+    """The value ``field`` held in ``previous`` if it was derived, else None."""
+    if not previous:
+        return None
+    flag = previous.get(f"{field}_auto")
+    if flag is None:
+        # Saved before the flags existed: derived if it matches the derivation
+        derived = (
+            render_content(previous.get("content"))["auto_excerpt"] if field == "excerpt"
+            else previous.get("excerpt")
+        )
+        flag = previous.get(field) == derived
+    return previous.get(field) if flag else None
+
+def rendered_post_fields(content: str, excerpt: str, meta_description: Optional[str], previous: dict = None) -> dict:
+    fields = render_content(content)
+    auto_excerpt = fields.pop("auto_excerpt")
+    # Hand-written excerpts and descriptions win. Blank ones are derived, and so
+    # are ones the edit form sends back unchanged from the last derivation, so
+    # they keep following the content
+    fields["excerpt_auto"] = not (excerpt and excerpt.strip()) or excerpt == last_derived(previous, "excerpt")
+    fields["excerpt"] = auto_excerpt if fields["excerpt_auto"] else excerpt
+    fields["meta_description_auto"] = (
+        not (meta_description and meta_description.strip())
+        or meta_description == last_derived(previous, "meta_description")
+    )
+    fields["meta_description"] = fields["excerpt"] if fields["meta_description_auto"] else meta_description
+    return fields
+
+async def save_post_page(post: BlogPost):
+    """Store the serialized GET /blog/posts/slug/{slug} response of a published post."""
+    if not post.is_published:
+        await db.blog_post_pages.delete_one({"post_id": post.id})
+        return
+    # Serialized the way FastAPI's JSONResponse would
+    body = json.dumps(
+        jsonable_encoder(post), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+    await db.blog_post_pages.replace_one(
+        {"post_id": post.id},
+        {"post_id": post.id, "slug": post.slug, "body": body, "updated_at": post.updated_at},
+        upsert=True,
+    )
+
+async def find_post_page(slug: str):
+    return await db.blog_post_pages.find_one({"slug": slug}, {"_id": 0})
+
+
+# ===== SUGGEST INDEX =====
+
+SUGGEST_SOURCES = {
+    # kind: (collection name, visibility filter, title field, projection)
+    "product": ("products", {"is_active": True}, "name",
+                {"_id": 0, "id": 1, "name": 1, "slug": 1, "rating": 1, "review_count": 1, "is_featured": 1}),
+    "category": ("categories", {}, "name", {"_id": 0, "id": 1, "name": 1, "slug": 1}),
+    "blog_post": ("blog_posts", {"is_published": True}, "title",
+                  {"_id": 0, "id": 1, "title": 1, "slug": 1, "is_featured": 1}),
+}
+
+def suggest_entry(kind: str, doc: dict):
+    title_field = SUGGEST_SOURCES[kind][2]
+    if kind == "product":
+        score = product_score(doc)
+    elif kind == "blog_post":
+        score = blog_post_score(doc)
+    else:
+        # Categories are few and broad; keep them near the top
+        score = 10.0
+    return kind, doc["id"], doc[title_field], doc["slug"], score
+
+# One list per rebuild in progress: messages applied while it reads, replayed
+# once it has loaded so the load cannot undo them
+suggest_rebuild_messages = []
+
+async def rebuild_suggest_index():
+    replay = []
+    suggest_rebuild_messages.append(replay)
+    try:
+        suggest_index.load(await read_suggest_entries())
+    finally:
+        suggest_rebuild_messages.remove(replay)
+    for message in replay:
+        await refresh_suggest_entries(message)
+
+async def read_suggest_entries() -> list:
+    entries = []
+    if MONGO_ENABLED:
+        for kind, (collection, visible, _, projection) in SUGGEST_SOURCES.items():
+            async for doc in db[collection].find(visible, projection):
+                entries.append(suggest_entry(kind, doc))
+    else:
+        # The snapshot is already in memory; read it through the repositories
+        sources = {
+            "product": await storage.products.page({}, "newest", 0, await storage.products.count_active()),
+            "category": await storage.categories.list(),
+            "blog_post": await storage.blog_posts.list(None, True, None, 0, await storage.blog_posts.count_published()),
+        }
+        entries = [suggest_entry(kind, doc) for kind, docs in sources.items() for doc in docs]
+    return entries
+
+async def refresh_suggest_entries(message: dict):
+    kind = message["kind"]
+    if kind not in SUGGEST_SOURCES or not message["ids"]:
+        return
+    for replay in suggest_rebuild_messages:
+        replay.append(message)
+    collection, visible, _, projection = SUGGEST_SOURCES[kind]
+    docs = await db[collection].find({**visible, "id": {"$in": message["ids"]}}, projection).to_list(None)
+    visible_ids = set()
+    for doc in docs:
+        suggest_index.upsert(*suggest_entry(kind, doc))
+        visible_ids.add(doc["id"])
+    for entity_id in set(message["ids"]) - visible_ids:
+        suggest_index.remove(kind, entity_id)
+
+invalidation_bus.add_listener(refresh_suggest_entries)
+# The index has no TTL: after a bus outage, rebuild it rather than keep
+# entries for writes whose messages were lost
+invalidation_bus.add_subscribe_listener(rebuild_suggest_index)
+
+async def mirror_related_products(message: dict):
+    # The worker that ran the related_products job recomputed and stored the
+    # neighbour lists; the others only keep their in-memory vectors current
+    if message["kind"] == "related" and message["worker"] != invalidation_bus.worker_id:
+        await related_products.refresh(db, message["ids"], persist=False)
+
+invalidation_bus.add_listener(mirror_related_products)
+
+async def refresh_sitemap_and_feed(message: dict):
+    await sitemap.refresh(db, message["kind"], message["ids"])
+    if message["kind"] == "blog_post":
+        blog_feed.invalidate()
+
+invalidation_bus.add_listener(refresh_sitemap_and_feed)
+
+async def resync_sitemap_and_feed():
+    blog_feed.invalidate()
+    await sitemap.build(db)
+
+invalidation_bus.add_subscribe_listener(resync_sitemap_and_feed)
+
+async def refresh_catalog_columns(message: dict):
+    if message["kind"] == "product":
+        await catalog_columns.refresh(db, message["ids"])
+
+if CATALOG_COLUMNS_ENABLED:
+    invalidation_bus.add_listener(refresh_catalog_columns)
+    invalidation_bus.add_subscribe_listener(lambda: catalog_columns.schedule_reload(db))
+
+
+# ===== BACKGROUND JOBS =====
+
+async def refresh_related_products(product_ids: List[str]):
+    await related_products.refresh(db, product_ids)
+    await invalidation_bus.publish("related", product_ids)
+
+async def refresh_blog_related(post_ids: List[str]):
+    await blog_related.refresh(db, post_ids)
+
+async def record_price_changes(changes: List[list], ts: datetime):
+    await price_history.record([tuple(change) for change in changes], ts=ts)
+
+job_queue.register("related_products", refresh_related_products)
+# Ahead of the related lists: a price chart should catch up within seconds
+job_queue.register("price_history", record_price_changes, priority=1)
+job_queue.register("blog_related", refresh_blog_related)
+
+def use_catalog_columns() -> bool:
+    # While the bus is down the snapshot may be missing writes
+    return CATALOG_COLUMNS_ENABLED and catalog_columns.loaded and cache.enabled
+
+async def fetch_product_page(ids: List[str]) -> List[dict]:
+    found = await find_products_cached(ids)
+    return [found[i] for i in ids if i in found]
+
+
+def requires_mongo():
+    if not MONGO_ENABLED:
+        raise HTTPException(status_code=503, detail="Not available from the read-only catalog")
+
+
 # ===== ROUTES =====
 
 @api_router.get("/")
 async def root():
     return {"message": "Farm Animal Products Affiliate API"}
 
+def rendered_response(request: Request, document) -> Response:
+    headers = {"ETag": document.etag, "Cache-Control": "public, max-age=300"}
+    if request.headers.get("if-none-match") == document.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=document.body, media_type=document.media_type, headers=headers)
+
+@api_router.get("/sitemap.xml", dependencies=[Depends(requires_mongo)])
+async def get_sitemap(request: Request):
+    return rendered_response(request, sitemap.index())
+
+@api_router.get("/sitemaps/{shard}.xml", dependencies=[Depends(requires_mongo)])
+async def get_sitemap_shard(shard: int, request: Request):
+    document = sitemap.shard(shard)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Sitemap not found")
+    return rendered_response(request, document)
+
+@api_router.get("/feed.rss", dependencies=[Depends(requires_mongo)])
+async def get_rss_feed(request: Request):
+    return rendered_response(request, await blog_feed.render(db, "rss"))
+
+@api_router.get("/feed.atom", dependencies=[Depends(requires_mongo)])
+async def get_atom_feed(request: Request):
+    return rendered_response(request, await blog_feed.render(db, "atom"))
+
+@api_router.get("/suggest", response_model=List[Suggestion])
+async def suggest(q: str, limit: int = 8):
+    return suggest_index.suggest(q, min(limit, 20))
+
 # ===== ADMIN AUTHENTICATION =====
 
 @api_router.post("/admin/register")
 async def register_admin(admin_data: AdminCreate):
     # Check if admin already exists
-    existing_admin = await db.admins.find_one({
-        "$or": [{"username": admin_data.username}, {"email": admin_data.email}]
-    })
-    if existing_admin:
+    if await storage.admins.exists(admin_data.username, admin_data.email):
         raise HTTPException(status_code=400, detail="Admin already exists")
     
     # Create admin
@@ -228,12 +729,12 @@ async def register_admin(admin_data: AdminCreate):
         password_hash=hash_password(admin_data.password)
     )
     
-    await db.admins.insert_one(admin.dict())
+    await storage.admins.insert(admin.dict())
     return {"message": "Admin created successfully", "admin_id": admin.id}
 
 @api_router.post("/admin/login")
 async def login_admin(login_data: AdminLogin):
-    admin = await db.admins.find_one({"username": login_data.username})
+    admin = await storage.admins.get_by_username(login_data.username)
     if not admin or not verify_password(login_data.password, admin["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
@@ -247,157 +748,316 @@ async def login_admin(login_data: AdminLogin):
 
 @api_router.get("/categories", response_model=List[Category])
 async def get_categories():
-    categories = await db.categories.find().to_list(1000)
+    categories = cache.get("categories")
+    if categories is None:
+        generation = cache.generation
+        categories = await storage.categories.list()
+        cache.set("categories", categories, generation=generation)
     return [Category(**category) for category in categories]
 
 @api_router.get("/categories/{category_id}", response_model=Category)
 async def get_category(category_id: str):
-    category = await db.categories.find_one({"id": category_id})
+    category = await find_one_cached(f"category:{category_id}", storage.categories.get, category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return Category(**category)
 
 @api_router.post("/admin/categories", response_model=Category)
 async def create_category(category_data: CategoryCreate, current_admin: AdminResponse = Depends(get_current_admin)):
-    # Check if slug already exists
-    existing = await db.categories.find_one({"slug": category_data.slug})
-    if existing:
-        raise HTTPException(status_code=400, detail="Category slug already exists")
-    
     category = Category(**category_data.dict())
-    await db.categories.insert_one(category.dict())
+    # The unique slug index rejects duplicates in the same round trip
+    try:
+        await storage.categories.insert(category.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Category slug already exists")
+    await invalidation_bus.publish("category", [category.id], category_cache_keys(category.id))
     return category
 
 @api_router.put("/admin/categories/{category_id}", response_model=Category)
 async def update_category(category_id: str, category_data: CategoryCreate, current_admin: AdminResponse = Depends(get_current_admin)):
-    category = await db.categories.find_one({"id": category_id})
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found")
-    
-    # Check if new slug conflicts with another category
-    if category_data.slug != category["slug"]:
-        existing = await db.categories.find_one({"slug": category_data.slug})
-        if existing:
-            raise HTTPException(status_code=400, detail="Category slug already exists")
-    
     updated_category = Category(
         id=category_id,
         **category_data.dict()
     )
     
-    await db.categories.update_one({"id": category_id}, {"$set": updated_category.dict()})
+    try:
+        found = await storage.categories.replace(category_id, updated_category.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Category slug already exists")
+    if not found:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    await invalidation_bus.publish("category", [category_id], category_cache_keys(category_id))
     return updated_category
 
 @api_router.delete("/admin/categories/{category_id}")
 async def delete_category(category_id: str, current_admin: AdminResponse = Depends(get_current_admin)):
-    category = await db.categories.find_one({"id": category_id})
-    if not category:
-        raise HTTPException(status_code=404, detail="Category not found")
-    
     # Check if category has products
-    products_count = await db.products.count_documents({"category_id": category_id})
-    if products_count > 0:
+    if await storage.products.in_category(category_id):
         raise HTTPException(status_code=400, detail="Cannot delete category with products")
     
-    await db.categories.delete_one({"id": category_id})
+    if not await storage.categories.delete(category_id):
+        raise HTTPException(status_code=404, detail="Category not found")
+    await invalidation_bus.publish("category", [category_id], category_cache_keys(category_id))
     return {"message": "Category deleted successfully"}
 
 
 # ===== PRODUCTS ROUTES =====
 
+def check_product_sort(sort: str):
+    if sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(PRODUCT_SORTS)}")
+
 @api_router.get("/products", response_model=List[Product])
 async def get_products(
     category_id: Optional[str] = None,
     is_featured: Optional[bool] = None,
     is_active: bool = True,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    on_sale: Optional[bool] = None,
+    sort: str = "newest",
     limit: int = 50,
     skip: int = 0
 ):
-    filter_dict = {"is_active": is_active}
-    if category_id:
-        filter_dict["category_id"] = category_id
-    if is_featured is not None:
-        filter_dict["is_featured"] = is_featured
-    
-    products = await db.products.find(filter_dict).skip(skip).limit(limit).sort("created_at", -1).to_list(limit)
+    check_product_sort(sort)
+    if is_active and use_catalog_columns():
+        page = catalog_columns.query(
+            category_id, is_featured, min_price, max_price, min_rating, on_sale, sort, skip, limit
+        )
+        return [Product(**product) for product in await fetch_product_page(page["items"])]
+    filters = dict(
+        category_id=category_id, is_featured=is_featured, is_active=is_active, min_price=min_price,
+        max_price=max_price, min_rating=min_rating, on_sale=on_sale,
+    )
+    products = await storage.products.page(filters, sort, skip, limit)
     return [Product(**product) for product in products]
 
+@api_router.get("/products/browse", response_model=ProductPage)
+async def browse_products(
+    category_id: Optional[str] = None,
+    is_featured: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    on_sale: Optional[bool] = None,
+    sort: str = "newest",
+    limit: int = 24,
+    skip: int = 0
+):
+    check_product_sort(sort)
+    limit = min(limit, 100)
+    if use_catalog_columns():
+        result = catalog_columns.query(
+            category_id, is_featured, min_price, max_price, min_rating, on_sale, sort, skip, limit,
+            facets=True,
+        )
+        items = await fetch_product_page(result["items"])
+    else:
+        filters = dict(
+            category_id=category_id, is_featured=is_featured, is_active=True, min_price=min_price,
+            max_price=max_price, min_rating=min_rating, on_sale=on_sale,
+        )
+        result = await storage.products.browse(filters, sort, skip, limit)
+        items = result["items"]
+    return ProductPage(
+        items=[Product(**product) for product in items],
+        total=result["total"],
+        facets=ProductFacets(
+            categories=[
+                CategoryFacet(category_id=c["_id"], category_name=c.get("category_name"), count=c["count"])
+                for c in result["categories"]
+            ],
+            price=range_facets(result["price"], PRICE_BUCKETS, None),
+            rating=range_facets(result["rating"], RATING_BANDS, 5),
+        ),
+    )
+
 @api_router.get("/products/search")
 async def search_products(q: str, limit: int = 20):
-    filter_dict = {
-        "is_active": True,
-        "$or": [
-            {"name": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-            {"features": {"$regex": q, "$options": "i"}}
-        ]
-    }
+    products = await storage.products.search(q, limit)
+    return [Product(**product) for product in products]
+
+@api_router.get("/products/batch", response_model=ProductBatch)
+async def get_products_batch(ids: str):
+    # ids is a comma-separated list of product ids and/or slugs
+    keys = list(dict.fromkeys(key.strip() for key in ids.split(",") if key.strip()))
+    if len(keys) > PRODUCT_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {PRODUCT_BATCH_MAX} ids per batch")
     
-    products = await db.products.find(filter_dict).limit(limit).to_list(limit)
+    found = await find_products_cached(keys)
+    results = []
+    missing = []
+    for key in keys:
+        product = found.get(key)
+        if product and product.get("is_active"):
+            results.append(Product(**product))
+        else:
+            missing.append(key)
+    return ProductBatch(products=results, missing=missing)
+
+@api_router.get("/products/deals", response_model=List[Product])
+async def get_deals(category_id: Optional[str] = None, min_discount: float = 5, limit: int = 20):
+    products = await storage.products.deals(category_id, min_discount, min(limit, 100))
     return [Product(**product) for product in products]
 
+@api_router.get("/products/trending", response_model=List[Product])
+async def get_trending_products(category_id: Optional[str] = None, limit: int = 10):
+    # The merged lists hold ids only; trending products are recently viewed,
+    # so their documents are nearly always in the product cache already
+    product_ids = trending.top(category_id)
+    found = await find_products_cached(product_ids)
+    products = [found[i] for i in product_ids if i in found and found[i].get("is_active")]
+    return [Product(**product) for product in products[:limit]]
+
 @api_router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id, "is_active": True})
-    if not product:
+    product = await find_one_cached(f"product:{product_id}", storage.products.get, product_id)
+    if not product or not product.get("is_active"):
         raise HTTPException(status_code=404, detail="Product not found")
     return Product(**product)
 
+@api_router.get("/products/{product_id}/related", response_model=List[Product], dependencies=[Depends(requires_mongo)])
+async def get_related_products(product_id: str, limit: int = 4):
+    entry = await read_db.product_related.find_one({"product_id": product_id}, {"_id": 0, "related": 1})
+    if not entry:
+        return []
+    related_ids = [related["id"] for related in entry["related"]]
+    found = await find_products_cached(related_ids)
+    related = [found[i] for i in related_ids if i in found and found[i].get("is_active")]
+    return [Product(**product) for product in related[:limit]]
+
+@api_router.get("/products/{product_id}/price-history", response_model=PriceHistoryResponse, dependencies=[Depends(requires_mongo)])
+async def get_price_history(product_id: str, days: int = 90):
+    product = await find_one_cached(f"product:{product_id}", storage.products.get, product_id)
+    if not product or not product.get("is_active"):
+        raise HTTPException(status_code=404, detail="Product not found")
+    points, daily = await price_history.history(product_id, min(max(days, 1), price_history.retention_days))
+    return PriceHistoryResponse(
+        product_id=product_id,
+        points=[PricePoint(**point) for point in points],
+        daily=[DailyPrice(**day) for day in daily],
+    )
+
+@api_router.get("/go/{slug}")
+async def affiliate_redirect(slug: str):
+    product = await find_one_cached(f"product:slug:{slug}", storage.products.get_by_slug, slug)
+    if not product or not product.get("is_active"):
+        raise HTTPException(status_code=404, detail="Product not found")
+    url = product["affiliate_url"]
+    if not url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=404, detail="Product has no valid affiliate link")
+    if MONGO_ENABLED:
+        click_counter.record(product["id"])
+    trending.record(product["id"], product["category_id"], CLICK_WEIGHT)
+    return RedirectResponse(url, status_code=302)
+
 @api_router.get("/products/slug/{slug}", response_model=Product)
 async def get_product_by_slug(slug: str):
-    product = await db.products.find_one({"slug": slug, "is_active": True})
+    product = await find_one_cached(f"product:slug:{slug}", storage.products.get_by_slug, slug)
+    if not product or not product.get("is_active"):
+        raise HTTPException(status_code=404, detail="Product not found")
+    trending.record(product["id"], product["category_id"], VIEW_WEIGHT)
+    return Product(**product)
+
+ADMIN_TABLE_MAX = 200
+
+def check_table_page(skip: int, limit: int):
+    if skip < 0 or not 1 <= limit <= ADMIN_TABLE_MAX:
+        raise HTTPException(status_code=400, detail=f"skip must be >= 0 and limit between 1 and {ADMIN_TABLE_MAX}")
+
+@api_router.get("/admin/products", response_model=ProductTable)
+async def get_admin_products(
+    q: Optional[str] = None,
+    status: str = "all",
+    category_id: Optional[str] = None,
+    is_featured: Optional[bool] = None,
+    sort: str = "-updated_at",
+    skip: int = 0,
+    limit: int = 50,
+    current_admin: AdminResponse = Depends(get_current_admin)
+):
+    # Every state, lean rows, and the filtered total from the same query
+    statuses = {"all": None, "active": True, "inactive": False}
+    if status not in statuses:
+        raise HTTPException(status_code=400, detail="status must be one of: all, active, inactive")
+    check_table_page(skip, limit)
+    try:
+        return await storage.products.table(statuses[status], category_id, is_featured, q, sort, skip, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/admin/products/{product_id}", response_model=Product)
+async def get_admin_product(product_id: str, current_admin: AdminResponse = Depends(get_current_admin)):
+    # Uncached and regardless of is_active, for the edit form
+    product = await storage.products.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return Product(**product)
 
 @api_router.post("/admin/products", response_model=Product)
 async def create_product(product_data: ProductCreate, current_admin: AdminResponse = Depends(get_current_admin)):
-    # Check if slug already exists
-    existing = await db.products.find_one({"slug": product_data.slug})
-    if existing:
-        raise HTTPException(status_code=400, detail="Product slug already exists")
-    
     # Get category name
-    category = await db.categories.find_one({"id": product_data.category_id})
-    if not category:
+    category_name = await storage.categories.get_name(product_data.category_id)
+    if category_name is None:
         raise HTTPException(status_code=400, detail="Category not found")
     
     product = Product(
         **product_data.dict(),
-        category_name=category["name"]
+        category_name=category_name,
+        discount_pct=discount_pct(product_data.price, product_data.original_price)
     )
     
-    await db.products.insert_one(product.dict())
+    try:
+        await storage.products.insert(product.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Product slug already exists")
+    await job_queue.enqueue(
+        "price_history", changes=[(product.id, product.price, product.original_price)], ts=product.created_at
+    )
+    await invalidation_bus.publish("product", [product.id], product_cache_keys(product.dict()))
+    await job_queue.enqueue("related_products", product_ids=[product.id])
     return product
 
 @api_router.put("/admin/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_data: ProductUpdate, current_admin: AdminResponse = Depends(get_current_admin)):
-    product = await db.products.find_one({"id": product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
     update_dict = {k: v for k, v in product_data.dict().items() if v is not None}
     update_dict["updated_at"] = datetime.utcnow()
     
     # Update category name if category_id changed
     if "category_id" in update_dict:
-        category = await db.categories.find_one({"id": update_dict["category_id"]})
-        if not category:
+        category_name = await storage.categories.get_name(update_dict["category_id"])
+        if category_name is None:
+            # A missing product still takes precedence over a bad category
+            if not await storage.products.exists(product_id):
+                raise HTTPException(status_code=404, detail="Product not found")
             raise HTTPException(status_code=400, detail="Category not found")
-        update_dict["category_name"] = category["name"]
+        update_dict["category_name"] = category_name
     
-    await db.products.update_one({"id": product_id}, {"$set": update_dict})
+    # The stored document as it was; the repository recomputes discount_pct
+    product = await storage.products.update(product_id, update_dict)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    updated_product = {**product, **update_dict}
+    updated_product["discount_pct"] = discount_pct(updated_product["price"], updated_product.get("original_price"))
     
-    updated_product = await db.products.find_one({"id": product_id})
+    prices = (updated_product["price"], updated_product.get("original_price"))
+    if prices != (product["price"], product.get("original_price")):
+        await job_queue.enqueue("price_history", changes=[(product_id, *prices)], ts=update_dict["updated_at"])
+    await invalidation_bus.publish("product", [product_id], product_cache_keys(updated_product))
+    await job_queue.enqueue("related_products", product_ids=[product_id])
     return Product(**updated_product)
 
 @api_router.delete("/admin/products/{product_id}")
 async def delete_product(product_id: str, current_admin: AdminResponse = Depends(get_current_admin)):
-    product = await db.products.find_one({"id": product_id})
+    # find_one_and_delete hands back the slug needed for cache eviction
+    product = await storage.products.delete(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    await db.products.delete_one({"id": product_id})
+    await invalidation_bus.publish("product", [product_id], product_cache_keys(product))
+    await job_queue.enqueue("related_products", product_ids=[product_id])
     return {"message": "Product deleted successfully"}
 
 
@@ -411,95 +1071,204 @@ async def get_blog_posts(
     limit: int = 20,
     skip: int = 0
 ):
-    filter_dict = {"is_published": is_published}
-    if category_id:
-        filter_dict["category_id"] = category_id
-    if is_featured is not None:
-        filter_dict["is_featured"] = is_featured
-    
-    posts = await db.blog_posts.find(filter_dict).skip(skip).limit(limit).sort("published_at", -1).to_list(limit)
+    posts = await storage.blog_posts.list(category_id, is_published, is_featured, skip, limit)
     return [BlogPost(**post) for post in posts]
 
 @api_router.get("/blog/posts/{post_id}", response_model=BlogPost)
 async def get_blog_post(post_id: str):
-    post = await db.blog_posts.find_one({"id": post_id, "is_published": True})
-    if not post:
+    post = await find_one_cached(f"post:{post_id}", storage.blog_posts.get, post_id)
+    if not post or not post.get("is_published"):
         raise HTTPException(status_code=404, detail="Blog post not found")
     return BlogPost(**post)
 
+@api_router.get("/blog/posts/{post_id}/related", response_model=List[BlogPost], dependencies=[Depends(requires_mongo)])
+async def get_related_blog_posts(post_id: str, limit: int = 3):
+    entry = await read_db.blog_related.find_one({"post_id": post_id}, {"_id": 0, "related": 1})
+    if not entry:
+        return []
+    related_ids = [related["id"] for related in entry["related"]]
+    
+    found = {}
+    misses = []
+    for related_id in related_ids:
+        post = cache.get(f"post:{related_id}")
+        if post is None:
+            misses.append(related_id)
+        else:
+            found[related_id] = post
+    if misses:
+        generation = cache.generation
+        for post in await storage.blog_posts.find_many(misses):
+            cache.set(f"post:{post['id']}", post, generation=generation)
+            found[post["id"]] = post
+    
+    related = [found[i] for i in related_ids if i in found and found[i].get("is_published")]
+    return [BlogPost(**post) for post in related[:limit]]
+
 @api_router.get("/blog/posts/slug/{slug}", response_model=BlogPost)
-async def get_blog_post_by_slug(slug: str):
-    post = await db.blog_posts.find_one({"slug": slug, "is_published": True})
+async def get_blog_post_by_slug(slug: str, request: Request):
+    page = await find_one_cached(f"post:page:{slug}", find_post_page, slug) if MONGO_ENABLED else None
+    if page:
+        return rendered_response(request, RenderedDocument(page["body"], "application/json"))
+    # Posts not rendered yet (see the blog_post_render migration) are served from the document
+    post = await find_one_cached(f"post:slug:{slug}", storage.blog_posts.get_by_slug, slug)
+    if not post or not post.get("is_published"):
+        raise HTTPException(status_code=404, detail="Blog post not found")
+    return BlogPost(**post)
+
+@api_router.get("/admin/blog/posts", response_model=BlogPostTable)
+async def get_admin_blog_posts(
+    q: Optional[str] = None,
+    status: str = "all",
+    category_id: Optional[str] = None,
+    sort: str = "-updated_at",
+    skip: int = 0,
+    limit: int = 50,
+    current_admin: AdminResponse = Depends(get_current_admin)
+):
+    statuses = {"all": None, "published": True, "draft": False}
+    if status not in statuses:
+        raise HTTPException(status_code=400, detail="status must be one of: all, published, draft")
+    check_table_page(skip, limit)
+    try:
+        return await storage.blog_posts.table(statuses[status], category_id, q, sort, skip, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/admin/blog/posts/{post_id}", response_model=BlogPost)
+async def get_admin_blog_post(post_id: str, current_admin: AdminResponse = Depends(get_current_admin)):
+    post = await storage.blog_posts.get(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Blog post not found")
     return BlogPost(**post)
 
 @api_router.post("/admin/blog/posts", response_model=BlogPost)
 async def create_blog_post(post_data: BlogPostCreate, current_admin: AdminResponse = Depends(get_current_admin)):
-    # Check if slug already exists
-    existing = await db.blog_posts.find_one({"slug": post_data.slug})
-    if existing:
-        raise HTTPException(status_code=400, detail="Blog post slug already exists")
-    
     # Get category name if category_id provided
     category_name = None
     if post_data.category_id:
-        category = await db.categories.find_one({"id": post_data.category_id})
-        if category:
-            category_name = category["name"]
+        category_name = await storage.categories.get_name(post_data.category_id)
     
     post = BlogPost(
-        **post_data.dict(),
+        **{
+            **post_data.dict(),
+            **rendered_post_fields(post_data.content, post_data.excerpt, post_data.meta_description),
+        },
         category_name=category_name,
         published_at=datetime.utcnow() if post_data.is_published else None
     )
     
-    await db.blog_posts.insert_one(post.dict())
+    try:
+        await storage.blog_posts.insert(post.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Blog post slug already exists")
+    await save_post_page(post)
+    await invalidation_bus.publish("blog_post", [post.id], blog_post_cache_keys(post.dict()))
+    await job_queue.enqueue("blog_related", post_ids=[post.id])
     return post
 
 @api_router.put("/admin/blog/posts/{post_id}", response_model=BlogPost)
 async def update_blog_post(post_id: str, post_data: BlogPostCreate, current_admin: AdminResponse = Depends(get_current_admin)):
-    post = await db.blog_posts.find_one({"id": post_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Blog post not found")
-    
     # Get category name if category_id provided
     category_name = None
     if post_data.category_id:
-        category = await db.categories.find_one({"id": post_data.category_id})
-        if category:
-            category_name = category["name"]
+        category_name = await storage.categories.get_name(post_data.category_id)
+    
+    # Read first: whether the excerpt was derived decides if it is re-derived
+    previous = await storage.blog_posts.get(post_id)
+    if not previous:
+        raise HTTPException(status_code=404, detail="Blog post not found")
+    now = datetime.utcnow()
+    fields = {
+        **post_data.dict(),
+        **rendered_post_fields(post_data.content, post_data.excerpt, post_data.meta_description, previous),
+        "category_name": category_name,
+        "updated_at": now,
+    }
+    # published_at is only stamped the first time the post goes live
+    try:
+        post = await storage.blog_posts.update(
+            post_id, fields, published_at=now if post_data.is_published else None
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Blog post slug already exists")
+    if not post:
+        raise HTTPException(status_code=404, detail="Blog post not found")
+    post["id"] = post_id
     
     updated_post = BlogPost(
         id=post_id,
-        **post_data.dict(),
-        category_name=category_name,
+        **fields,
         created_at=post["created_at"],
-        updated_at=datetime.utcnow(),
-        published_at=datetime.utcnow() if post_data.is_published and not post.get("published_at") else post.get("published_at")
+        published_at=now if post_data.is_published and not post.get("published_at") else post.get("published_at")
     )
+    await save_post_page(updated_post)
     
-    await db.blog_posts.update_one({"id": post_id}, {"$set": updated_post.dict()})
+    # The slug may have changed, so evict the old one as well as the new one
+    await invalidation_bus.publish(
+        "blog_post", [post_id], blog_post_cache_keys(post) + blog_post_cache_keys(updated_post.dict())
+    )
+    await job_queue.enqueue("blog_related", post_ids=[post_id])
     return updated_post
 
 @api_router.delete("/admin/blog/posts/{post_id}")
 async def delete_blog_post(post_id: str, current_admin: AdminResponse = Depends(get_current_admin)):
-    post = await db.blog_posts.find_one({"id": post_id})
+    post = await storage.blog_posts.delete(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Blog post not found")
+    await db.blog_post_pages.delete_one({"post_id": post_id})
     
-    await db.blog_posts.delete_one({"id": post_id})
+    await invalidation_bus.publish("blog_post", [post_id], blog_post_cache_keys(post))
+    await job_queue.enqueue("blog_related", post_ids=[post_id])
     return {"message": "Blog post deleted successfully"}
 
 
+# ===== JOBS =====
+
+@api_router.get("/admin/jobs")
+async def get_job_status(current_admin: AdminResponse = Depends(get_current_admin)):
+    return await job_queue.status()
+
+@api_router.get("/admin/jobs/{job_id}")
+async def get_job(job_id: str, current_admin: AdminResponse = Depends(get_current_admin)):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+# ===== DEADLINES =====
+
+@api_router.get("/admin/deadlines")
+async def get_deadline_stats(current_admin: AdminResponse = Depends(get_current_admin)):
+    # Requests and deadline-exceeded counts per route template, for this worker
+    return request_deadlines.stats()
+
+
+# ===== PROFILES =====
+
+@api_router.get("/admin/profiles")
+async def list_profiles(current_admin: AdminResponse = Depends(get_current_admin)):
+    return await asyncio.to_thread(profile_store.list)
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, current_admin: AdminResponse = Depends(get_current_admin)):
+    path = profile_store.data_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=path.name, media_type="application/octet-stream")
+
+
 # ===== DASHBOARD STATS =====
 
 @api_router.get("/admin/stats")
 async def get_dashboard_stats(current_admin: AdminResponse = Depends(get_current_admin)):
-    total_products = await db.products.count_documents({"is_active": True})
-    total_categories = await db.categories.count_documents({})
-    total_blog_posts = await db.blog_posts.count_documents({"is_published": True})
-    featured_products = await db.products.count_documents({"is_featured": True, "is_active": True})
+    total_products, total_categories, total_blog_posts, featured_products = await asyncio.gather(
+        storage.products.count_active(),
+        storage.categories.count(),
+        storage.blog_posts.count_published(),
+        storage.products.count_active(is_featured=True),
+    )
     
     return {
         "total_products": total_products,
@@ -509,9 +1278,75 @@ async def get_dashboard_stats(current_admin: AdminResponse = Depends(get_current
     }
 
 
+# ===== MIGRATIONS =====
+
+def migrate_discount_pct(product: dict):
+    return {"$set": {"discount_pct": discount_pct(product.get("price"), product.get("original_price"))}}
+
+async def publish_migrated_products(products: List[dict]):
+    keys = [key for product in products for key in product_cache_keys(product)]
+    await invalidation_bus.publish("product", [product["id"] for product in products], keys)
+
+def migrate_rendered_post(post: dict):
+    return {"$set": rendered_post_fields(post["content"], post.get("excerpt"), post.get("meta_description"), post)}
+
+async def save_migrated_posts(posts: List[dict]):
+    for post in posts:
+        await save_post_page(BlogPost(**post))
+    keys = [key for post in posts for key in blog_post_cache_keys(post)]
+    await invalidation_bus.publish("blog_post", [post["id"] for post in posts], keys)
+
+async def index_migrated_posts(posts: List[dict]):
+    # Incremental, like a write: lists of already indexed posts sharing a
+    # term are recomputed too
+    await blog_related.refresh(db, [post["id"] for post in posts])
+
+# Append only: a version runs once per database, in order
+MIGRATIONS = [
+    # Products written before discount_pct was stored on every write
+    Migration(
+        1, "product_discount_pct", "products", {"discount_pct": {"$exists": False}}, migrate_discount_pct,
+        projection={"id": 1, "slug": 1, "price": 1, "original_price": 1},
+        after_batch=publish_migrated_products,
+    ),
+    # Posts saved before content was rendered at write time
+    Migration(
+        2, "blog_post_render", "blog_posts", {"content_html": {"$exists": False}}, migrate_rendered_post,
+        after_batch=save_migrated_posts,
+    ),
+    # Posts published before the related-posts index existed
+    Migration(
+        3, "blog_related_index", "blog_posts", {"is_published": True}, None,
+        projection={"id": 1}, after_batch=index_migrated_posts,
+    ),
+]
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.exception_handler(ReadOnlyStorageError)
+async def read_only_storage(request: Request, exc: ReadOnlyStorageError):
+    return JSONResponse(status_code=503, content={"detail": "Storage is read-only"})
+
+async def is_admin_request(request: Request) -> bool:
+    try:
+        await get_current_admin(await security(request))
+    except HTTPException:
+        return False
+    return True
+
+app.add_middleware(
+    ProfilingMiddleware,
+    store=profile_store,
+    authorize=is_admin_request,
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    interval=float(os.environ.get('PROFILE_INTERVAL_MS', '5')) / 1000,
+)
+
+# Added before CORS, so a 504 still carries the CORS headers
+app.add_middleware(DeadlineMiddleware, deadlines=request_deadlines, routes=app.routes)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -527,6 +1362,93 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def mongo_startup(hook):
+    # Hooks that need MongoDB; skipped when serving the read-only snapshot
+    if MONGO_ENABLED:
+        app.on_event("startup")(hook)
+    return hook
+
+@app.on_event("startup")
+async def enable_snapshot_cache():
+    # No invalidation bus runs without MongoDB; none is needed, as the
+    # snapshot never changes
+    if not MONGO_ENABLED:
+        cache.enabled = True
+
+@mongo_startup
+async def ensure_indexes():
+    # Slug uniqueness is enforced by these indexes; the write routes rely on
+    # DuplicateKeyError instead of checking for an existing slug first, so
+    # refuse to start without them
+    for collection in (db.categories, db.products, db.blog_posts):
+        for field in ("id", "slug"):
+            try:
+                await collection.create_index(field, unique=True)
+            except OperationFailure as e:
+                raise RuntimeError(
+                    f"Could not create unique {field} index on {collection.name}; "
+                    f"remove duplicate {field} values and restart: {e}"
+                ) from e
+    for keys in PRODUCT_INDEXES:
+        await db.products.create_index(keys)
+    await price_history.ensure_collections()
+    # Least recently checked first, for asin_refresh.py
+    await db.products.create_index([("asin_checked_at", 1), ("id", 1)])
+    await db.product_related.create_index("product_id", unique=True)
+    await db.blog_tag_index.create_index("term", unique=True)
+    await db.blog_related.create_index("post_id", unique=True)
+    # Reverse lookups for export_snapshot.py's incremental mode
+    await db.product_related.create_index("related.id")
+    await db.blog_related.create_index("related.id")
+    await db.blog_posts.create_index([("is_published", 1), ("published_at", -1)])
+    # Default order of the admin tables
+    await db.products.create_index([("updated_at", -1), ("id", 1)])
+    await db.blog_posts.create_index([("updated_at", -1), ("id", 1)])
+    await db.blog_post_pages.create_index("post_id", unique=True)
+    await db.blog_post_pages.create_index("slug")
+    await db.product_clicks_daily.create_index([("product_id", 1), ("day", 1)], unique=True)
+    await db.product_clicks.create_index("product_id", unique=True)
+    await job_queue.ensure_indexes()
+    await migration_runner.ensure_indexes()
+    # Snapshots of workers that stopped merging age out
+    await db.trending_workers.create_index("updated_at", expireAfterSeconds=int(trending.merge_interval * 10))
+
+@mongo_startup
+async def start_migrations():
+    # Runs in the background; the lease keeps workers from duplicating work
+    if MIGRATIONS_ON_STARTUP:
+        await migration_runner.start(MIGRATIONS)
+
+@mongo_startup
+async def start_invalidation_bus():
+    await invalidation_bus.start()
+
+@app.on_event("startup")
+async def build_suggest_index():
+    await rebuild_suggest_index()
+
+@mongo_startup
+async def build_sitemap():
+    await sitemap.build(db)
+
+@mongo_startup
+async def start_click_counter():
+    await click_counter.start()
+
+@mongo_startup
+async def start_trending_tracker():
+    await trending.start()
+
+@mongo_startup
+async def start_job_queue():
+    await job_queue.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await click_counter.stop()
+    await trending.stop()
+    await migration_runner.stop()
+    await job_queue.stop()
+    await catalog_columns.stop()
+    await invalidation_bus.stop()
     client.close()
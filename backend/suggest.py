@@ -0,0 +1,155 @@
+"""In-memory typeahead index over product, category and blog post titles.
+
+Every word-start suffix of a title ("cow bell" -> "cow bell", "bell") is kept
+in one sorted array, so a prefix lookup is a bisect followed by a short scan.
+Short prefixes match too much of the catalog to scan per keystroke, so their
+top results are precomputed. Entries are ranked by a popularity score and the
+index is updated one entity at a time as admin writes come in over the
+invalidation bus.
+"""
+import math
+import re
+import unicodedata
+import heapq
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Prefixes up to this length are answered from precomputed top-K lists
+SHORT_PREFIX = 3
+TOP_K = 20
+# Longer prefixes are scanned; bound the scan and memoize repeated queries
+MAX_SCAN = 5000
+MEMO_SIZE = 2048
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = text.encode("ascii", "ignore").decode("ascii").lower()
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def product_score(product: dict) -> float:
+    score = math.log1p(product.get("review_count") or 0) * (product.get("rating") or 0)
+    if product.get("is_featured"):
+        score += 5
+    return score
+
+
+def blog_post_score(post: dict) -> float:
+    return 3.0 if post.get("is_featured") else 1.0
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._terms = []  # sorted (term, entry_key)
+        self._entries = {}  # entry_key -> (entry dict, terms, normalized title)
+        self._top = {}  # short prefix -> [(rank, entry_key)] best first
+        self._memo = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._terms = []
+        self._entries = {}
+        self._top = {}
+        self._memo.clear()
+
+    def load(self, entries):
+        """Replace the index with ``(kind, id, title, slug, score)`` entries."""
+        self.clear()
+        candidates = {}
+        for kind, entity_id, title, slug, score in entries:
+            key = (kind, entity_id)
+            terms = self._add_entry(key, kind, entity_id, title, slug, score)
+            self._terms.extend((term, key) for term in terms)
+            for prefix in self._short_prefixes(terms):
+                candidates.setdefault(prefix, []).append((self._rank(key, prefix), key))
+        self._terms.sort()
+        for prefix, ranked in candidates.items():
+            self._top[prefix] = heapq.nlargest(TOP_K, ranked)
+
+    def upsert(self, kind: str, entity_id: str, title: str, slug: str, score: float):
+        key = (kind, entity_id)
+        self.remove(kind, entity_id)
+        terms = self._add_entry(key, kind, entity_id, title, slug, score)
+        for term in terms:
+            insort(self._terms, (term, key))
+        for prefix in self._short_prefixes(terms):
+            top = self._top.setdefault(prefix, [])
+            top.append((self._rank(key, prefix), key))
+            top.sort(reverse=True)
+            del top[TOP_K:]
+        self._memo.clear()
+
+    def remove(self, kind: str, entity_id: str):
+        key = (kind, entity_id)
+        existing = self._entries.pop(key, None)
+        if existing is None:
+            return
+        terms = existing[1]
+        for term in terms:
+            i = bisect_left(self._terms, (term, key))
+            if i < len(self._terms) and self._terms[i] == (term, key):
+                del self._terms[i]
+        # Lists are trimmed to TOP_K, so a removed entry is replaced by
+        # rescanning the prefix range (write path only)
+        for prefix in self._short_prefixes(terms):
+            top = self._top.get(prefix, [])
+            if any(entry_key == key for _, entry_key in top):
+                self._top[prefix] = heapq.nlargest(TOP_K, self._scan(prefix, len(self._terms)))
+        self._memo.clear()
+
+    def suggest(self, query: str, limit: int = 8):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if len(prefix) <= SHORT_PREFIX:
+            return [self._result(key) for _, key in self._top.get(prefix, [])[:limit]]
+
+        memo_key = (prefix, limit)
+        if memo_key in self._memo:
+            self._memo.move_to_end(memo_key)
+            return self._memo[memo_key]
+        ranked = heapq.nlargest(limit, self._scan(prefix, MAX_SCAN))
+        results = [self._result(key) for _, key in ranked]
+        self._memo[memo_key] = results
+        if len(self._memo) > MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return results
+
+    def _add_entry(self, key, kind, entity_id, title, slug, score):
+        full = normalize(title)
+        words = full.split()
+        terms = {" ".join(words[i:]) for i in range(len(words))}
+        entry = {"type": kind, "id": entity_id, "title": title, "slug": slug, "score": score}
+        self._entries[key] = (entry, terms, full)
+        return terms
+
+    def _rank(self, key, prefix: str) -> float:
+        # Whole-title prefix matches get a small boost over mid-title words
+        entry, _, full = self._entries[key]
+        return entry["score"] + (1 if full.startswith(prefix) else 0)
+
+    def _scan(self, prefix: str, max_scan: int):
+        seen = set()
+        i = bisect_left(self._terms, (prefix,))
+        end = min(len(self._terms), i + max_scan)
+        while i < end:
+            term, key = self._terms[i]
+            if not term.startswith(prefix):
+                break
+            if key not in seen:
+                seen.add(key)
+                yield self._rank(key, prefix), key
+            i += 1
+
+    def _result(self, key):
+        entry = self._entries[key][0]
+        return {k: entry[k] for k in ("type", "id", "title", "slug")}
+
+    @staticmethod
+    def _short_prefixes(terms):
+        return {term[:n] for term in terms for n in range(1, min(SHORT_PREFIX, len(term)) + 1)}
@@ -0,0 +1,133 @@
+"""Time-decayed popularity and the "trending products" lists.
+
+Each worker keeps exponentially decayed scores for product views and
+affiliate clicks in a bounded dict. Scores are stored relative to a fixed
+epoch (``weight * e^(lambda * (t - epoch))``), so a hit is a single addition
+and decay never has to be applied to the whole table.
+
+Every ``merge_interval`` seconds a worker publishes its scores to
+``trending_workers``, sums every live worker's scores, and rebuilds the global
+and per-category top-K lists of product ids. Requests resolve those ids
+through the shared product cache, so the lists hold no documents of their own
+and an edited product is served fresh as soon as its cache entry is evicted.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+VIEW_WEIGHT = 1.0
+CLICK_WEIGHT = 3.0
+# Rebase the epoch before e^(lambda * age) gets anywhere near float overflow
+MAX_EXPONENT = 50
+
+
+class TrendingTracker:
+    def __init__(
+        self,
+        db,
+        worker_id: str,
+        half_life_seconds: float = 6 * 3600,
+        capacity: int = 2000,
+        top_k: int = 50,
+        merge_interval: float = 30,
+    ):
+        self.db = db
+        self.worker_id = worker_id
+        self.decay = math.log(2) / half_life_seconds
+        self.capacity = capacity
+        self.top_k = top_k
+        self.merge_interval = merge_interval
+        self._epoch = time.time()
+        self._scores = {}  # product_id -> scaled score
+        self._categories = {}  # product_id -> category_id
+        self._global = []
+        self._by_category = {}
+        self._task = None
+
+    def record(self, product_id: str, category_id: str, weight: float = VIEW_WEIGHT):
+        exponent = self.decay * (time.time() - self._epoch)
+        if exponent > MAX_EXPONENT:
+            self._rebase()
+            exponent = self.decay * (time.time() - self._epoch)
+        self._scores[product_id] = self._scores.get(product_id, 0.0) + weight * math.exp(exponent)
+        self._categories[product_id] = category_id
+        if len(self._scores) > 2 * self.capacity:
+            self._prune()
+
+    def top(self, category_id: str = None, limit: int = None):
+        product_ids = self._by_category.get(category_id, []) if category_id else self._global
+        return product_ids[:limit]
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def merge(self):
+        now = datetime.utcnow()
+        await self.db.trending_workers.replace_one(
+            {"worker": self.worker_id},
+            {
+                "worker": self.worker_id,
+                "epoch": self._epoch,
+                "scores": [[pid, self._categories.get(pid), score] for pid, score in self._scores.items()],
+                "updated_at": now,
+            },
+            upsert=True,
+        )
+
+        # Bring every worker's scores to the current time before summing
+        current = time.time()
+        merged = defaultdict(float)
+        categories = {}
+        async for snapshot in self.db.trending_workers.find({}, {"_id": 0}):
+            factor = math.exp(-self.decay * (current - snapshot["epoch"]))
+            for product_id, category_id, score in snapshot["scores"]:
+                merged[product_id] += score * factor
+                categories[product_id] = category_id
+
+        by_category = defaultdict(list)
+        for product_id, score in merged.items():
+            by_category[categories[product_id]].append((score, product_id))
+        top_global = heapq.nlargest(self.top_k, ((s, p) for p, s in merged.items()))
+        self._global = [p for _, p in top_global]
+        self._by_category = {
+            category: [p for _, p in heapq.nlargest(self.top_k, scored)]
+            for category, scored in by_category.items()
+        }
+
+    def _rebase(self):
+        now = time.time()
+        factor = math.exp(-self.decay * (now - self._epoch))
+        self._scores = {p: s * factor for p, s in self._scores.items()}
+        self._epoch = now
+
+    def _prune(self):
+        keep = heapq.nlargest(self.capacity, self._scores.items(), key=lambda item: item[1])
+        self._scores = dict(keep)
+        self._categories = {p: self._categories[p] for p in self._scores}
+
+    async def _run(self):
+        while True:
+            try:
+                await self.merge()
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError:
+                logger.exception("Trending merge failed")
+            await asyncio.sleep(self.merge_interval)
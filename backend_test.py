@@ -378,7 +378,23 @@ def test_product_search_and_filtering():
     else:
         print("❌ Featured products filtering failed")
         return False
-    
+
+    # Test batch fetch by id, keeping request order and reporting missing ids
+    print("📦 Testing product batch fetch...")
+    if test_product_id:
+        missing_id = str(uuid.uuid4())
+        response = make_request("GET", "/products/batch", params={"ids": f"{missing_id},{test_product_id}"})
+        if response and response.status_code == 200:
+            batch = response.json()
+            if [p["id"] for p in batch["products"]] == [test_product_id] and batch["missing"] == [missing_id]:
+                print("✅ Batch fetch returned the product and reported the missing id")
+            else:
+                print("❌ Batch fetch returned unexpected results")
+                return False
+        else:
+            print("❌ Product batch fetch failed")
+            return False
+
     print("✅ Product search and filtering completed successfully")
     return True
 
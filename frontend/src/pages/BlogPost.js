@@ -22,10 +22,9 @@ const BlogPost = () => {
       const postData = response.data;
       setPost(postData);
 
-      // Fetch related posts
-      const relatedResponse = await axios.get(`${API}/blog/posts?limit=3`);
-      const filtered = relatedResponse.data.filter(p => p.id !== postData.id);
-      setRelatedPosts(filtered.slice(0, 3));
+      // Fetch related posts (shared tags and category)
+      const relatedResponse = await axios.get(`${API}/blog/posts/${postData.id}/related?limit=3`);
+      setRelatedPosts(relatedResponse.data);
     } catch (error) {
       console.error("Error fetching blog post:", error);
       setError("Blog post not found");
@@ -123,7 +122,7 @@ const BlogPost = () => {
                 month: 'long',
                 day: 'numeric'
               })}</span>
-              <span>5 min read</span>
+              <span>{post.reading_minutes || 1} min read</span>
             </div>
 
             {/* Excerpt */}
@@ -131,25 +130,35 @@ const BlogPost = () => {
               {post.excerpt}
             </div>
 
-            {/* Content */}
-            <div className="prose prose-lg max-w-none">
-              {post.content.split('\n').map((paragraph, index) => {
-                if (paragraph.trim() === '') return <br key={index} />;
-                
-                // Simple formatting: convert **text** to bold and *text* to italic
-                let formattedParagraph = paragraph
-                  .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-                  .replace(/\*(.*?)\*/g, '<em>$1</em>');
-
-                return (
-                  <p 
-                    key={index} 
-                    className="mb-4 text-gray-700 leading-relaxed"
-                    dangerouslySetInnerHTML={{ __html: formattedParagraph }}
-                  />
-                );
-              })}
-            </div>
+            {/* Table of Contents */}
+            {post.toc && post.toc.length > 2 && (
+              <nav className="mb-8 p-4 bg-gray-50 rounded-lg">
+                <h2 className="text-sm font-semibold text-gray-900 uppercase mb-2">Contents</h2>
+                <ul className="space-y-1">
+                  {post.toc.map((entry) => (
+                    <li key={entry.anchor} className={entry.level > 2 ? 'ml-4' : ''}>
+                      <a href={`#${entry.anchor}`} className="text-green-700 hover:text-green-800">
+                        {entry.text}
+                      </a>
+                    </li>
+                  ))}
+                </ul>
+              </nav>
+            )}
+
+            {/* Content: rendered and sanitized by the API when the post is saved */}
+            {post.content_html ? (
+              <div
+                className="prose prose-lg max-w-none text-gray-700 leading-relaxed"
+                dangerouslySetInnerHTML={{ __html: post.content_html }}
+              />
+            ) : (
+              <div className="prose prose-lg max-w-none">
+                {post.content.split('\n').filter((paragraph) => paragraph.trim()).map((paragraph, index) => (
+                  <p key={index} className="mb-4 text-gray-700 leading-relaxed">{paragraph}</p>
+                ))}
+              </div>
+            )}
 
             {/* Social Share */}
             <div className="mt-8 pt-8 border-t border-gray-200">
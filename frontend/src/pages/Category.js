@@ -190,7 +190,7 @@ const Category = () => {
                         Details
                       </Link>
                       <a 
-                        href={product.affiliate_url}
+                        href={`${API}/go/${product.slug}`}
                         target="_blank"
                         rel="noopener noreferrer"
                         className="flex-1 text-center bg-green-600 hover:bg-green-700 text-white py-2 px-4 rounded-lg text-sm font-medium transition"
@@ -175,7 +175,7 @@ const Home = () => {
                         View Details
                       </Link>
                       <a 
-                        href={product.affiliate_url}
+                        href={`${API}/go/${product.slug}`}
                         target="_blank"
                         rel="noopener noreferrer"
                         className="bg-green-600 hover:bg-green-700 text-white px-4 py-2 rounded-lg text-sm font-medium transition"
@@ -22,10 +22,15 @@ const ProductDetail = () => {
       const productData = response.data;
       setProduct(productData);
 
-      // Fetch related products from the same category
-      const relatedResponse = await axios.get(`${API}/products?category_id=${productData.category_id}&limit=4`);
-      const filtered = relatedResponse.data.filter(p => p.id !== productData.id);
-      setRelatedProducts(filtered.slice(0, 3));
+      // Precomputed neighbours; fall back to the same category until they exist
+      const relatedResponse = await axios.get(`${API}/products/${productData.id}/related?limit=3`);
+      if (relatedResponse.data.length > 0) {
+        setRelatedProducts(relatedResponse.data);
+      } else {
+        const categoryResponse = await axios.get(`${API}/products?category_id=${productData.category_id}&limit=4`);
+        const filtered = categoryResponse.data.filter(p => p.id !== productData.id);
+        setRelatedProducts(filtered.slice(0, 3));
+      }
     } catch (error) {
       console.error("Error fetching product:", error);
       setError("Product not found");
@@ -179,7 +184,7 @@ const ProductDetail = () => {
               {/* CTA Buttons */}
               <div className="flex space-x-4 mb-6">
                 <a 
-                  href={product.affiliate_url}
+                  href={`${API}/go/${product.slug}`}
                   target="_blank"
                   rel="noopener noreferrer"
                   className="flex-1 bg-green-600 hover:bg-green-700 text-white text-center py-3 px-6 rounded-lg text-lg font-semibold transition"
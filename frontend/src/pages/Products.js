@@ -10,6 +10,7 @@ const Products = () => {
   const [categories, setCategories] = useState([]);
   const [selectedCategory, setSelectedCategory] = useState("");
   const [searchQuery, setSearchQuery] = useState("");
+  const [suggestions, setSuggestions] = useState([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -17,6 +18,33 @@ const Products = () => {
     fetchProducts();
   }, [selectedCategory]);
 
+  useEffect(() => {
+    if (!searchQuery.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    // Debounce keystrokes; stale responses are dropped on cleanup
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/suggest?q=${encodeURIComponent(searchQuery)}`);
+        if (!cancelled) setSuggestions(response.data);
+      } catch (error) {
+        console.error("Error fetching suggestions:", error);
+      }
+    }, 120);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery]);
+
+  const suggestionLink = (suggestion) => {
+    if (suggestion.type === "category") return `/category/${suggestion.slug}`;
+    if (suggestion.type === "blog_post") return `/blog/${suggestion.slug}`;
+    return `/products/${suggestion.slug}`;
+  };
+
   const fetchCategories = async () => {
     try {
       const response = await axios.get(`${API}/categories`);
@@ -43,6 +71,7 @@ const Products = () => {
 
   const handleSearch = async (e) => {
     e.preventDefault();
+    setSuggestions([]);
     if (!searchQuery.trim()) {
       fetchProducts();
       return;
@@ -87,7 +116,7 @@ const Products = () => {
         <div className="bg-white rounded-lg shadow-md p-6 mb-8">
           <div className="flex flex-col md:flex-row gap-4">
             {/* Search */}
-            <form onSubmit={handleSearch} className="flex-1">
+            <form onSubmit={handleSearch} className="flex-1 relative">
               <div className="flex">
                 <input
                   type="text"
@@ -103,6 +132,23 @@ const Products = () => {
                   Search
                 </button>
               </div>
+              {suggestions.length > 0 && (
+                <ul className="absolute z-10 left-0 right-0 mt-1 bg-white border border-gray-200 rounded-lg shadow-lg">
+                  {suggestions.map((suggestion) => (
+                    <li key={`${suggestion.type}-${suggestion.id}`}>
+                      <Link
+                        to={suggestionLink(suggestion)}
+                        className="flex justify-between px-4 py-2 hover:bg-gray-50 text-gray-800"
+                      >
+                        <span>{suggestion.title}</span>
+                        <span className="text-xs text-gray-500">
+                          {suggestion.type === "blog_post" ? "Article" : suggestion.type === "category" ? "Category" : "Product"}
+                        </span>
+                      </Link>
+                    </li>
+                  ))}
+                </ul>
+              )}
             </form>
 
             {/* Category Filter */}
@@ -193,7 +239,7 @@ const Products = () => {
                     View Details
                   </Link>
                   <a 
-                    href={product.affiliate_url}
+                    href={`${API}/go/${product.slug}`}
                     target="_blank"
                     rel="noopener noreferrer"
                     className="flex-1 text-center bg-green-600 hover:bg-green-700 text-white py-2 px-4 rounded-lg text-sm font-medium transition"
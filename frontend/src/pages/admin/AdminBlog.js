@@ -5,11 +5,17 @@ import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 50;
 
 const AdminBlog = () => {
   const { isAuthenticated, token, admin } = useAuth();
   const navigate = useNavigate();
   const [posts, setPosts] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [search, setSearch] = useState("");
+  const [status, setStatus] = useState("all");
+  const [sort, setSort] = useState("-updated_at");
+  const [page, setPage] = useState(0);
   const [categories, setCategories] = useState([]);
   const [loading, setLoading] = useState(true);
   const [showModal, setShowModal] = useState(false);
@@ -34,21 +40,26 @@ const AdminBlog = () => {
       navigate("/admin/login");
       return;
     }
-    fetchData();
+    axios.get(`${API}/categories`)
+      .then((res) => setCategories(res.data))
+      .catch((error) => console.error("Error fetching categories:", error));
   }, [isAuthenticated, navigate]);
 
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    // Debounced so typing in the search box sends one request
+    const timer = setTimeout(fetchData, search ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [isAuthenticated, search, status, sort, page]);
+
   const fetchData = async () => {
     try {
-      const [postsRes, categoriesRes] = await Promise.all([
-        axios.get(`${API}/blog/posts?limit=100`, {
-          headers: { Authorization: `Bearer ${token}` }
-        }),
-        axios.get(`${API}/categories`, {
-          headers: { Authorization: `Bearer ${token}` }
-        })
-      ]);
-      setPosts(postsRes.data);
-      setCategories(categoriesRes.data);
+      const res = await axios.get(`${API}/admin/blog/posts`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { q: search || undefined, status, sort, skip: page * PAGE_SIZE, limit: PAGE_SIZE }
+      });
+      setPosts(res.data.items);
+      setTotal(res.data.total);
     } catch (error) {
       console.error("Error fetching data:", error);
     } finally {
@@ -85,7 +96,19 @@ const AdminBlog = () => {
     }
   };
 
-  const handleEdit = (post) => {
+  const handleEdit = async (row) => {
+    // Table rows are lean; the form needs the full post
+    let post;
+    try {
+      const res = await axios.get(`${API}/admin/blog/posts/${row.id}`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      post = res.data;
+    } catch (error) {
+      console.error("Error loading post:", error);
+      alert("Error loading post");
+      return;
+    }
     setEditingPost(post);
     setFormData({
       title: post.title,
@@ -200,6 +223,37 @@ const AdminBlog = () => {
       </div>
 
       <div className="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8 py-8">
+        {/* Filters */}
+        <div className="flex flex-wrap gap-4 mb-4">
+          <input
+            type="text"
+            value={search}
+            onChange={(e) => { setSearch(e.target.value); setPage(0); }}
+            placeholder="Search title, slug or author"
+            className="flex-1 min-w-[200px] px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-green-500"
+          />
+          <select
+            value={status}
+            onChange={(e) => { setStatus(e.target.value); setPage(0); }}
+            className="px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-green-500"
+          >
+            <option value="all">All posts</option>
+            <option value="published">Published</option>
+            <option value="draft">Drafts</option>
+          </select>
+          <select
+            value={sort}
+            onChange={(e) => { setSort(e.target.value); setPage(0); }}
+            className="px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-green-500"
+          >
+            <option value="-updated_at">Recently updated</option>
+            <option value="-created_at">Newest</option>
+            <option value="-published_at">Recently published</option>
+            <option value="title">Title</option>
+            <option value="author">Author</option>
+          </select>
+        </div>
+
         {/* Posts Table */}
         <div className="bg-white rounded-lg shadow-md overflow-hidden">
           <div className="overflow-x-auto">
@@ -293,7 +347,31 @@ const AdminBlog = () => {
           </div>
         </div>
 
-        {posts.length === 0 && (
+        {total > PAGE_SIZE && (
+          <div className="flex justify-between items-center mt-4 text-sm text-gray-600">
+            <span>
+              {page * PAGE_SIZE + 1}-{Math.min((page + 1) * PAGE_SIZE, total)} of {total}
+            </span>
+            <div className="flex space-x-2">
+              <button
+                onClick={() => setPage(page - 1)}
+                disabled={page === 0}
+                className="px-3 py-1 border border-gray-300 rounded-md disabled:opacity-50"
+              >
+                Previous
+              </button>
+              <button
+                onClick={() => setPage(page + 1)}
+                disabled={(page + 1) * PAGE_SIZE >= total}
+                className="px-3 py-1 border border-gray-300 rounded-md disabled:opacity-50"
+              >
+                Next
+              </button>
+            </div>
+          </div>
+        )}
+
+        {posts.length === 0 && !search && status === "all" && (
           <div className="text-center py-12">
             <div className="text-6xl text-gray-300 mb-4">📝</div>
             <h3 className="text-xl font-semibold text-gray-900 mb-2">No blog posts yet</h3>
@@ -416,15 +494,14 @@ const AdminBlog = () => {
 
                 <div>
                   <label className="block text-sm font-medium text-gray-700 mb-2">
-                    Excerpt *
+                    Excerpt
                   </label>
                   <textarea
-                    required
                     rows={3}
                     value={formData.excerpt}
                     onChange={(e) => setFormData({...formData, excerpt: e.target.value})}
                     className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-green-500 focus:border-transparent"
-                    placeholder="Brief summary of the blog post..."
+                    placeholder="Brief summary of the blog post (leave blank to use the opening paragraph)..."
                   />
                 </div>
 
@@ -438,7 +515,7 @@ const AdminBlog = () => {
                     value={formData.content}
                     onChange={(e) => setFormData({...formData, content: e.target.value})}
                     className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-green-500 focus:border-transparent"
-                    placeholder="Write your blog post content here. You can use **bold** and *italic* formatting."
+                    placeholder="Write your blog post content here. You can use **bold**, *italic*, # headings and - list items."
                   />
                 </div>
 
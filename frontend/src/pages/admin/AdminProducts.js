@@ -5,11 +5,17 @@ import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 50;
 
 const AdminProducts = () => {
   const { isAuthenticated, token } = useAuth();
   const navigate = useNavigate();
   const [products, setProducts] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [search, setSearch] = useState("");
+  const [status, setStatus] = useState("all");
+  const [sort, setSort] = useState("-updated_at");
+  const [page, setPage] = useState(0);
   const [categories, setCategories] = useState([]);
   const [loading, setLoading] = useState(true);
   const [showModal, setShowModal] = useState(false);
@@ -36,21 +42,26 @@ const AdminProducts = () => {
       navigate("/admin/login");
       return;
     }
-    fetchData();
+    axios.get(`${API}/categories`)
+      .then((res) => setCategories(res.data))
+      .catch((error) => console.error("Error fetching categories:", error));
   }, [isAuthenticated, navigate]);
 
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    // Debounced so typing in the search box sends one request
+    const timer = setTimeout(fetchData, search ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [isAuthenticated, search, status, sort, page]);
+
   const fetchData = async () => {
     try {
-      const [productsRes, categoriesRes] = await Promise.all([
-        axios.get(`${API}/products?limit=100`, {
-          headers: { Authorization: `Bearer ${token}` }
-        }),
-        axios.get(`${API}/categories`, {
-          headers: { Authorization: `Bearer ${token}` }
-        })
-      ]);
-      setProducts(productsRes.data);
-      setCategories(categoriesRes.data);
+      const res = await axios.get(`${API}/admin/products`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { q: search || undefined, status, sort, skip: page * PAGE_SIZE, limit: PAGE_SIZE }
+      });
+      setProducts(res.data.items);
+      setTotal(res.data.total);
     } catch (error) {
       console.error("Error fetching data:", error);
     } finally {
@@ -90,7 +101,19 @@ const AdminProducts = () => {
     }
   };
 
-  const handleEdit = (product) => {
+  const handleEdit = async (row) => {
+    // Table rows are lean; the form needs the full document
+    let product;
+    try {
+      const res = await axios.get(`${API}/admin/products/${row.id}`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      product = res.data;
+    } catch (error) {
+      console.error("Error loading product:", error);
+      alert("Error loading product");
+      return;
+    }
     setEditingProduct(product);
     setFormData({
       name: product.name,
@@ -209,6 +232,40 @@ const AdminProducts = () => {
       </div>
 
       <div className="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8 py-8">
+        {/* Filters */}
+        <div className="flex flex-wrap gap-4 mb-4">
+          <input
+            type="text"
+            value={search}
+            onChange={(e) => { setSearch(e.target.value); setPage(0); }}
+            placeholder="Search name, slug or ASIN"
+            className="flex-1 min-w-[200px] px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-green-500"
+          />
+          <select
+            value={status}
+            onChange={(e) => { setStatus(e.target.value); setPage(0); }}
+            className="px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-green-500"
+          >
+            <option value="all">All statuses</option>
+            <option value="active">Active</option>
+            <option value="inactive">Inactive</option>
+          </select>
+          <select
+            value={sort}
+            onChange={(e) => { setSort(e.target.value); setPage(0); }}
+            className="px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-green-500"
+          >
+            <option value="-updated_at">Recently updated</option>
+            <option value="-created_at">Newest</option>
+            <option value="name">Name</option>
+            <option value="category_name">Category</option>
+            <option value="price">Price: low to high</option>
+            <option value="-price">Price: high to low</option>
+            <option value="-rating">Rating</option>
+            <option value="-discount_pct">Discount</option>
+          </select>
+        </div>
+
         {/* Products Table */}
         <div className="bg-white rounded-lg shadow-md overflow-hidden">
           <div className="overflow-x-auto">
@@ -326,7 +383,31 @@ const AdminProducts = () => {
           </div>
         </div>
 
-        {products.length === 0 && (
+        {total > PAGE_SIZE && (
+          <div className="flex justify-between items-center mt-4 text-sm text-gray-600">
+            <span>
+              {page * PAGE_SIZE + 1}-{Math.min((page + 1) * PAGE_SIZE, total)} of {total}
+            </span>
+            <div className="flex space-x-2">
+              <button
+                onClick={() => setPage(page - 1)}
+                disabled={page === 0}
+                className="px-3 py-1 border border-gray-300 rounded-md disabled:opacity-50"
+              >
+                Previous
+              </button>
+              <button
+                onClick={() => setPage(page + 1)}
+                disabled={(page + 1) * PAGE_SIZE >= total}
+                className="px-3 py-1 border border-gray-300 rounded-md disabled:opacity-50"
+              >
+                Next
+              </button>
+            </div>
+          </div>
+        )}
+
+        {products.length === 0 && !search && status === "all" && (
           <div className="text-center py-12">
             <div className="text-6xl text-gray-300 mb-4">📦</div>
             <h3 className="text-xl font-semibold text-gray-900 mb-2">No products yet</h3>
@@ -0,0 +1,19 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+# server.py reads these at import time; tests that import it never connect
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+
+@pytest.fixture
+def mongo_db():
+    """A fresh in-process stand-in for a Motor database."""
+    from mongomock_motor import AsyncMongoMockClient
+
+    return AsyncMongoMockClient()["test_database"]
@@ -0,0 +1,213 @@
+"""AsinRefresher against benchmarks/asin_stub_server.py on a local port."""
+import argparse
+import asyncio
+import importlib.util
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+from asin_refresh import AsinRefresher, HttpUpstreamClient, parse_retry_after
+from .conftest import BACKEND_DIR
+
+_spec = importlib.util.spec_from_file_location("asin_stub_server", BACKEND_DIR / "benchmarks" / "asin_stub_server.py")
+asin_stub_server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(asin_stub_server)
+
+
+@pytest.fixture
+def stub():
+    """Start a stub upstream; returns a factory taking the stub's command-line options."""
+    servers = []
+
+    def start(latency_ms=0, error_rate=0.0, max_rps=0, missing_pct=0, drift_seconds=3600):
+        args = argparse.Namespace(
+            latency_ms=latency_ms, error_rate=error_rate, max_rps=max_rps,
+            missing_pct=missing_pct, drift_seconds=drift_seconds,
+        )
+        state = asin_stub_server.StubState(args)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), asin_stub_server.make_handler(state))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+async def seed(db, n):
+    await db.products.insert_many([
+        {"id": f"p{i}", "slug": f"product-{i}", "amazon_asin": f"B{i:09d}", "price": 1.0, "rating": 0.0}
+        for i in range(n)
+    ])
+    # Products without an ASIN are never looked up
+    await db.products.insert_one({"id": "no-asin", "slug": "no-asin", "price": 1.0})
+
+
+class CountingClient(HttpUpstreamClient):
+    def __init__(self, base_url):
+        super().__init__(base_url)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch(self, asins):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().fetch(asins)
+        finally:
+            self.in_flight -= 1
+
+
+def test_writes_changes_in_one_bulk_write_per_cursor_batch(mongo_db, stub, monkeypatch):
+    url, state = stub()
+    writes = []
+    collection_class = type(mongo_db.products)
+    bulk_write = collection_class.bulk_write
+
+    async def counting_bulk_write(self, operations, **kwargs):
+        if self.name == "products":
+            writes.append(len(operations))
+        return await bulk_write(self, operations, **kwargs)
+
+    monkeypatch.setattr(collection_class, "bulk_write", counting_bulk_write)
+
+    async def run():
+        await seed(mongo_db, 25)
+        refresher = AsinRefresher(mongo_db, HttpUpstreamClient(url), lookup_size=5, cursor_batch=10, rate=0)
+        return await refresher.run()
+
+    report = asyncio.run(run())
+    assert report["scanned"] == 25
+    assert report["changed"] == 25
+    assert report["failed"] == report["retries"] == 0
+    assert writes == [10, 10, 5]
+    assert state.requests == 5
+
+    async def check():
+        product = await mongo_db.products.find_one({"id": "p3"}, {"_id": 0})
+        expected = state.item("B000000003")
+        assert product["price"] == expected["price"]
+        assert product["rating"] == expected["rating"]
+        assert isinstance(product["asin_checked_at"], datetime)
+        assert "asin_checked_at" not in await mongo_db.products.find_one({"id": "no-asin"})
+        assert await mongo_db.price_history.count_documents({}) == 25
+        # Changed products are published for the other workers
+        message = await mongo_db.cache_invalidations.find_one({})
+        assert message["kind"] == "product"
+
+    asyncio.run(check())
+
+
+def test_second_run_writes_only_the_checked_timestamp(mongo_db, stub):
+    url, _ = stub()
+
+    async def run():
+        await seed(mongo_db, 5)
+        refresher = AsinRefresher(mongo_db, HttpUpstreamClient(url), rate=0)
+        await refresher.run()
+        return await refresher.run()
+
+    report = asyncio.run(run())
+    assert report["changed"] == 0
+    assert report["unchanged"] == 5
+
+
+def test_rate_limit_and_concurrency(mongo_db, stub):
+    url, state = stub(latency_ms=30)
+    client = CountingClient(url)
+
+    async def run():
+        await seed(mongo_db, 12)
+        refresher = AsinRefresher(mongo_db, client, concurrency=2, lookup_size=1, rate=20)
+        started = time.monotonic()
+        report = await refresher.run()
+        return report, time.monotonic() - started
+
+    report, elapsed = asyncio.run(run())
+    assert report["changed"] == 12
+    assert state.requests == 12
+    assert client.max_in_flight <= 2
+    # A burst of 2, then 10 more at 20 per second
+    assert elapsed >= 0.45
+
+
+def test_retries_after_429(mongo_db, stub):
+    url, state = stub(max_rps=2)
+
+    async def run():
+        await seed(mongo_db, 4)
+        refresher = AsinRefresher(mongo_db, HttpUpstreamClient(url), concurrency=4, lookup_size=1, rate=0)
+        return await refresher.run()
+
+    report = asyncio.run(run())
+    assert report["retries"] >= 2
+    assert report["failed"] == 0
+    assert report["changed"] == 4
+    assert state.requests == 4 + report["retries"]
+
+
+def test_gives_up_on_non_retryable_errors(mongo_db, stub):
+    url, state = stub()
+
+    async def run():
+        await seed(mongo_db, 3)
+        # Wrong base path: the stub answers 404, which is not retried
+        refresher = AsinRefresher(mongo_db, HttpUpstreamClient(url + "/v2"), lookup_size=1, rate=0)
+        return await refresher.run()
+
+    report = asyncio.run(run())
+    assert report["failed"] == 3
+    assert report["retries"] == 0
+    assert state.requests == 0
+
+    async def check():
+        # Failed lookups stay due for the next run
+        assert await mongo_db.products.count_documents({"asin_checked_at": {"$exists": True}}) == 0
+
+    asyncio.run(check())
+
+
+def canned_response(status, body, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.mark.parametrize("body", [b"<html>busy</html>", b'{"items": [{"price": 2.0}]}', b'{"items": [1]}'])
+def test_malformed_body_fails_only_its_lookup(mongo_db, monkeypatch, body):
+    def get(self, url, params, timeout):
+        asins = params["asins"].split(",")
+        if asins == ["B000000001"]:
+            return canned_response(200, body)
+        return canned_response(200, b'{"items": [{"asin": "%s", "price": 5.0}]}' % asins[0].encode())
+
+    monkeypatch.setattr(requests.Session, "get", get)
+
+    async def run():
+        await seed(mongo_db, 3)
+        refresher = AsinRefresher(mongo_db, HttpUpstreamClient("http://upstream"), lookup_size=1, rate=0)
+        return await refresher.run()
+
+    report = asyncio.run(run())
+    assert report["failed"] == 1 and report["retries"] == 0
+    # The other lookups in the batch are still written
+    assert report["changed"] == 2
+
+
+def test_retry_after_as_seconds_or_http_date():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < parse_retry_after(later) <= 30
+    earlier = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=30), usegmt=True)
+    assert parse_retry_after(earlier) == 0.0
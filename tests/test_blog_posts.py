@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from repositories import motor_storage
+
+
+@pytest.fixture
+def client(mongo_db, monkeypatch):
+    """The API over mongomock, signed in, without the startup hooks."""
+    monkeypatch.setattr(server, "db", mongo_db)
+    monkeypatch.setattr(server, "storage", motor_storage(mongo_db))
+    monkeypatch.setattr(server.invalidation_bus, "collection", mongo_db.cache_invalidations)
+    monkeypatch.setattr(server.job_queue, "collection", mongo_db.jobs)
+    server.app.dependency_overrides[server.get_current_admin] = lambda: server.AdminResponse(
+        id="a1", username="ann", email="ann@example.com", is_active=True, created_at=datetime.utcnow(),
+    )
+    yield TestClient(server.app)
+    server.app.dependency_overrides.clear()
+
+
+def post_form(**fields):
+    return {
+        "title": "Winter Feeding", "slug": "winter-feeding", "content": "Hay first.", "excerpt": "",
+        "author": "Ann", "is_published": True, "meta_description": "", **fields,
+    }
+
+
+def test_derived_excerpt_follows_content_across_edits(client):
+    post = client.post("/api/admin/blog/posts", json=post_form()).json()
+    assert post["excerpt"] == "Hay first." and post["excerpt_auto"]
+
+    # The edit form sends back what it loaded
+    for content in ("Silage in January.", "Fresh grass by April."):
+        form = client.get(f"/api/admin/blog/posts/{post['id']}").json()
+        response = client.put(f"/api/admin/blog/posts/{post['id']}", json=post_form(
+            content=content, excerpt=form["excerpt"], meta_description=form["meta_description"],
+        ))
+        assert response.status_code == 200
+        post = client.get(f"/api/admin/blog/posts/{post['id']}").json()
+        assert post["excerpt"] == content
+        assert post["meta_description"] == content
+
+
+def test_hand_written_excerpt_is_kept(client):
+    post = client.post("/api/admin/blog/posts", json=post_form()).json()
+    client.put(f"/api/admin/blog/posts/{post['id']}", json=post_form(excerpt="All about hay", meta_description="Hay"))
+    client.put(f"/api/admin/blog/posts/{post['id']}", json=post_form(
+        content="Silage in January.", excerpt="All about hay", meta_description="Hay",
+    ))
+    post = client.get(f"/api/admin/blog/posts/{post['id']}").json()
+    assert (post["excerpt"], post["meta_description"]) == ("All about hay", "Hay")
+    assert not post["excerpt_auto"] and not post["meta_description_auto"]
+
+
+def test_posts_saved_before_the_flags_are_recognised():
+    legacy = {"content": "Hay first.", "excerpt": "Hay first.", "meta_description": "Hand-written"}
+    fields = server.rendered_post_fields("Silage.", legacy["excerpt"], legacy["meta_description"], legacy)
+    assert fields["excerpt"] == "Silage." and fields["excerpt_auto"]
+    assert fields["meta_description"] == "Hand-written" and not fields["meta_description_auto"]
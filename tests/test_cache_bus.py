@@ -0,0 +1,65 @@
+import asyncio
+
+import pymongo
+from pymongo import _csot
+
+from cache_bus import InvalidationBus, LocalCache
+
+
+def test_publish_evicts_now_and_notifies_in_the_background(mongo_db):
+    seen = []
+
+    async def main():
+        cache = LocalCache()
+        cache.enabled = True
+        cache.set("product:p1", {"id": "p1"})
+        bus = InvalidationBus(mongo_db, cache)
+        release = asyncio.Event()
+
+        async def listener(message):
+            await release.wait()
+            # Detached from the publishing request's deadline
+            seen.append((message["ids"], _csot.get_timeout()))
+
+        bus.add_listener(listener)
+        with pymongo.timeout(5):
+            await bus.publish("product", ["p1"], ["product:p1"])
+            await bus.publish("product", ["p2"], [])
+        assert cache.get("product:p1") is None
+        assert seen == []
+        assert await mongo_db.cache_invalidations.count_documents({}) == 2
+
+        release.set()
+        await bus.drain()
+        assert seen == [(["p1"], None), (["p2"], None)]
+        await bus.stop()
+
+    asyncio.run(main())
+
+
+def test_async_subscribe_listener_resyncs_in_the_background(mongo_db):
+    async def main():
+        bus = InvalidationBus(mongo_db, LocalCache())
+        started = asyncio.Event()
+        finished = []
+
+        async def resync():
+            started.set()
+            await asyncio.sleep(60)
+            finished.append(True)
+
+        bus.add_subscribe_listener(resync)
+        await bus._subscribed("tailable_cursor")
+        assert bus.cache.enabled
+        await asyncio.wait_for(started.wait(), 5)
+        first = bus._resyncs[0]
+
+        # A resubscribe starts over
+        started.clear()
+        await bus._subscribed("tailable_cursor")
+        await asyncio.wait_for(started.wait(), 5)
+        assert first.cancelled() and finished == []
+        await bus.stop()
+        assert bus._resyncs == []
+
+    asyncio.run(main())
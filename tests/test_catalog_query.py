@@ -0,0 +1,23 @@
+import pytest
+
+from catalog_query import (
+    PRODUCT_INDEXES, PRODUCT_SORTS, build_product_filters, product_facet_pipeline, product_sort_stages,
+)
+
+
+@pytest.mark.parametrize("sort", PRODUCT_SORTS)
+def test_every_sort_has_an_index(sort):
+    keys = list(product_sort_stages(sort)[0]["$sort"].items())
+    reverse = [(field, -direction) for field, direction in keys]
+    indexes = [index[1:] for index in PRODUCT_INDEXES if index[0] == ("is_active", 1)]
+    assert keys in indexes or reverse in indexes
+
+
+def test_browse_sorts_before_facet():
+    base, faceted = build_product_filters(category_id="c1", min_price=10)
+    pipeline = product_facet_pipeline(base, faceted, "price_asc", 20, 10)
+    assert pipeline[0] == {"$match": {"is_active": True}}
+    assert pipeline[1] == product_sort_stages("price_asc")[0]
+    items = pipeline[2]["$facet"]["items"]
+    assert not any("$sort" in stage for stage in items)
+    assert items[0] == {"$match": {"category_id": "c1", "price": {"$gte": 10}}}
@@ -0,0 +1,100 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo import _csot
+from pymongo.errors import ExecutionTimeout, OperationFailure
+
+from deadlines import DEADLINE_HEADER, DeadlineMiddleware, RequestDeadlines
+
+
+def headers(**values):
+    return [(name.replace("_", "-").encode("latin-1"), str(value).encode("latin-1")) for name, value in values.items()]
+
+
+def test_budget_uses_the_route_default_and_clamps_the_header():
+    deadlines = RequestDeadlines(default=10, per_route={"/search": 3, "/export": 0}, max_seconds=30)
+    assert deadlines.budget([], "/items/{item_id}") == 10
+    assert deadlines.budget([], "/search") == 3
+    assert deadlines.budget([], "/export") == 0
+    assert deadlines.budget(headers(x_request_deadline_ms=1500), "/search") == 1.5
+    assert deadlines.budget(headers(x_request_deadline_ms=120000), "/search") == 30
+    for bad in ("soon", "0", "-5"):
+        assert deadlines.budget(headers(x_request_deadline_ms=bad), "/search") == 3
+
+
+def make_client(deadlines):
+    app = FastAPI()
+    seen = {}
+
+    @app.get("/slow/{n}")
+    async def slow(n: int):
+        await asyncio.sleep(n)
+        return {"ok": True}
+
+    @app.get("/fast")
+    async def fast():
+        seen["timeout"] = _csot.get_timeout()
+        return {"ok": True}
+
+    @app.get("/mongo-timeout")
+    async def mongo_timeout():
+        raise ExecutionTimeout("operation exceeded time limit", 50)
+
+    @app.get("/mongo-error")
+    async def mongo_error():
+        raise OperationFailure("boom", 2)
+
+    @app.post("/slow/{n}")
+    async def slow_write(n: float):
+        await asyncio.sleep(n)
+        seen["write_timeout"] = _csot.get_timeout()
+        return {"ok": True}
+
+    app.add_middleware(DeadlineMiddleware, deadlines=deadlines, routes=app.routes)
+    return TestClient(app, raise_server_exceptions=False), seen
+
+
+def test_slow_handler_gets_504_and_is_counted():
+    deadlines = RequestDeadlines(default=0.2)
+    client, _ = make_client(deadlines)
+    response = client.get("/slow/5")
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Request deadline exceeded"}
+    assert client.get("/slow/0").status_code == 200
+    stats = deadlines.stats()
+    assert stats["requests"] == {"/slow/{n}": 2}
+    assert stats["exceeded"] == {"/slow/{n}": 1}
+
+
+def test_header_shortens_the_budget_and_reaches_pymongo():
+    deadlines = RequestDeadlines(default=10)
+    client, seen = make_client(deadlines)
+    assert client.get("/slow/1", headers={DEADLINE_HEADER: "100"}).status_code == 504
+    assert client.get("/fast", headers={DEADLINE_HEADER: "2500"}).status_code == 200
+    assert seen["timeout"] == 2.5
+
+
+def test_mongo_timeout_is_a_504_and_other_errors_are_not():
+    deadlines = RequestDeadlines(default=10)
+    client, _ = make_client(deadlines)
+    assert client.get("/mongo-timeout").status_code == 504
+    assert client.get("/mongo-error").status_code == 500
+    assert deadlines.stats()["exceeded"] == {"/mongo-timeout": 1}
+
+
+def test_zero_budget_disables_the_deadline():
+    deadlines = RequestDeadlines(default=10, per_route={"/fast": 0})
+    client, seen = make_client(deadlines)
+    assert client.get("/fast").status_code == 200
+    assert seen["timeout"] is None
+    assert deadlines.stats()["requests"] == {}
+
+
+def test_writes_are_exempt():
+    deadlines = RequestDeadlines(default=0.05)
+    client, seen = make_client(deadlines)
+    response = client.post("/slow/0.2")
+    assert response.status_code == 200
+    assert seen["write_timeout"] is None
+    assert deadlines.stats()["requests"] == {}
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import pytest
+
+import export_snapshot
+import server
+from export_snapshot import SnapshotExporter
+from repositories import motor_storage
+from .test_repositories import CATEGORIES, product
+
+CATEGORY_C3 = {**CATEGORIES[0], "id": "c3", "name": "Sheep", "slug": "sheep"}
+
+
+@pytest.fixture
+def exporter(mongo_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "db", mongo_db)
+    monkeypatch.setattr(server, "read_db", mongo_db)
+    monkeypatch.setattr(server, "storage", motor_storage(mongo_db))
+
+    async def seed():
+        await mongo_db.categories.insert_many([dict(c) for c in (*CATEGORIES, CATEGORY_C3)])
+        await mongo_db.products.insert_many([
+            {**product(f"p{i}", f"Item {i}", category, 10.0 + i), "affiliate_url": "https://amazon.com/x"}
+            for i, category in enumerate(["c1", "c1", "c2", "c3"] * 10)
+        ])
+
+    asyncio.run(seed())
+    return lambda: SnapshotExporter(mongo_db, str(tmp_path))
+
+
+def test_full_export_in_chunks(exporter, monkeypatch, tmp_path):
+    monkeypatch.setattr(export_snapshot, "CONCURRENCY", 3)
+    asyncio.run(exporter().full())
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert len([e for e in manifest["files"] if e.startswith("product:")]) == 40
+    assert manifest["product_categories"]["p2"] == "c2"
+    assert (tmp_path / "api/products/slug/item-39.json").exists()
+
+
+def test_product_edit_rerenders_only_its_categories(exporter, mongo_db, monkeypatch):
+    asyncio.run(exporter().full())
+    rendered = []
+    export_category = SnapshotExporter.export_category
+
+    async def tracked(self, category_id):
+        rendered.append(category_id)
+        await export_category(self, category_id)
+
+    monkeypatch.setattr(SnapshotExporter, "export_category", tracked)
+
+    async def move():
+        await mongo_db.products.update_one({"id": "p0"}, {"$set": {"category_id": "c2", "category_name": "Goats"}})
+        await exporter().incremental(["p0"])
+
+    asyncio.run(move())
+    assert sorted(rendered) == ["c1", "c2"]
+
+    rendered.clear()
+
+    async def delete():
+        await mongo_db.products.delete_one({"id": "p3"})
+        await exporter().incremental(["p3"])
+
+    asyncio.run(delete())
+    assert rendered == ["c3"]
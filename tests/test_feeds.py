@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime
+
+from feeds import BlogFeed, SitemapBuilder
+
+
+def locs(sitemap):
+    return [loc for loc, _ in sorted(sitemap._shards[0].values())]
+
+
+def test_build_replays_refreshes_made_while_it_read(mongo_db, monkeypatch):
+    async def main():
+        await mongo_db.products.insert_one(
+            {"id": "p1", "slug": "hay-net", "is_active": True, "created_at": datetime(2024, 1, 1)}
+        )
+        sitemap = SitemapBuilder("https://farm.example")
+        reading, resume = asyncio.Event(), asyncio.Event()
+        load = SitemapBuilder._load
+
+        async def slow_load(self, db, kind, ids):
+            async for item in load(self, db, kind, ids):
+                if ids is None and kind == "product":
+                    reading.set()
+                    await resume.wait()
+                yield item
+
+        monkeypatch.setattr(SitemapBuilder, "_load", slow_load)
+        build = asyncio.create_task(sitemap.build(mongo_db))
+        await reading.wait()
+        # Written and refreshed after the build read p1
+        await mongo_db.products.update_one({"id": "p1"}, {"$set": {"slug": "hay-net-xl"}})
+        await sitemap.refresh(mongo_db, "product", ["p1"])
+        resume.set()
+        await build
+        assert locs(sitemap) == ["https://farm.example/products/hay-net-xl"]
+        assert sitemap._builds == []
+
+    asyncio.run(main())
+
+
+def test_feed_invalidation_rereads_posts(mongo_db):
+    async def main():
+        feed = BlogFeed("https://farm.example", "Farm", "News")
+        post = {"id": "b1", "title": "Winter", "slug": "winter", "excerpt": "", "author": "Ann", "tags": [],
+                "is_published": True, "published_at": datetime(2024, 2, 1), "updated_at": datetime(2024, 2, 1)}
+        await mongo_db.blog_posts.insert_one(post)
+        first = await feed.render(mongo_db, "rss")
+        await mongo_db.blog_posts.update_one({"id": "b1"}, {"$set": {"title": "Spring"}})
+        assert await feed.render(mongo_db, "rss") is first
+        feed.invalidate()
+        assert b"Spring" in (await feed.render(mongo_db, "rss")).body
+
+    asyncio.run(main())
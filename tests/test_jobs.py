@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from jobs import JobQueue
+
+
+async def wait_for_status(queue, job_id, status, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        assert asyncio.get_running_loop().time() < deadline, f"job still {job['status']}"
+        await asyncio.sleep(0.01)
+
+
+async def make_due(queue, job_id):
+    await queue.collection.update_one({"id": job_id}, {"$set": {"run_at": datetime.utcnow()}})
+
+
+def test_one_worker_wins_the_claim(mongo_db):
+    calls = []
+
+    async def handler(n):
+        calls.append(n)
+
+    async def main():
+        first, second = JobQueue(mongo_db, "w1"), JobQueue(mongo_db, "w2")
+        for queue in (first, second):
+            queue.register("count", handler)
+        # Not started: the job is only stored, then both workers race for it
+        job_id = await first.enqueue("count", n=1)
+        await asyncio.gather(first._run(job_id), second._run(job_id))
+        assert calls == [1]
+        job = await first.get(job_id)
+        assert job["status"] == "done" and job["attempts"] == 1
+        assert job["expires_at"] > job["finished_at"]
+        assert "lease_until" not in job
+
+    asyncio.run(main())
+
+
+def test_retry_backoff_then_failure(mongo_db):
+    attempts = []
+
+    async def flaky():
+        attempts.append(datetime.utcnow())
+        raise ValueError("upstream down")
+
+    async def main():
+        queue = JobQueue(mongo_db, "w1", max_attempts=3, retry_delay=2)
+        queue.register("flaky", flaky)
+        job_id = await queue.enqueue("flaky")
+
+        await queue._run(job_id)
+        job = await queue.get(job_id)
+        assert job["status"] == "queued" and job["attempts"] == 1
+        assert job["error"] == "ValueError: upstream down"
+        delay = job["run_at"] - datetime.utcnow()
+        assert timedelta(seconds=1) < delay <= timedelta(seconds=2)
+
+        # Not due yet, so nobody claims it
+        await queue._run(job_id)
+        assert len(attempts) == 1
+
+        await make_due(queue, job_id)
+        await queue._run(job_id)
+        job = await queue.get(job_id)
+        delay = job["run_at"] - datetime.utcnow()
+        assert job["attempts"] == 2 and timedelta(seconds=3) < delay <= timedelta(seconds=4)
+
+        await make_due(queue, job_id)
+        await queue._run(job_id)
+        job = await queue.get(job_id)
+        assert job["status"] == "failed" and job["attempts"] == 3
+        assert queue.stats["retried"] == 2 and queue.stats["failed"] == 1
+
+    asyncio.run(main())
+
+
+def test_expired_lease_is_requeued_and_run(mongo_db):
+    calls = []
+
+    async def handler():
+        calls.append(1)
+
+    async def main():
+        crashed = JobQueue(mongo_db, "crashed")
+        crashed.register("work", handler)
+        job_id = await crashed.enqueue("work")
+        # Claimed by a worker that died without finishing or renewing
+        await crashed.collection.update_one({"id": job_id}, {"$set": {
+            "status": "running", "worker": "crashed", "attempts": 1,
+            "lease_until": datetime.utcnow() - timedelta(seconds=1),
+        }})
+
+        queue = JobQueue(mongo_db, "w1", poll_interval=0.05)
+        queue.register("work", handler)
+        await queue.start()
+        try:
+            job = await wait_for_status(queue, job_id, "done")
+        finally:
+            await queue.stop()
+        assert calls == [1]
+        assert job["worker"] == "w1" and job["attempts"] == 2
+
+    asyncio.run(main())
+
+
+def test_live_lease_is_left_alone(mongo_db):
+    async def main():
+        queue = JobQueue(mongo_db, "w1")
+        queue.register("work", lambda: None)
+        job_id = await queue.enqueue("work")
+        await queue.collection.update_one({"id": job_id}, {"$set": {
+            "status": "running", "worker": "w2", "lease_until": datetime.utcnow() + timedelta(seconds=60),
+        }})
+        queue._queue = asyncio.PriorityQueue(maxsize=queue.max_queued)
+        await queue._recover()
+        assert (await queue.get(job_id))["status"] == "running"
+        assert queue._queue.empty()
+
+    asyncio.run(main())
+
+
+def test_overflow_is_recovered_by_the_sweep(mongo_db):
+    done = []
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def slow(n):
+            await gate.wait()
+            done.append(n)
+
+        queue = JobQueue(mongo_db, "w1", concurrency=1, max_queued=1, poll_interval=0.05)
+        queue.register("slow", slow)
+        await queue.start()
+        try:
+            first = await queue.enqueue("slow", n=1)
+            # Let the single worker take the first job off the memory queue
+            await wait_for_status(queue, first, "running")
+            second = await queue.enqueue("slow", n=2)
+            third = await queue.enqueue("slow", n=3)
+            assert queue.stats["overflowed"] == 1
+            assert (await queue.get(third))["status"] == "queued"
+
+            gate.set()
+            for job_id in (first, second, third):
+                await wait_for_status(queue, job_id, "done")
+        finally:
+            await queue.stop()
+        assert sorted(done) == [1, 2, 3]
+
+    asyncio.run(main())
+
+
+def test_cancelled_job_is_handed_back(mongo_db):
+    async def main():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        queue = JobQueue(mongo_db, "w1", poll_interval=60)
+        queue.register("hang", hang)
+        await queue.start()
+        job_id = await queue.enqueue("hang")
+        await asyncio.wait_for(started.wait(), 5)
+        await queue.stop()
+        job = await queue.get(job_id)
+        assert job["status"] == "queued" and job["attempts"] == 0
+
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import migrations
+from migrations import Migration, MigrationRunner
+
+
+def set_flag(doc):
+    return {"$set": {"flag": True}}
+
+
+def flag_migration(version=1, **kwargs):
+    return Migration(version, f"flag_{version}", "items", {"flag": {"$exists": False}}, set_flag, **kwargs)
+
+
+async def seed(db, count):
+    await db.items.insert_many([{"_id": i, "n": i} for i in range(count)])
+
+
+def test_runs_in_batches_and_never_twice(mongo_db):
+    async def main():
+        await seed(mongo_db, 25)
+        runner = MigrationRunner(mongo_db, batch_size=10)
+        [report] = await runner.run([flag_migration()])
+        assert report["scanned"] == 25 and report["modified"] == 25
+        assert await mongo_db.items.count_documents({"flag": True}) == 25
+        assert await runner.run([flag_migration()]) == []
+        state = await mongo_db.migrations.find_one({"version": 1})
+        assert state["status"] == "done" and state["owner"] is None
+
+    asyncio.run(main())
+
+
+def test_update_repeats_the_filter(mongo_db, monkeypatch):
+    async def main():
+        await seed(mongo_db, 3)
+        collection_type = type(mongo_db.items)
+        bulk_write = collection_type.bulk_write
+
+        async def racing_bulk_write(self, operations, **kwargs):
+            # Another writer sets the field between the read and the write
+            if self.name == "items":
+                await mongo_db.items.update_one({"_id": 2}, {"$set": {"flag": "elsewhere"}})
+            return await bulk_write(self, operations, **kwargs)
+
+        monkeypatch.setattr(collection_type, "bulk_write", racing_bulk_write)
+        [report] = await MigrationRunner(mongo_db).run([flag_migration()])
+        assert report["scanned"] == 3 and report["modified"] == 2
+        assert (await mongo_db.items.find_one({"_id": 2}))["flag"] == "elsewhere"
+
+    asyncio.run(main())
+
+
+def test_stops_at_a_version_leased_elsewhere(mongo_db):
+    async def main():
+        await seed(mongo_db, 3)
+        await mongo_db.migrations.create_index("version", unique=True)
+        await mongo_db.migrations.insert_one({
+            "version": 2, "status": "running", "owner": "other",
+            "lease_until": datetime.utcnow() + timedelta(seconds=60),
+        })
+        runner = MigrationRunner(mongo_db)
+        reports = await runner.run([flag_migration(1), flag_migration(2), flag_migration(3)])
+        assert [r["version"] for r in reports] == [1]
+        assert await mongo_db.migrations.find_one({"version": 3}) is None
+
+        # Once the other runner finishes, the rest go ahead
+        await mongo_db.migrations.update_one({"version": 2}, {"$set": {"status": "done", "owner": None}})
+        assert [r["version"] for r in await runner.run([flag_migration(v) for v in (1, 2, 3)])] == [3]
+
+    asyncio.run(main())
+
+
+def test_lag_wait_renews_the_lease(mongo_db, monkeypatch):
+    async def main():
+        await seed(mongo_db, 4)
+        expired = datetime(2000, 1, 1)
+        leases = []
+
+        async def lag(db):
+            state = await mongo_db.migrations.find_one({"version": 1})
+            leases.append(state["lease_until"])
+            if len(leases) == 1:
+                # A long wait would have run the lease out
+                await mongo_db.migrations.update_one({"version": 1}, {"$set": {"lease_until": expired}})
+                return 30.0
+            return 0.0
+
+        async def no_sleep(seconds):
+            pass
+
+        monkeypatch.setattr(migrations, "replication_lag", lag)
+        monkeypatch.setattr(migrations.asyncio, "sleep", no_sleep)
+        runner = MigrationRunner(mongo_db, batch_size=2, lag_check_every=1)
+        [report] = await runner.run([flag_migration()])
+        assert report["scanned"] == 4
+        assert leases[1] > datetime.utcnow()
+
+    asyncio.run(main())
+
+
+def test_lag_wait_stops_when_the_lease_is_lost(mongo_db, monkeypatch):
+    async def main():
+        await seed(mongo_db, 4)
+
+        async def lag(db):
+            # Another runner took over while this one waited
+            await mongo_db.migrations.update_one({"version": 1}, {"$set": {"owner": "other"}})
+            return 30.0
+
+        async def no_sleep(seconds):
+            pass
+
+        monkeypatch.setattr(migrations, "replication_lag", lag)
+        monkeypatch.setattr(migrations.asyncio, "sleep", no_sleep)
+        runner = MigrationRunner(mongo_db, batch_size=2, lag_check_every=1)
+        assert await runner.run([flag_migration()]) == []
+        assert await mongo_db.items.count_documents({"flag": True}) == 2
+
+    asyncio.run(main())
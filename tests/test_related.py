@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime
+
+from related import RelatedProducts
+
+
+def product(id, name, category_id, price, day=1):
+    return {
+        "id": id, "name": name, "description": f"{name} for the farm", "features": [],
+        "category_id": category_id, "price": price, "is_active": True, "updated_at": datetime(2024, 1, day),
+    }
+
+
+PRODUCTS = [
+    product("p1", "Hay Feeder", "c1", 20.0),
+    product("p2", "Hay Rack", "c1", 22.0),
+    product("p3", "Goat Bell", "c2", 8.0),
+    product("p4", "Goat Collar", "c2", 9.0),
+    product("p5", "Water Trough", "c1", 60.0),
+]
+
+
+async def stored(db):
+    return {
+        doc["product_id"]: [related["id"] for related in doc["related"]]
+        async for doc in db.product_related.find({}, {"_id": 0})
+    }
+
+
+def test_job_catches_up_on_writes_it_missed(mongo_db):
+    async def main():
+        await mongo_db.products.insert_many([dict(p) for p in PRODUCTS])
+        first, second = RelatedProducts(top_k=2), RelatedProducts(top_k=2)
+        await first.rebuild(mongo_db)
+        await second.load(mongo_db)
+
+        # Written and refreshed by the first worker; the second never hears of it
+        await mongo_db.products.update_one({"id": "p5"}, {"$set": {
+            "name": "Goat Bell Tower", "category_id": "c2", "price": 8.5, "updated_at": datetime(2024, 2, 1),
+        }})
+        await first.refresh(mongo_db, ["p5"])
+        await mongo_db.products.delete_one({"id": "p2"})
+        await first.refresh(mongo_db, ["p2"])
+        expected = await stored(mongo_db)
+
+        # A job for an unrelated product on the second worker stores the same lists
+        await second.refresh(mongo_db, ["p4"])
+        assert await stored(mongo_db) == expected
+        assert "p2" not in expected and "p5" in expected["p3"]
+
+    asyncio.run(main())
+
+
+def test_small_batches_give_the_same_neighbours(mongo_db):
+    async def main():
+        await mongo_db.products.insert_many([dict(p) for p in PRODUCTS])
+        whole, batched = RelatedProducts(top_k=3), RelatedProducts(top_k=3, batch_bytes=1)
+        await whole.load(mongo_db)
+        await batched.load(mongo_db)
+        assert batched._batch_rows() == 1
+        assert (whole._neighbours == batched._neighbours).all()
+
+    asyncio.run(main())
@@ -0,0 +1,290 @@
+"""Contract tests run against both storage engines.
+
+The Motor engine runs on mongomock-motor with the unique indexes server.py
+creates, so both engines are held to the same results.
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from repositories import (
+    ReadOnlyStorageError, dump_snapshot, load_snapshot, memory_storage, motor_storage,
+)
+
+T0 = datetime(2024, 1, 1)
+
+CATEGORIES = [
+    {"id": "c1", "name": "Cows", "slug": "cows", "description": "", "created_at": T0},
+    {"id": "c2", "name": "Goats", "slug": "goats", "description": "", "created_at": T0},
+]
+
+
+def product(id, name, category_id, price, original_price=None, rating=0.0, discount=0.0, day=1, **fields):
+    return {
+        "id": id, "name": name, "slug": name.lower().replace(" ", "-"), "description": f"{name} for the farm",
+        "short_description": name, "category_id": category_id,
+        "category_name": "Cows" if category_id == "c1" else "Goats", "price": price,
+        "original_price": original_price, "rating": rating, "review_count": 10, "discount_pct": discount,
+        "features": [], "is_featured": False, "is_active": True, "amazon_asin": None,
+        "created_at": datetime(2024, 1, day), "updated_at": datetime(2024, 1, day), **fields,
+    }
+
+
+PRODUCTS = [
+    product("p1", "Hay Feeder", "c1", 20.0, 40.0, rating=4.5, discount=50.0, day=1, is_featured=True),
+    product("p2", "Water Trough", "c1", 60.0, rating=3.2, day=2),
+    product("p3", "Goat Bell", "c2", 8.0, 10.0, rating=4.9, discount=20.0, day=3, features=["Loud brass bell"]),
+    product("p4", "Old Bucket", "c2", 15.0, day=4, is_active=False),
+]
+
+
+def post(id, title, day, is_published=True, **fields):
+    return {
+        "id": id, "title": title, "slug": title.lower().replace(" ", "-"), "content": "x", "excerpt": "",
+        "author": "Ann", "category_id": "c1", "category_name": "Cows", "tags": [], "is_published": is_published,
+        "is_featured": False, "created_at": datetime(2024, 2, day), "updated_at": datetime(2024, 2, day),
+        "published_at": datetime(2024, 2, day) if is_published else None, **fields,
+    }
+
+
+POSTS = [
+    post("b1", "Winter Feeding", 1),
+    post("b2", "Spring Shearing", 2, author="Bob"),
+    post("b3", "Draft Notes", 3, is_published=False),
+]
+
+
+async def seeded_motor(db):
+    for name in ("categories", "products", "blog_posts"):
+        for field in ("id", "slug"):
+            await db[name].create_index(field, unique=True)
+    await db.admins.create_index("username", unique=True)
+    storage = motor_storage(db)
+    await seed(storage)
+    return storage
+
+
+async def seed(storage):
+    for category in CATEGORIES:
+        await storage.categories.insert(dict(category))
+    for doc in PRODUCTS:
+        await storage.products.insert(dict(doc))
+    for doc in POSTS:
+        await storage.blog_posts.insert(dict(doc))
+    await storage.admins.insert({"id": "a1", "username": "ann", "email": "ann@example.com", "password_hash": "x"})
+
+
+@pytest.fixture(params=["motor", "memory"])
+def run(request, mongo_db):
+    """Run ``check(storage)`` against a freshly seeded engine."""
+
+    def runner(check):
+        async def main():
+            if request.param == "motor":
+                storage = await seeded_motor(mongo_db)
+            else:
+                storage = memory_storage()
+                await seed(storage)
+            return await check(storage)
+
+        return asyncio.run(main())
+
+    return runner
+
+
+def ids(docs):
+    return [doc["id"] for doc in docs]
+
+
+def test_point_reads(run):
+    async def check(storage):
+        found = await storage.products.get("p1")
+        assert found["name"] == "Hay Feeder" and "_id" not in found
+        assert (await storage.products.get_by_slug("goat-bell"))["id"] == "p3"
+        assert await storage.products.get("missing") is None
+        assert await storage.products.exists("p4")
+        assert sorted(ids(await storage.products.find_by_keys(["p1", "goat-bell", "nope"]))) == ["p1", "p3"]
+        assert await storage.products.in_category("c2")
+        assert not await storage.products.in_category("c3")
+        assert await storage.categories.get_name("c1") == "Cows"
+        assert await storage.categories.count() == 2
+        assert (await storage.blog_posts.get_by_slug("winter-feeding"))["id"] == "b1"
+        assert sorted(ids(await storage.blog_posts.find_many(["b1", "b3"]))) == ["b1", "b3"]
+
+    run(check)
+
+
+def test_returned_documents_are_copies(run):
+    async def check(storage):
+        found = await storage.products.get("p1")
+        found["name"] = "Changed"
+        assert (await storage.products.get("p1"))["name"] == "Hay Feeder"
+
+    run(check)
+
+
+def test_duplicate_slug_raises(run):
+    async def check(storage):
+        with pytest.raises(DuplicateKeyError):
+            await storage.products.insert(product("p9", "Hay Feeder", "c1", 1.0))
+        with pytest.raises(DuplicateKeyError):
+            await storage.categories.insert({**CATEGORIES[0], "id": "c9"})
+
+    run(check)
+
+
+@pytest.mark.parametrize("filters, sort, expected", [
+    ({}, "newest", ["p3", "p2", "p1"]),
+    ({}, "price_asc", ["p3", "p1", "p2"]),
+    ({}, "price_desc", ["p2", "p1", "p3"]),
+    ({}, "rating", ["p3", "p1", "p2"]),
+    ({}, "discount", ["p1", "p3", "p2"]),
+    ({"category_id": "c1"}, "newest", ["p2", "p1"]),
+    ({"on_sale": True}, "newest", ["p3", "p1"]),
+    ({"min_price": 10, "max_price": 50}, "newest", ["p1"]),
+    ({"min_rating": 4}, "newest", ["p3", "p1"]),
+    ({"is_featured": True}, "newest", ["p1"]),
+    ({"is_active": False}, "newest", ["p4"]),
+])
+def test_page(run, filters, sort, expected):
+    async def check(storage):
+        assert ids(await storage.products.page(filters, sort, 0, 10)) == expected
+        assert ids(await storage.products.page(filters, sort, 1, 1)) == expected[1:2]
+
+    run(check)
+
+
+def test_browse_facets_ignore_their_own_filter(run):
+    async def check(storage):
+        result = await storage.products.browse({"category_id": "c1", "min_price": 10}, "price_asc", 0, 10)
+        assert ids(result["items"]) == ["p1", "p2"]
+        assert result["total"] == 2
+        # The category facet counts every category at the chosen price
+        assert {c["_id"]: c["count"] for c in result["categories"]} == {"c1": 2}
+        prices = {bucket["_id"]: bucket["count"] for bucket in result["price"]}
+        # The price facet counts every price in the chosen category
+        assert prices == {0: 1, 50: 1}
+
+    run(check)
+
+
+def test_search_deals_and_counts(run):
+    async def check(storage):
+        assert ids(await storage.products.search("bell", 10)) == ["p3"]
+        assert ids(await storage.products.search("BRASS", 10)) == ["p3"]
+        assert ids(await storage.products.search("bucket", 10)) == []
+        assert ids(await storage.products.deals(None, 5, 10)) == ["p1", "p3"]
+        assert ids(await storage.products.deals("c2", 5, 10)) == ["p3"]
+        assert ids(await storage.products.deals(None, 30, 10)) == ["p1"]
+        assert await storage.products.count_active() == 3
+        assert await storage.products.count_active(is_featured=True) == 1
+
+    run(check)
+
+
+def test_product_update_returns_before_and_recomputes_discount(run):
+    async def check(storage):
+        before = await storage.products.update("p2", {"original_price": 80.0, "updated_at": datetime(2024, 3, 1)})
+        assert before["original_price"] is None and before["discount_pct"] == 0.0
+        after = await storage.products.get("p2")
+        assert after["discount_pct"] == 25.0
+        assert await storage.products.update("missing", {"price": 1.0}) is None
+
+    run(check)
+
+
+def test_product_delete(run):
+    async def check(storage):
+        assert await storage.products.delete("p3") == {"id": "p3", "slug": "goat-bell"}
+        assert await storage.products.get_by_slug("goat-bell") is None
+        assert await storage.products.delete("p3") is None
+        # The slug is free again
+        await storage.products.insert(product("p9", "Goat Bell", "c2", 9.0))
+
+    run(check)
+
+
+def test_category_replace_and_delete(run):
+    async def check(storage):
+        assert await storage.categories.replace("c2", {"name": "Sheep", "slug": "sheep", "description": "d"})
+        assert (await storage.categories.get("c2"))["created_at"] == T0
+        assert not await storage.categories.replace("c9", {"name": "x", "slug": "x", "description": ""})
+        assert await storage.categories.delete("c2")
+        assert not await storage.categories.delete("c2")
+        assert ids(await storage.categories.list()) == ["c1"]
+
+    run(check)
+
+
+def test_blog_posts(run):
+    async def check(storage):
+        assert ids(await storage.blog_posts.list(None, True, None, 0, 10)) == ["b2", "b1"]
+        assert ids(await storage.blog_posts.list(None, False, None, 0, 10)) == ["b3"]
+        assert ids(await storage.blog_posts.list("c1", True, None, 1, 10)) == ["b1"]
+        assert await storage.blog_posts.count_published() == 2
+
+        first_live = datetime(2024, 3, 1)
+        before = await storage.blog_posts.update("b3", {"is_published": True}, published_at=first_live)
+        assert before["published_at"] is None
+        assert (await storage.blog_posts.get("b3"))["published_at"] == first_live
+        # published_at is kept once set
+        await storage.blog_posts.update("b3", {"title": "Final Notes"}, published_at=datetime(2024, 4, 1))
+        assert (await storage.blog_posts.get("b3"))["published_at"] == first_live
+
+        assert await storage.blog_posts.delete("b1") == {"id": "b1", "slug": "winter-feeding"}
+        assert await storage.blog_posts.get("b1") is None
+
+    run(check)
+
+
+def test_admin_tables(run):
+    async def check(storage):
+        table = await storage.products.table(None, None, None, None, "-updated_at", 0, 2)
+        assert ids(table["items"]) == ["p4", "p3"] and table["total"] == 4
+        assert "description" not in table["items"][0]
+        table = await storage.products.table(True, "c1", None, "TROUGH", "name", 0, 10)
+        assert ids(table["items"]) == ["p2"] and table["total"] == 1
+        # Text match is literal, not a regex
+        assert (await storage.products.table(None, None, None, ".*", "name", 0, 10))["total"] == 0
+        with pytest.raises(ValueError):
+            await storage.products.table(None, None, None, None, "description", 0, 10)
+
+        table = await storage.blog_posts.table(None, None, "bob", "title", 0, 10)
+        assert ids(table["items"]) == ["b2"]
+        table = await storage.blog_posts.table(False, None, None, "-created_at", 0, 10)
+        assert ids(table["items"]) == ["b3"] and table["total"] == 1
+
+    run(check)
+
+
+def test_admins(run):
+    async def check(storage):
+        assert await storage.admins.exists("ann", "other@example.com")
+        assert await storage.admins.exists("other", "ann@example.com")
+        assert not await storage.admins.exists("bob", "bob@example.com")
+        assert (await storage.admins.get_by_username("ann"))["id"] == "a1"
+        assert (await storage.admins.get("a1"))["email"] == "ann@example.com"
+
+    run(check)
+
+
+def test_snapshot_round_trip_is_read_only(mongo_db, tmp_path):
+    path = tmp_path / "catalog.json"
+
+    async def main():
+        await seeded_motor(mongo_db)
+        counts = await dump_snapshot(mongo_db, path)
+        assert counts == {"categories": 2, "products": 4, "blog_posts": 3}
+        storage = load_snapshot(path)
+        assert (await storage.products.get("p1"))["created_at"] == datetime(2024, 1, 1)
+        assert ids(await storage.products.page({}, "newest", 0, 10)) == ["p3", "p2", "p1"]
+        # Admins never leave the database
+        assert await storage.admins.get_by_username("ann") is None
+        with pytest.raises(ReadOnlyStorageError):
+            await storage.products.update("p1", {"price": 1.0})
+        with pytest.raises(ReadOnlyStorageError):
+            await storage.blog_posts.insert(post("b9", "New", 9))
+
+    asyncio.run(main())
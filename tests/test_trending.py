@@ -0,0 +1,45 @@
+import asyncio
+
+import server
+from trending import CLICK_WEIGHT, TrendingTracker
+
+from .test_blog_posts import client  # noqa: F401
+from .test_repositories import PRODUCTS, seeded_motor
+
+
+def test_merge_sums_workers_into_id_lists(mongo_db):
+    async def main():
+        first, second = TrendingTracker(mongo_db, "w1"), TrendingTracker(mongo_db, "w2")
+        first.record("p1", "c1")
+        first.record("p3", "c2")
+        second.record("p3", "c2", CLICK_WEIGHT)
+        second.record("p2", "c1")
+        second.record("p2", "c1")
+        await first.merge()
+        await second.merge()
+        assert second.top() == ["p3", "p2", "p1"]
+        assert second.top("c1", 1) == ["p2"]
+        assert second.top("c9") == []
+
+    asyncio.run(main())
+
+
+def test_trending_serves_active_products_from_the_cache(client, mongo_db, monkeypatch):
+    tracker = TrendingTracker(mongo_db, "w1")
+    monkeypatch.setattr(server, "trending", tracker)
+    server.cache.clear()
+
+    async def seed():
+        await seeded_motor(mongo_db)
+        await mongo_db.products.update_many({}, {"$set": {"affiliate_url": "https://example.com"}})
+        # p4 is inactive, p9 no longer exists
+        for product_id, category_id in [(p["id"], p["category_id"]) for p in PRODUCTS] + [("p9", "c1")]:
+            tracker.record(product_id, category_id)
+        tracker.record("p3", "c2", CLICK_WEIGHT)
+        await tracker.merge()
+
+    asyncio.run(seed())
+    products = client.get("/api/products/trending").json()
+    assert products[0]["id"] == "p3"
+    assert sorted(p["id"] for p in products) == ["p1", "p2", "p3"]
+    assert [p["id"] for p in client.get("/api/products/trending", params={"limit": 1}).json()] == ["p3"]